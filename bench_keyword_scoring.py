@@ -0,0 +1,192 @@
+"""
+Benchmark: per-keyword scoring loops vs KeywordMatcher
+
+Chunks every PDF under data/ (4,000-character chunks, 200 overlap) and times
+the scoring loops used across the repo against KeywordMatcher on the same
+chunks. Falls back to the markdown workbooks if the PDFs have not been
+downloaded (run download_data.sh for the real corpus).
+"""
+import glob
+import os
+import random
+import re
+import time
+
+from chunking import iter_chunks
+from keyword_matcher import SCAN_THRESHOLD, KeywordMatcher
+from pdf_text import iter_page_texts
+from sustainability_schema import SustainabilityReport
+
+# The keyword lists currently in use
+KEYWORD_LISTS = {
+    "extract_report.DATA_KEYWORDS": [
+        "emissions", "Scope 1", "Scope 2", "Scope 3", "renewable",
+        "target", "GHG", "tCO2", "MWh", "percent", "carbon neutral", "net zero"
+    ],
+    "session 9 extract_full_report": [
+        "emissions", "scope 1", "scope 2", "scope 3", "MWh", "TWh", "GWh",
+        "renewable", "carbon", "CO2", "water", "net zero", "target",
+        "megaliters", "metric tons", "mtco2e"
+    ],
+    "session 10 keywords": [
+        "emissions", "reduction", "target", "goal", "GHG", "carbon neutral",
+        "renewable", "net zero", "baseline", "percent", "by 2030", "by 2050"
+    ],
+    # extract_document-style list for the SustainabilityReport schema
+    "extract_document (SustainabilityReport)": (
+        [name.replace("_", " ") for name in SustainabilityReport.model_fields]
+        + ["percent", "target", "goal", "emissions", "by 20"]
+    ),
+}
+KEYWORD_LISTS["all lists combined"] = sorted({
+    kw for keywords in KEYWORD_LISTS.values() for kw in keywords
+})
+
+REPEATS = 3
+# Random texts per keyword list (and case/boundary setting) in check_counts
+CHECK_TEXTS = 300
+
+
+def load_corpus_chunks():
+    pdfs = sorted(glob.glob(os.path.join("data", "**", "*.pdf"), recursive=True))
+    if pdfs:
+        chunks = []
+        for pdf_path in pdfs:
+            chunks.extend(iter_chunks(iter_page_texts(pdf_path)))
+        return f"{len(pdfs)} PDFs under data/", chunks
+
+    docs = sorted(glob.glob("*.md"))
+    texts = []
+    for path in docs:
+        with open(path, encoding="utf-8") as f:
+            texts.append(f.read())
+    return f"{len(docs)} markdown files (data/ not downloaded)", list(iter_chunks(texts))
+
+
+def count_loop(chunks, keywords):
+    """extract_report.score_chunk / score_chunks.py: one str.count per keyword."""
+    for chunk in chunks:
+        chunk_lower = chunk.lower()
+        score = 0
+        for keyword in keywords:
+            score += chunk_lower.count(keyword.lower())
+
+
+def presence_loop(chunks, keywords):
+    """Notebooks / extract_document: lowercases the chunk once per keyword."""
+    for chunk in chunks:
+        sum(1 for kw in keywords if kw.lower() in chunk.lower())
+
+
+def matcher_scores(chunks, matcher):
+    for chunk in chunks:
+        matcher.score(chunk)
+
+
+def matcher_distinct(chunks, matcher):
+    for chunk in chunks:
+        matcher.distinct(chunk)
+
+
+def reference_counts(text, keywords, word_boundary=False):
+    """Per-keyword str.count (or whole-word findall) on the lowercased text: what the matcher must equal."""
+    text = text.lower()
+    counts = {}
+    for keyword in keywords:
+        if word_boundary:
+            n = len(re.findall(rf"(?<!\w){re.escape(keyword.lower())}(?!\w)", text))
+        else:
+            n = text.count(keyword.lower())
+        if n:
+            counts[keyword] = n
+    return counts
+
+
+def random_text(rng, keywords):
+    """Keywords and fragments of keywords run together, so many of them overlap."""
+    pieces = []
+    for _ in range(rng.randint(1, 40)):
+        keyword = rng.choice(keywords)
+        roll = rng.random()
+        if roll < 0.4:
+            pieces.append(keyword)
+        elif roll < 0.7:
+            pieces.append(keyword[rng.randrange(len(keyword)):])
+        elif roll < 0.9:
+            pieces.append(keyword[:rng.randrange(1, len(keyword) + 1)].upper())
+        else:
+            pieces.append(rng.choice(["", " ", "-", "s", "ed", "x1"]))
+        pieces.append(rng.choice(["", "", " ", "  ", ".", "s "]))
+    return "".join(pieces)
+
+
+def check_counts(seed=0):
+    """
+    KeywordMatcher.counts equals per-keyword counting on random overlapping texts.
+
+    Covers both the str.count path and the single-pass scan: every keyword
+    list is checked as is and padded past SCAN_THRESHOLD (plus word_boundary,
+    which always scans).
+
+    Returns:
+        Number of texts checked; raises AssertionError on the first mismatch
+    """
+    rng = random.Random(seed)
+    padding = [f"zz{i} pad" for i in range(SCAN_THRESHOLD)] + ["aa", "aba", "abab"]
+    checked = 0
+    for name, keywords in KEYWORD_LISTS.items():
+        for keyword_list in (keywords, keywords + padding):
+            for word_boundary in (False, True):
+                matcher = KeywordMatcher(keyword_list, word_boundary=word_boundary)
+                for _ in range(CHECK_TEXTS):
+                    text = random_text(rng, keyword_list)
+                    expected = reference_counts(text, keyword_list, word_boundary)
+                    got = matcher.counts(text)
+                    assert got == expected, (
+                        f"{name} ({len(keyword_list)} keywords, word_boundary={word_boundary}): "
+                        f"{text!r}\n  matcher {got}\n  str.count {expected}"
+                    )
+                    checked += 1
+    return checked
+
+
+def best_time(fn, *args):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    source, chunks = load_corpus_chunks()
+    total_chars = sum(len(c) for c in chunks)
+
+    print("=" * 86)
+    print("KEYWORD SCORING BENCHMARK")
+    print("=" * 86)
+    print(f"Corpus: {source}")
+    print(f"Chunks: {len(chunks):,} ({total_chars:,} characters), best of {REPEATS} runs")
+    print(f"Counts checked against str.count on {check_counts():,} random texts")
+    print()
+    print(f"{'Keyword list':<44} {'kw':>3} {'mode':>6} {'loop':>9} {'matcher':>9} {'speedup':>8}")
+    print("-" * 86)
+
+    for name, keywords in KEYWORD_LISTS.items():
+        matcher = KeywordMatcher(keywords)
+        for label, loop, fast in [
+            ("count", count_loop, matcher_scores),
+            ("presence", presence_loop, matcher_distinct),
+        ]:
+            loop_time = best_time(loop, chunks, keywords)
+            fast_time = best_time(fast, chunks, matcher)
+            mode = "scan" if matcher.single_pass else "count"
+            print(f"{name + ' (' + label + ')':<44} {len(keywords):>3} {mode:>6} "
+                  f"{loop_time * 1000:>7.1f}ms {fast_time * 1000:>7.1f}ms "
+                  f"{loop_time / fast_time:>7.2f}x")
+
+    print()
+    print("speedup > 1 means KeywordMatcher is faster than the existing loop.")
+    print("mode: 'scan' = one compiled trie pass per chunk, 'count' = str.count on one")
+    print("folded copy (used below SCAN_THRESHOLD keywords, where it is faster).")
@@ -0,0 +1,242 @@
+"""
+Benchmark: end-to-end stage timings over synthetic reports
+
+Generates synthetic sustainability reports with planted values
+(synthetic_pdfs.py, 10 to 2,000 pages, kept under .cache/bench_pdfs) and runs
+both extraction pipelines on each: extract_report.py's report_pipeline (what
+extract_sustainability_data runs) and Session 10's extract_document pipeline.
+LLM calls go to an in-process llm_stand_in server that answers every request
+with a schema-shaped placeholder, so the numbers measure the pipeline rather
+than the API. Page, stage and response caches start empty in a temporary
+directory, the journal is off, and the rate limiter is opened up (LLM_RPS).
+
+Per document and pipeline the report records each stage's seconds, pages/sec
+for ingest, chunks/sec for chunking and scoring, LLM calls, the share of
+planted values that reach the selected chunks, and the time of a fully cached
+rerun. It is written as JSON; with --baseline, stages more than --tolerance
+slower than in an earlier report are listed and the exit status is 1.
+
+Usage: python bench_pipeline.py [--pages 10 100 500 2000] [--latency fixed:0.05]
+                                [--output bench_pipeline.json] [--baseline old.json]
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from synthetic_pdfs import format_value, generate_corpus
+
+DATA_DIR = os.path.join(".cache", "bench_pdfs")
+NOTEBOOK = os.path.join("notebooks", "session10-validation-and-tools.py")
+# Differences below this many seconds are noise, whatever the ratio
+NOISE_SECONDS = 0.05
+
+
+def isolate(workdir):
+    """Point every cache and log at the benchmark's own directory (before the modules reading them are imported)."""
+    os.environ.update({
+        "PAGE_CACHE_DIR": os.path.join(workdir, "pages"),
+        "PIPELINE_CACHE_DIR": os.path.join(workdir, "stages"),
+        "LLM_USAGE_LOG": os.path.join(workdir, "usage.jsonl"),
+        "LLM_CACHE": "off",
+        "EXTRACTION_JOURNAL": "off",
+        "OPENAI_API_KEY": "stand-in",
+    })
+    os.environ.setdefault("LLM_RPS", "1000")
+    os.environ.setdefault("LLM_MAX_RPS", "1000")
+
+
+def load_notebook(path):
+    """
+    The definitions of a `# %%` notebook script, without running its demo cells.
+
+    Keeps imports, functions, classes and assignments to UPPER_CASE names (and
+    the `client` they use); everything else is skipped.
+
+    Returns:
+        The notebook's namespace
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+
+    def is_definition(node):
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef)):
+            return True
+        if isinstance(node, ast.Assign):
+            names = [target.id for target in node.targets if isinstance(target, ast.Name)]
+            return len(names) == len(node.targets) and all(n.isupper() or n == "client" for n in names)
+        return False
+
+    tree.body = [node for node in tree.body if is_definition(node)]
+    namespace = {"__name__": "notebook", "__file__": os.path.abspath(path)}
+    exec(compile(tree, path, "exec"), namespace)
+    return namespace
+
+
+def planted_recall(truth, texts):
+    """Share of the planted table values that appear in the selected chunks."""
+    values = {field: value for field, value in truth.items() if not field.endswith("_year")}
+    joined = "\n".join(texts)
+    return sum(format_value(value) in joined for value in values.values()) / len(values)
+
+
+def run_pipeline(pipeline, report, outputs, selected, usage_log, document_hash):
+    """Cold run, then a fully cached rerun, of one pipeline on one report."""
+    pdf_path = report["path"]
+    calls_before = len(usage_log.records)
+    start = time.perf_counter()
+    source_digest = document_hash(pdf_path)
+    hashed = time.perf_counter()
+    out = pipeline.run(pdf_path, source_digest, outputs=outputs)
+    total = time.perf_counter() - start
+    stages = {"hash": hashed - start, **pipeline.timings}
+    calls = len(usage_log.records) - calls_before
+
+    start = time.perf_counter()
+    pipeline.run(pdf_path, source_digest, outputs=outputs)
+    warm = time.perf_counter() - start
+
+    texts = selected(out)
+    chunks = len(out["chunk"])
+    score_stage = next(name for name in ("score", "select") if name in stages)
+    return {
+        "stages": {name: round(seconds, 4) for name, seconds in stages.items()},
+        "total_seconds": round(total, 4),
+        "warm_seconds": round(warm, 4),
+        "chunks": chunks,
+        "pages_per_second": round(report["pages"] / stages["ingest"], 1) if stages.get("ingest") else None,
+        "chunks_per_second": round(chunks / stages["chunk"], 1) if stages.get("chunk") else None,
+        "scored_chunks_per_second": (round(chunks / stages[score_stage], 1)
+                                     if stages.get(score_stage) else None),
+        "selected_chunks": len(texts),
+        "llm_calls": calls,
+        "planted_recall": round(planted_recall(report["truth"], texts), 3),
+    }
+
+
+def find_regressions(results, baseline, tolerance):
+    """Stages (and totals) more than `tolerance` slower than in `baseline`, as printable lines."""
+    before = {(doc["pages"], name): stats
+              for doc in baseline["documents"] for name, stats in doc["pipelines"].items()}
+    regressions = []
+    for doc in results["documents"]:
+        for name, stats in doc["pipelines"].items():
+            old = before.get((doc["pages"], name))
+            if old is None:
+                continue
+            pairs = [(stage, seconds, old["stages"].get(stage)) for stage, seconds in stats["stages"].items()]
+            pairs.append(("total", stats["total_seconds"], old["total_seconds"]))
+            for stage, new_seconds, old_seconds in pairs:
+                if old_seconds is None:
+                    continue
+                if new_seconds > old_seconds * (1 + tolerance) and new_seconds - old_seconds > NOISE_SECONDS:
+                    regressions.append(f"{doc['pages']:>5}p {name:<16} {stage:<9} "
+                                       f"{old_seconds:.2f}s -> {new_seconds:.2f}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each pipeline stage on synthetic reports.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500, 2000],
+                        help="Page counts of the synthetic reports (default: 10 100 500 2000)")
+    parser.add_argument("--latency", default="fixed:0", help="Stand-in LLM latency (see llm_stand_in.py)")
+    parser.add_argument("--data-dir", default=DATA_DIR, help=f"Where synthetic PDFs are kept (default: {DATA_DIR})")
+    parser.add_argument("--output", default="bench_pipeline.json", help="JSON report path")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Slowdown that counts as a regression (default: 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    print("=" * 72)
+    print("PIPELINE BENCHMARK (synthetic reports, stand-in LLM)")
+    print("=" * 72)
+
+    start = time.perf_counter()
+    reports = generate_corpus(args.data_dir, args.pages)
+    print(f"{len(reports)} synthetic reports ready in {time.perf_counter() - start:.1f}s ({args.data_dir})")
+
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    isolate(workdir)
+    # Imported only now: these read the cache, log and API settings on import
+    from llm_stand_in import Replayer, StandInServer, parse_latency
+    server = StandInServer(("127.0.0.1", 0), Replayer({}, parse_latency(args.latency), {}, miss="schema"))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    from checkpoint_journal import document_hash
+    from extract_report import report_pipeline
+    from pdf_text import default_cache as page_cache
+    from sustainability_schema import SustainabilityReport
+    from usage_log import default_usage_log
+
+    pipelines = {
+        "extract_report": lambda report: (
+            report_pipeline(report["path"], report["company"]),
+            ["chunk", "score", "merge", "validate"],
+            lambda out: out["score"],
+        ),
+    }
+    try:
+        notebook = load_notebook(NOTEBOOK)
+    except ImportError as e:
+        print(f"Skipping extract_document ({e})")
+    else:
+        pipelines["extract_document"] = lambda report: (
+            notebook["document_pipeline"](report["path"], SustainabilityReport, notebook["MODEL"]),
+            ["chunk", "select", "extract", "merge", "validate"],
+            lambda out: [chunk["text"] for chunk in out["select"]],
+        )
+
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "latency": args.latency,
+        "documents": [],
+    }
+    for report in reports:
+        doc = {"file": os.path.basename(report["path"]), "pages": report["pages"], "pipelines": {}}
+        print()
+        print(f"{doc['file']} ({report['pages']} pages)")
+        for name, make in pipelines.items():
+            # Each pipeline starts from an empty page cache, so both time a cold ingest
+            shutil.rmtree(page_cache.cache_dir, ignore_errors=True)
+            pipeline, outputs, selected = make(report)
+            stats = run_pipeline(pipeline, report, outputs, selected, default_usage_log, document_hash)
+            doc["pipelines"][name] = stats
+            stages = "  ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stats["stages"].items())
+            print(f"  {name}: {stats['total_seconds']:.2f}s cold, {stats['warm_seconds']:.2f}s cached | {stages}")
+            print(f"    {stats['pages_per_second']} pages/s, {stats['chunks']} chunks "
+                  f"({stats['chunks_per_second']}/s chunked, {stats['scored_chunks_per_second']}/s scored), "
+                  f"{stats['llm_calls']} LLM calls, {stats['planted_recall']:.0%} of planted values selected")
+        results["documents"].append(doc)
+
+    server.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print()
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions (> {args.tolerance:.0%} slower than {args.baseline}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Benchmark: json_object vs schema-constrained json_schema extraction
+
+Sends the same top-scoring chunks through the old json_object request (no
+field list in the prompt) and through the strict SustainabilityReport
+json_schema format, bypassing the response cache, and compares parse-failure
+rates and output tokens per call.
+
+Usage: python bench_response_format.py [pdf_path] [num_chunks]
+"""
+import sys
+
+from extract_report import (build_extraction_request, client, parse_extraction,
+                            select_report_chunks)
+from response_cache import bypass
+from structured_output import JSON_OBJECT, create_structured, format_summary
+from sustainability_schema import SustainabilityReport
+
+COMPANY = "the company"
+
+
+def run_json_object(chunk):
+    request = dict(build_extraction_request(chunk, COMPANY), response_format=JSON_OBJECT)
+    response = client.chat.completions.create(**request)
+    parse_extraction(response, COMPANY, request["response_format"])
+
+
+def run_json_schema(chunk):
+    response, request = create_structured(
+        client, SustainabilityReport, **build_extraction_request(chunk, COMPANY)
+    )
+    parse_extraction(response, COMPANY, request["response_format"])
+
+
+if __name__ == "__main__":
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else "data/corporate-sustainability/google-env-2024.pdf"
+    num_chunks = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    chunks = select_report_chunks(pdf_path, top_chunks=num_chunks)
+    print()
+
+    with bypass():
+        for label, run in [("json_object", run_json_object), ("json_schema", run_json_schema)]:
+            print(f"Running {len(chunks)} chunks with {label}...")
+            for chunk in chunks:
+                try:
+                    run(chunk)
+                except Exception as e:
+                    print(f"  ✗ {type(e).__name__}: {str(e)[:60]}")
+
+    print()
+    print("=" * 70)
+    print("RESPONSE FORMAT COMPARISON")
+    print("=" * 70)
+    print(format_summary())
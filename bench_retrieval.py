@@ -0,0 +1,137 @@
+"""
+Benchmark: recall@k of the chunk rankers against known values
+
+Ground truth is the values already extracted into sustainability_comparison.csv:
+a chunk is relevant to a (report, field) pair when the value appears in its
+text (e.g. 91200 as "91,200" or "91200"). For every such pair each ranker
+orders the report's chunks, and recall@k is the share of pairs with a relevant
+chunk in its top k. Years are skipped, since they appear on almost every page.
+
+Rankers: DATA_KEYWORDS counts (the current scorer, one ranking for all
+fields), per-field keyword weights, BM25, the hashed TF-IDF vector index
+(query = the field's name and description) and the keyword/vector hybrid.
+The BM25 and vector indexes are built over the benchmark PDFs in a temporary
+directory, so the saved indexes are left untouched.
+"""
+import csv
+import os
+import re
+import sys
+import tempfile
+import time
+
+from bm25_index import BM25Index
+from chunk_features import ChunkFeatures, field_keywords, top_k_indices
+from chunking import iter_chunks
+from extract_report import DATA_KEYWORDS
+from pdf_text import iter_page_texts
+from sustainability_schema import SustainabilityReport
+from vector_index import VectorIndex, field_query_texts, hybrid_scores
+
+GROUND_TRUTH_CSV = "sustainability_comparison.csv"
+# Same reports as compare_all_reports.py
+REPORTS = {
+    "Google": "data/corporate-sustainability/google-env-2024.pdf",
+    "Apple": "data/corporate-sustainability/apple-env-2024.pdf",
+    "Amazon": "data/corporate-sustainability/amazon-sustainability-2023.pdf",
+    "BP": "data/corporate-sustainability/bp-sustainability-2023.pdf",
+}
+KS = (1, 3, 5, 10)
+
+
+def value_pattern(field, value):
+    """Regex matching `value` as written in a report, or None if it cannot be located reliably."""
+    if field.endswith("_year"):
+        return None
+    number = float(value)
+    variants = {f"{number:,.0f}", f"{number:.0f}"} if number.is_integer() else {f"{number:,}", f"{number}"}
+    if field.endswith("_percentage"):
+        return re.compile("|".join(rf"(?<![\d.,]){re.escape(v)}\s?(?:%|percent)" for v in variants))
+    return re.compile("|".join(rf"(?<![\d.,]){re.escape(v)}(?![\d,]\d)" for v in variants))
+
+
+def load_ground_truth(path=GROUND_TRUTH_CSV):
+    """{company: {field: regex}} for every numeric value in the comparison CSV."""
+    truth = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            patterns = {}
+            for field, value in row.items():
+                try:
+                    float(value)
+                except ValueError:
+                    continue
+                pattern = value_pattern(field, value)
+                if pattern is not None:
+                    patterns[field] = pattern
+            truth[row["company_name"]] = patterns
+    return truth
+
+
+def recall_at(ranked, relevant, k):
+    return bool(relevant.intersection(ranked[:k]))
+
+
+if __name__ == "__main__":
+    truth = load_ground_truth()
+    reports = {company: path for company, path in REPORTS.items() if os.path.exists(path)}
+    if not reports:
+        sys.exit("No benchmark PDFs under data/; run download_data.sh first")
+
+    print("=" * 72)
+    print("RETRIEVAL RECALL BENCHMARK")
+    print("=" * 72)
+
+    workdir = tempfile.mkdtemp(prefix="bench_retrieval_")
+    start = time.perf_counter()
+    bm25 = BM25Index(os.path.join(workdir, "bm25.sqlite"))
+    for path in reports.values():
+        bm25.add_document(path)
+    vectors = VectorIndex.build(list(reports.values()), os.path.join(workdir, "vectors"), char_ngrams=(3, 5))
+    print(f"Indexes built in {time.perf_counter() - start:.1f}s ({workdir})")
+
+    max_k = max(KS)
+    hits = {name: {k: 0 for k in KS}
+            for name in ("DATA_KEYWORDS", "field keywords", "bm25", "vector", "hybrid")}
+    pairs = 0
+    for company, path in reports.items():
+        chunks = list(iter_chunks(iter_page_texts(path)))
+        fields = truth.get(company, {})
+        relevant = {field: {i for i, chunk in enumerate(chunks) if pattern.search(chunk)}
+                    for field, pattern in fields.items()}
+        relevant = {field: rows for field, rows in relevant.items() if rows}
+        print(f"{company}: {len(chunks)} chunks, {len(relevant)}/{len(fields)} known values found in the text")
+        if not relevant:
+            continue
+
+        weights = {field: field_keywords(SustainabilityReport, field) for field in relevant}
+        vocabulary = set(DATA_KEYWORDS) | {kw for w in weights.values() for kw in w}
+        features = ChunkFeatures.from_texts(chunks, vocabulary)
+        baseline = top_k_indices(features.scores(DATA_KEYWORDS), max_k).tolist()
+        cosine = vectors.cosine(list(field_query_texts(SustainabilityReport, list(relevant)).values()),
+                                document=path)
+
+        for i, (field, rows) in enumerate(relevant.items()):
+            keyword_scores = features.scores(weights[field])
+            rankings = {
+                "DATA_KEYWORDS": baseline,
+                "field keywords": top_k_indices(keyword_scores, max_k).tolist(),
+                "bm25": [hit["chunk"] for hit in bm25.search(weights[field], max_k, documents=[path])],
+                "vector": top_k_indices(cosine[i], max_k).tolist(),
+                "hybrid": top_k_indices(hybrid_scores(keyword_scores, cosine[i]), max_k).tolist(),
+            }
+            pairs += 1
+            for name, ranked in rankings.items():
+                for k in KS:
+                    hits[name][k] += recall_at(ranked, rows, k)
+
+    print()
+    if not pairs:
+        sys.exit("None of the known values appear in the PDFs; nothing to score")
+    print(f"Recall@k over {pairs} (report, field) pairs")
+    print(f"{'Ranker':<18}" + "".join(f"{'@' + str(k):>8}" for k in KS))
+    print("-" * (18 + 8 * len(KS)))
+    for name, counts in hits.items():
+        print(f"{name:<18}" + "".join(f"{counts[k] / pairs:>8.0%}" for k in KS))
+    print()
+    print("DATA_KEYWORDS is the scorer select_report_chunks(retrieval='keywords') uses today.")
@@ -0,0 +1,390 @@
+"""
+Persistent BM25 index over every chunk of every PDF in the corpus
+
+Chunks are tokenized once, when their document is added, into an inverted
+index stored in SQLite: one postings row per (term, document) holding the
+chunk numbers and term frequencies as packed NumPy arrays. Documents can be
+added one at a time (unchanged files are skipped, changed ones re-indexed),
+and a query reads only the postings rows of its own terms, so ranking chunks
+across the whole corpus takes milliseconds instead of a rescan of the text.
+
+BM25 normalizes term frequency by chunk length and saturates repeated words,
+so long chunks and chunks that say "target" twenty times no longer win on
+raw keyword counts.
+
+Usage:
+    python bm25_index.py build [data_dir]
+    python bm25_index.py search "scope 3 emissions" [k]
+"""
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from chunking import iter_chunk_records, read_spans
+from page_cache import pdf_cache_key
+from pdf_text import iter_page_texts
+
+INDEX_PATH = Path(os.environ.get(
+    "BM25_INDEX_PATH", Path(__file__).resolve().parent / ".cache" / "bm25.sqlite"
+))
+DATA_DIR = Path(__file__).resolve().parent / "data"
+# Standard BM25 parameters: term-frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercased alphanumeric tokens ("Scope 1 tCO2e" -> ["scope", "1", "tco2e"])."""
+    return _TOKEN.findall(text.lower())
+
+
+def query_weights(query):
+    """
+    {token: weight} for a query string, keyword list or {keyword: weight} dict.
+
+    Multi-word keywords are split into tokens that each carry the keyword's
+    weight (BM25 is a bag-of-words model: "scope 1" matches "scope" and "1").
+    """
+    if isinstance(query, str):
+        query = [query]
+    if not isinstance(query, dict):
+        query = {keyword: 1.0 for keyword in query}
+    weights = defaultdict(float)
+    for keyword, weight in query.items():
+        for token in tokenize(keyword):
+            weights[token] += weight
+    return dict(weights)
+
+
+class BM25Index:
+    """
+    On-disk inverted index of chunk tokens with BM25 ranking.
+
+    Args:
+        path: SQLite file holding the index (default: BM25_INDEX_PATH)
+        chunk_size, chunk_overlap: Chunking of indexed documents (the
+            iter_chunk_records defaults used by the extraction pipeline)
+    """
+
+    def __init__(self, path=INDEX_PATH, chunk_size=4000, chunk_overlap=200, k1=K1, b=B):
+        self.path = Path(path)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = None
+        self._chunk_table = None  # (generation, arrays over every chunk), see _chunks()
+
+    def _db(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " doc_id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER, mtime REAL,"
+                " content_key TEXT, chunks INTEGER, tokens INTEGER);"
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " doc_id INTEGER, chunk INTEGER, start INTEGER, end INTEGER,"
+                " first_page INTEGER, last_page INTEGER, length INTEGER,"
+                " PRIMARY KEY (doc_id, chunk)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS postings ("
+                " term TEXT, doc_id INTEGER, chunks BLOB, tfs BLOB,"
+                " PRIMARY KEY (term, doc_id)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER) WITHOUT ROWID;"
+                # Bumped by every change, so cached chunk tables notice other processes' writes
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER) WITHOUT ROWID;"
+            )
+        return self._conn
+
+    # -- Building ---------------------------------------------------------
+
+    def _bump_generation(self, db):
+        db.execute("INSERT INTO meta VALUES ('generation', 1)"
+                   " ON CONFLICT (key) DO UPDATE SET value = value + 1")
+
+    def _remove(self, db, doc_id):
+        for term, chunks in db.execute(
+            "SELECT term, chunks FROM postings WHERE doc_id = ?", (doc_id,)
+        ).fetchall():
+            db.execute("UPDATE terms SET df = df - ? WHERE term = ?",
+                       (len(chunks) // np.dtype(np.uint32).itemsize, term))
+        db.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        db.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+        db.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+        db.execute("DELETE FROM terms WHERE df <= 0")
+
+    def add_document(self, pdf_path, force=False):
+        """
+        Index every chunk of one PDF.
+
+        Files already indexed with the same content (page-cache key) are
+        skipped, even if they were touched or copied; changed files are
+        re-indexed.
+
+        Returns:
+            Number of chunks indexed (0 if the document was up to date)
+        """
+        pdf_path = Path(pdf_path).resolve()
+        stat = pdf_path.stat()
+        content_key = pdf_cache_key(pdf_path)
+        with self._lock:
+            row = self._db().execute(
+                "SELECT doc_id, content_key FROM documents WHERE path = ?", (str(pdf_path),)
+            ).fetchone()
+        if row is not None and not force and row[1] == content_key:
+            return 0
+
+        # Tokenize outside the lock: this is the slow part
+        postings = defaultdict(lambda: ([], []))  # term -> (chunk numbers, tfs)
+        chunk_rows = []
+        total_tokens = 0
+        pages = iter_page_texts(str(pdf_path))
+        for chunk in iter_chunk_records(pages, self.chunk_size, self.chunk_overlap):
+            tokens = tokenize(chunk["text"])
+            for term, tf in Counter(tokens).items():
+                numbers, tfs = postings[term]
+                numbers.append(chunk["index"])
+                tfs.append(min(tf, 65535))
+            chunk_pages = chunk["pages"] or [0]
+            chunk_rows.append((chunk["index"], chunk["start"], chunk["end"],
+                               chunk_pages[0], chunk_pages[-1], len(tokens)))
+            total_tokens += len(tokens)
+
+        with self._lock:
+            db = self._db()
+            with db:
+                if row is not None:
+                    self._remove(db, row[0])
+                doc_id = db.execute(
+                    "INSERT INTO documents (path, size, mtime, content_key, chunks, tokens)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (str(pdf_path), stat.st_size, stat.st_mtime, content_key,
+                     len(chunk_rows), total_tokens),
+                ).lastrowid
+                db.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               [(doc_id, *chunk_row) for chunk_row in chunk_rows])
+                db.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?, ?)",
+                    [(term, doc_id, np.asarray(numbers, dtype=np.uint32).tobytes(),
+                      np.asarray(tfs, dtype=np.uint16).tobytes())
+                     for term, (numbers, tfs) in postings.items()],
+                )
+                db.executemany(
+                    "INSERT INTO terms VALUES (?, ?) ON CONFLICT (term) DO UPDATE SET df = df + excluded.df",
+                    [(term, len(numbers)) for term, (numbers, _) in postings.items()],
+                )
+                self._bump_generation(db)
+            self._chunk_table = None
+        return len(chunk_rows)
+
+    def add_corpus(self, root=DATA_DIR):
+        """Index every PDF under `root` (recursively), skipping up-to-date ones."""
+        pdf_paths = sorted(Path(root).rglob("*.pdf"))
+        print(f"Indexing {len(pdf_paths)} PDFs under {root}...")
+        added = 0
+        for pdf_path in pdf_paths:
+            start = time.perf_counter()
+            try:
+                num_chunks = self.add_document(pdf_path)
+            except Exception as e:
+                print(f"  ✗ {pdf_path.name}: {e}")
+                continue
+            if num_chunks:
+                added += 1
+                print(f"  ✓ {pdf_path.name}: {num_chunks} chunks "
+                      f"({time.perf_counter() - start:.1f}s)")
+        print(f"  {added} documents indexed, {len(pdf_paths) - added} already up to date")
+        return added
+
+    def remove_document(self, pdf_path):
+        """Drop a document from the index (no-op if it was never added)."""
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT doc_id FROM documents WHERE path = ?",
+                             (str(Path(pdf_path).resolve()),)).fetchone()
+            if row is not None:
+                with db:
+                    self._remove(db, row[0])
+                    self._bump_generation(db)
+                self._chunk_table = None
+
+    # -- Querying ---------------------------------------------------------
+
+    def _chunks(self):
+        """
+        (doc ids, first global chunk row per doc id, lengths, starts, ends, first pages, last pages).
+
+        Cached until the index's generation changes, which includes documents
+        added or removed by other processes sharing the file.
+        """
+        db = self._db()
+        row = db.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        generation = row[0] if row else 0
+        if self._chunk_table is None or self._chunk_table[0] != generation:
+            rows = db.execute(
+                "SELECT doc_id, start, end, first_page, last_page, length FROM chunks"
+                " ORDER BY doc_id, chunk"
+            ).fetchall()
+            table = np.array(rows, dtype=np.int64).reshape(-1, 6)
+            doc_ids = table[:, 0]
+            unique, first = np.unique(doc_ids, return_index=True)
+            self._chunk_table = (generation, (doc_ids, dict(zip(unique.tolist(), first.tolist())),
+                                              table[:, 5], table[:, 1], table[:, 2], table[:, 3],
+                                              table[:, 4]))
+        return self._chunk_table[1]
+
+    def _doc_paths(self, documents):
+        """{doc_id: path} for the given paths (None: every document)."""
+        rows = self._db().execute("SELECT doc_id, path FROM documents").fetchall()
+        if documents is None:
+            return dict(rows)
+        wanted = {str(Path(path).resolve()) for path in documents}
+        return {doc_id: path for doc_id, path in rows if path in wanted}
+
+    def _score_snapshot(self, query, documents):
+        """scores() plus the chunk table the score rows refer to."""
+        weights = query_weights(query)
+        with self._lock:
+            db = self._db()
+            # One read transaction, so the chunk table, the documents and the
+            # postings agree even while another process is writing
+            db.execute("BEGIN")
+            try:
+                return self._score(db, weights, documents)
+            finally:
+                db.commit()
+
+    def _score(self, db, weights, documents):
+        """(scores, doc_paths, chunk table), read inside the caller's transaction."""
+        chunk_table = self._chunks()
+        _, first_row, lengths, *_ = chunk_table
+        doc_paths = self._doc_paths(documents)
+        scores = np.zeros(len(lengths))
+        if not len(lengths) or not weights:
+            return scores, doc_paths, chunk_table
+        num_chunks = len(lengths)
+        avg_length = max(lengths.mean(), 1.0)
+        norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+        for term, weight in weights.items():
+            df = db.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+            if df is None:
+                continue
+            idf = math.log(1 + (num_chunks - df[0] + 0.5) / (df[0] + 0.5))
+            for doc_id, chunks, tfs in db.execute(
+                "SELECT doc_id, chunks, tfs FROM postings WHERE term = ?", (term,)
+            ):
+                if doc_id not in doc_paths:
+                    continue
+                rows = first_row[doc_id] + np.frombuffer(chunks, dtype=np.uint32).astype(np.int64)
+                tf = np.frombuffer(tfs, dtype=np.uint16).astype(np.float64)
+                scores[rows] += weight * idf * tf * (self.k1 + 1) / (tf + norm[rows])
+        return scores, doc_paths, chunk_table
+
+    def scores(self, query, documents=None):
+        """
+        BM25 score of every indexed chunk for `query` (0 for chunks outside `documents`).
+
+        Returns:
+            (scores, doc_paths): a score per chunk row of the index, and
+            {doc_id: path} of the documents searched
+        """
+        scores, doc_paths, _ = self._score_snapshot(query, documents)
+        return scores, doc_paths
+
+    def search(self, query, k=10, documents=None):
+        """
+        Top-k chunks for `query`: a string, keyword list or {keyword: weight} dict.
+
+        Args:
+            query: What to look for (see query_weights)
+            k: Number of chunks to return
+            documents: PDF paths to search within (default: the whole index)
+
+        Returns:
+            List of hit dicts, best first: "document" (path), "chunk" (chunk
+            number in the document), "score", "start", "end" (character span
+            in the document text) and "pages" (first, last)
+        """
+        scores, doc_paths, chunk_table = self._score_snapshot(query, documents)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        # Best first; ties keep the earlier chunk first
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        doc_ids, first_row, _, starts, ends, first_pages, last_pages = chunk_table
+        return [{
+            "document": doc_paths[int(doc_ids[row])],
+            "chunk": int(row - first_row[int(doc_ids[row])]),
+            "score": float(scores[row]),
+            "start": int(starts[row]),
+            "end": int(ends[row]),
+            "pages": (int(first_pages[row]), int(last_pages[row])),
+        } for row in candidates]
+
+    def texts(self, hits):
+        """Chunk text of each hit, re-read from the page cache (in hit order)."""
+        by_document = defaultdict(list)
+        for i, hit in enumerate(hits):
+            by_document[hit["document"]].append(i)
+        texts = [None] * len(hits)
+        for document, positions in by_document.items():
+            spans = [(hits[i]["start"], hits[i]["end"]) for i in positions]
+            for i, text in zip(positions, read_spans(iter_page_texts(document), spans)):
+                texts[i] = text
+        return texts
+
+    def stats(self):
+        """Documents, chunks, distinct terms and on-disk size of the index."""
+        with self._lock:
+            db = self._db()
+            documents, chunks, tokens = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunks), 0), COALESCE(SUM(tokens), 0) FROM documents"
+            ).fetchone()
+            terms = db.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+        size = self.path.stat().st_size if self.path.exists() else 0
+        return {"documents": documents, "chunks": chunks, "tokens": tokens,
+                "terms": terms, "bytes": size}
+
+
+# Shared by the extraction scripts and notebooks
+default_index = BM25Index()
+
+
+def index_summary(index=default_index):
+    """One-line index report."""
+    stats = index.stats()
+    return (f"BM25 index: {stats['documents']} documents, {stats['chunks']:,} chunks, "
+            f"{stats['terms']:,} terms ({stats['bytes'] / 1024 / 1024:.1f} MB on disk)")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    if command == "build":
+        default_index.add_corpus(sys.argv[2] if len(sys.argv) > 2 else DATA_DIR)
+        print(index_summary())
+    elif command == "search":
+        query = sys.argv[2]
+        k = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+        start = time.perf_counter()
+        hits = default_index.search(query, k)
+        elapsed = time.perf_counter() - start
+        print(f"{len(hits)} chunks for {query!r} in {elapsed * 1000:.1f} ms")
+        print()
+        for hit, text in zip(hits, default_index.texts(hits)):
+            print(f"{hit['score']:6.2f}  {Path(hit['document']).name}  pages {hit['pages'][0]}-{hit['pages'][1]}")
+            print(f"        {' '.join(text.split())[:150]}...")
+    else:
+        print(f"Unknown command {command!r}; use 'build' or 'search'")
+        sys.exit(1)
@@ -0,0 +1,99 @@
+"""
+Cassettes: recorded chat completions for offline replay
+
+With LLM_CASSETTE_RECORD=path.jsonl set, every chat completion that reaches
+the API through llm_client is appended to that cassette: the HTTP request
+body, the response, its latency and time to first byte. llm_stand_in.py
+serves cassettes back as a local OpenAI-compatible endpoint.
+
+Record with the response cache off, so every call is a real one:
+
+    LLM_CACHE=off LLM_CASSETTE_RECORD=cassettes/extract_report.jsonl python extract_report.py
+    LLM_CACHE=off LLM_CASSETTE_RECORD=cassettes/run_part4.jsonl python run_part4.py
+
+Requests are matched by `body_key`, a hash of the request body as sent over
+HTTP (the SDK merges `extra_body` into it), so the recorder and the server
+agree on keys whichever client produced the request.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from checkpoint_journal import locked_append
+
+RECORD_PATH = os.environ.get("LLM_CASSETTE_RECORD")
+
+# SDK arguments that are not part of the HTTP body, or don't change the answer
+_NOT_IN_BODY = {"timeout", "extra_headers", "extra_query", "extra_body"}
+_TRANSPORT_FIELDS = {"stream", "stream_options"}
+
+
+def request_body(kwargs):
+    """The JSON body the OpenAI SDK sends for `chat.completions.create(**kwargs)`."""
+    body = {k: v for k, v in kwargs.items() if k not in _NOT_IN_BODY}
+    body.update(kwargs.get("extra_body") or {})
+    return body
+
+
+def body_key(body):
+    """SHA-256 of a request body's answer-relevant fields."""
+    relevant = {k: v for k, v in body.items() if k not in _TRANSPORT_FIELDS}
+    canonical = json.dumps(relevant, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def schema_name(body):
+    """Name of the json_schema a request asks for, or None."""
+    response_format = body.get("response_format") or {}
+    return (response_format.get("json_schema") or {}).get("name")
+
+
+class CassetteRecorder:
+    """Appends each real chat completion (request body, response, timings) to a JSONL cassette."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def record(self, kwargs, response, latency, ttfb=None):
+        body = request_body(kwargs)
+        entry = {
+            "key": body_key(body),
+            "time": time.time(),
+            "request": body,
+            "response": json.loads(response.model_dump_json()),
+            "latency": latency,
+            "ttfb": ttfb,
+        }
+        with self._lock:
+            locked_append(self.path, (json.dumps(entry, default=str) + "\n").encode("utf-8"))
+            self.recorded += 1
+
+
+def load_cassettes(paths):
+    """
+    Every entry of the given cassette files.
+
+    Returns:
+        {body key: [entries]}; a request recorded several times keeps every
+        answer, in recording order
+    """
+    entries = defaultdict(list)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn line from an interrupted recording
+                entries[entry["key"]].append(entry)
+    return dict(entries)
+
+
+# Shared by every client made in llm_client; None unless LLM_CASSETTE_RECORD is set
+default_recorder = CassetteRecorder(RECORD_PATH) if RECORD_PATH else None
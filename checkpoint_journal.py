@@ -0,0 +1,187 @@
+"""
+Append-only checkpoint journal of chunk extractions
+
+Every finished chunk extraction is appended as one JSON line keyed by
+(document hash, chunk id, model, prompt version), with its status and, when it
+succeeded, the raw chat completion. Rerunning after a crash, a timeout storm
+or Ctrl+C replays the chunks that already succeeded and only sends the rest;
+chunks that failed are tried again. Unlike the response cache, entries never
+expire or get evicted, and failures are recorded too.
+
+Appends hold an exclusive lock on the journal file (fcntl on POSIX, msvcrt on
+Windows), so worker processes can share one journal; each reader picks up
+lines appended by the others on its next lookup. A line torn by a crash
+mid-write is skipped on load.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+JOURNAL_PATH = Path(os.environ.get(
+    "EXTRACTION_JOURNAL_PATH", Path(__file__).resolve().parent / ".cache" / "extraction_journal.jsonl"
+))
+# EXTRACTION_JOURNAL=off disables checkpointing for a whole run
+ENABLED = os.environ.get("EXTRACTION_JOURNAL", "on").lower() not in ("0", "off", "false", "no")
+
+# (path, size, mtime) -> SHA-256, so a document is hashed once per run
+_document_hashes = {}
+
+
+def document_hash(pdf_path):
+    """SHA-256 of a document's bytes (computed once per file version)."""
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _document_hashes:
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        _document_hashes[key] = digest.hexdigest()
+    return _document_hashes[key]
+
+
+def chunk_id(text):
+    """Content-derived chunk id, stable across chunk selection methods."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def prompt_version(*parts):
+    """Short hash of everything that shapes the prompt (templates, schema)."""
+    canonical = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+@contextmanager
+def _locked(f):
+    """Exclusive inter-process lock on an open file."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def locked_append(path, line):
+    """
+    Append one line (bytes, newline-terminated) to `path` under an exclusive file lock.
+
+    If the file ends in a line torn by an earlier crash, the new line starts
+    on a fresh line instead of being glued onto it.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab+") as f:
+        with _locked(f):
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+
+
+class CheckpointJournal:
+    """JSONL journal of chunk extraction outcomes, replayable across runs and processes."""
+
+    def __init__(self, path=JOURNAL_PATH, enabled=ENABLED):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.replayed = 0
+        self.recorded = 0
+        self._entries = {}  # key -> latest successful entry
+        self._offset = 0    # bytes of the file already read
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(document, chunk, model, prompt):
+        """Journal key: document hash, chunk id, model and prompt version."""
+        return f"{document}:{chunk}:{model}:{prompt}"
+
+    def _refresh(self):
+        """Read the lines appended since the last read (by this or any other process)."""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # A trailing line without its newline is still being written (or was torn)
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            # A failure never hides an earlier success (e.g. from another worker)
+            if entry.get("status") == "ok":
+                self._entries[entry["key"]] = entry
+        self._offset += end
+
+    def lookup(self, key):
+        """The latest successful entry for `key`, or None if the chunk still has to be sent."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._refresh()
+            return self._entries.get(key)
+
+    def record(self, key, status, response=None, response_format=None):
+        """
+        Append a chunk's outcome.
+
+        Args:
+            key: From `key`
+            status: Status dict from resilience.call_with_retries
+            response: The raw ChatCompletion, for successful chunks
+            response_format: Response format the request was sent with
+        """
+        if not self.enabled:
+            return
+        entry = {
+            "key": key,
+            "time": time.time(),
+            "status": status["status"],
+            "error_kind": status["error_kind"],
+            "error": status["error"],
+            "attempts": status["attempts"],
+            "response_format": response_format,
+            "response": response.model_dump_json() if response is not None else None,
+        }
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with self._lock:
+            locked_append(self.path, line)
+            self.recorded += 1
+
+    def summary(self):
+        """One-line replay/record summary for this process."""
+        if not self.enabled:
+            return "Checkpoint journal: off"
+        size = self.path.stat().st_size / 1e6 if self.path.exists() else 0.0
+        return (f"Checkpoint journal: {self.replayed} chunks replayed, {self.recorded} recorded "
+                f"({size:.1f} MB at {self.path})")
+
+
+# Shared by every extraction in this process
+default_journal = CheckpointJournal()
+
+
+def journal_summary(journal=default_journal):
+    return journal.summary()
@@ -0,0 +1,311 @@
+"""
+Chunk x keyword count matrix for fast, re-weightable chunk ranking
+
+Scanning chunk text is the expensive part of chunk selection. ChunkFeatures
+scans each chunk once against a broad keyword vocabulary and keeps only the
+counts, as a sparse matrix in CSR form (NumPy arrays). Ranking with any
+keyword list or weighting over that vocabulary is then a sparse
+matrix-vector product plus a partial sort, with no rescan of the text.
+"""
+import re
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from keyword_matcher import KeywordMatcher
+
+# Keyword weights per extraction schema. Every keyword here is part of
+# KEYWORD_VOCABULARY, so any schema can rank chunks from the same matrix.
+SCHEMA_KEYWORD_WEIGHTS = {
+    "SustainabilityReport": {
+        "emissions": 1.0, "scope 1": 2.0, "scope 2": 2.0, "scope 3": 2.0,
+        "renewable": 1.0, "target": 0.5, "ghg": 1.0, "tco2": 2.0, "mwh": 1.5,
+        "percent": 0.5, "carbon neutral": 1.0, "net zero": 1.0,
+        "water withdrawal": 1.5, "water consumption": 1.5, "megaliters": 1.5,
+    },
+    "ClimateCommitment": {
+        "net zero": 2.0, "carbon neutral": 2.0, "target": 1.0, "baseline": 1.5,
+        "by 2030": 1.5, "by 2040": 1.5, "by 2050": 1.5, "interim": 1.5,
+        "scope 1": 1.0, "scope 2": 1.0, "scope 3": 1.0, "reduction": 1.0,
+    },
+    "CityClimatePlan": {
+        "emissions": 1.0, "reduction": 1.0, "target": 1.0, "goal": 1.0,
+        "ghg": 1.0, "carbon neutral": 1.5, "renewable": 1.0, "net zero": 1.5,
+        "baseline": 1.0, "percent": 0.5, "by 2030": 1.5, "by 2050": 1.5,
+        "transportation": 0.5, "building": 0.5, "equity": 0.5,
+    },
+}
+
+# Union of the keyword lists used across the scripts and notebooks
+KEYWORD_VOCABULARY = sorted(
+    {kw for weights in SCHEMA_KEYWORD_WEIGHTS.values() for kw in weights}
+    | {"carbon", "co2", "mtco2e", "metric tons", "twh", "gwh", "water", "by 20"}
+)
+
+
+# Field-name words too generic to point at the chunk holding a field
+_GENERIC_NAME_WORDS = {"total", "based", "units", "absolute", "percentage", "year",
+                       "name", "title", "description", "notes"}
+# Description wording that says how to look, not what to look for
+_DESCRIPTION_STOPWORDS = _GENERIC_NAME_WORDS | {
+    "about", "across", "amount", "approximate", "commitment", "company", "equal",
+    "field", "figure", "found", "labeled", "label", "look", "method", "might",
+    "often", "other", "reported", "reports", "report", "section", "sections",
+    "should", "statements", "table", "tables", "their", "there", "these", "typically",
+    "using", "value", "values", "where", "which", "within",
+}
+# A phrase quoted in a field description, e.g. 'Scope 1' (but not the ' in company's)
+_QUOTED_PHRASE = re.compile(r"(?<!\w)'([^']{2,40}?)'(?!\w)")
+# Quoted example values rather than labels: years and other long numbers
+# ('50% reduction by 2030'), percentages, amounts, and placeholders
+# ('carbon neutral by [year]', 'x% matched ...')
+_EXAMPLE_VALUE = re.compile(r"[\[\]{}<>%$]|\d{3,}|\d,\d|\b(?:x+|n)\b")
+_WORD = re.compile(r"[a-z][a-z0-9-]{4,}")
+
+
+def field_keywords(response_model, field):
+    """
+    {keyword: weight} for retrieving the chunks that may hold one schema field.
+
+    Labels quoted in the field's description ('Scope 1', 'tCO2e') weigh 2,
+    the field name's words 1, and the other content words of the description
+    0.5. Quoted example values ('50% reduction by 2030', 'carbon neutral by
+    [year]') are not labels a chunk would contain, so they are skipped. Use
+    the union over several fields as the ChunkFeatures vocabulary to rank
+    chunks for each of them.
+    """
+    description = (response_model.model_fields[field].description or "").lower()
+    weights = {}
+
+    def add(keyword, weight):
+        weights[keyword] = max(weight, weights.get(keyword, 0.0))
+
+    for word in _WORD.findall(description):
+        if word not in _DESCRIPTION_STOPWORDS:
+            add(word, 0.5)
+    for word in field.split("_"):
+        if len(word) >= 4 and word not in _GENERIC_NAME_WORDS:
+            add(word, 1.0)
+    for phrase in _QUOTED_PHRASE.findall(description):
+        if not _EXAMPLE_VALUE.search(phrase):
+            add(phrase.strip(), 2.0)
+    return weights
+
+
+def field_queries(response_model, fields=None):
+    """{field: field_keywords(...)} for `fields` (default: every field of the model)."""
+    if fields is None:
+        fields = list(response_model.model_fields)
+    return {field: field_keywords(response_model, field) for field in fields}
+
+
+def top_k_indices(scores, k, min_score=None):
+    """
+    Indices of the k highest `scores`, highest first (ties: lower index first).
+
+    Uses argpartition-style selection rather than a full sort. Entries below
+    `min_score` are never returned.
+    """
+    candidates = np.arange(len(scores))
+    if min_score is not None:
+        candidates = candidates[scores >= min_score]
+    n = len(candidates)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    candidate_scores = scores[candidates]
+    kth = np.partition(candidate_scores, n - k)[n - k]
+    above = candidates[candidate_scores > kth]
+    ties = candidates[candidate_scores == kth][:k - len(above)]
+    chosen = np.concatenate([above, ties])
+    # lexsort: last key is primary (score desc), then index asc
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
+
+
+def greedy_cover(ranked, max_chunks=None):
+    """
+    Greedy set cover over per-field ranked chunk lists.
+
+    Chunks are picked one at a time, each time the one that is a candidate
+    for the most still-uncovered fields (ties: better summed rank, then the
+    lower chunk id), until every field with a candidate is covered or
+    `max_chunks` are picked.
+
+    Args:
+        ranked: {field: chunk ids, best first}
+
+    Returns:
+        List of (chunk id, fields the chunk is a candidate for) in pick order
+    """
+    candidates = defaultdict(list)  # chunk -> fields it is a candidate for
+    rank_sum = defaultdict(int)
+    for field, chunks in ranked.items():
+        for rank, chunk in enumerate(chunks):
+            candidates[chunk].append(field)
+            rank_sum[chunk] += rank
+    uncovered = {field for field, chunks in ranked.items() if chunks}
+
+    picked = []
+    while uncovered and candidates and (max_chunks is None or len(picked) < max_chunks):
+        chunk = max(candidates, key=lambda c: (len(uncovered.intersection(candidates[c])),
+                                               -rank_sum[c], -c))
+        fields = candidates.pop(chunk)
+        uncovered.difference_update(fields)
+        picked.append((chunk, fields))
+    return picked
+
+
+class ChunkFeatures:
+    """
+    Sparse chunk-by-keyword count matrix.
+
+    Build it with `add` (one row per chunk, e.g. while streaming a document)
+    or `from_texts`, then rank with `top_k`. Keywords are case-folded, so
+    weights may be given in any case.
+
+    Args:
+        vocabulary: Keywords to count (default: KEYWORD_VOCABULARY)
+    """
+
+    def __init__(self, vocabulary=None):
+        if vocabulary is None:
+            vocabulary = KEYWORD_VOCABULARY
+        self.vocabulary = sorted({kw.lower() for kw in vocabulary})
+        self._column = {kw: j for j, kw in enumerate(self.vocabulary)}
+        self._matcher = KeywordMatcher(self.vocabulary)
+        # Rows are appended to Python lists, then frozen into arrays on first use
+        self._indptr = [0]
+        self._indices = []
+        self._data = []
+        self._arrays = None
+
+    @classmethod
+    def from_texts(cls, texts, vocabulary=None):
+        """Build the matrix from an iterable of chunk texts."""
+        features = cls(vocabulary)
+        for text in texts:
+            features.add(text)
+        return features
+
+    def add(self, text):
+        """Count the vocabulary in one chunk and append it as the next row."""
+        for keyword, count in sorted(self._matcher.counts(text).items()):
+            self._indices.append(self._column[keyword])
+            self._data.append(count)
+        self._indptr.append(len(self._indices))
+        self._arrays = None
+
+    def __len__(self):
+        return len(self._indptr) - 1
+
+    def _csr(self):
+        if self._arrays is None:
+            indptr = np.asarray(self._indptr, dtype=np.int64)
+            indices = np.asarray(self._indices, dtype=np.int32)
+            data = np.asarray(self._data, dtype=np.float64)
+            rows = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(indptr))
+            self._arrays = (indptr, indices, data, rows)
+        return self._arrays
+
+    def weight_vector(self, weights):
+        """
+        Dense weight vector over the vocabulary.
+
+        `weights` is a {keyword: weight} dict or a plain keyword list (weight 1
+        each). Keywords outside the vocabulary raise KeyError: the matrix has
+        no counts for them, so it would have to be rebuilt with them included.
+        """
+        if not isinstance(weights, dict):
+            weights = {kw: 1.0 for kw in weights}
+        vector = np.zeros(len(self.vocabulary))
+        for keyword, weight in weights.items():
+            column = self._column.get(keyword.lower())
+            if column is None:
+                raise KeyError(f"'{keyword}' is not in the feature vocabulary; "
+                               f"rebuild ChunkFeatures with it included")
+            vector[column] += weight
+        return vector
+
+    def counts(self, row):
+        """{keyword: count} for one chunk."""
+        indptr, indices, data, _ = self._csr()
+        start, end = indptr[row], indptr[row + 1]
+        return {self.vocabulary[j]: int(n) for j, n in zip(indices[start:end], data[start:end])}
+
+    def scores(self, weights, binary=False):
+        """
+        Weighted score of every chunk: counts @ weights.
+
+        With binary=True each keyword counts once per chunk however often it
+        occurs (the "how many different keywords" score the notebooks use).
+        """
+        if not isinstance(weights, np.ndarray):
+            weights = self.weight_vector(weights)
+        _, indices, data, rows = self._csr()
+        values = weights[indices] if binary else data * weights[indices]
+        return np.bincount(rows, weights=values, minlength=len(self))
+
+    def top_k(self, weights, k, binary=False, min_score=None):
+        """
+        Row indices of the k best chunks, highest score first.
+
+        Uses argpartition-style selection rather than a full sort. Ties keep
+        the earlier chunk first, matching a stable sort by score. Chunks below
+        `min_score` are never returned.
+        """
+        return top_k_indices(self.scores(weights, binary=binary), k, min_score)
+
+    def cover(self, queries, k=3, max_chunks=None, min_score=1):
+        """
+        Fewest chunks that include one of every field's top-k chunks.
+
+        Each field's query ({keyword: weight}, see field_queries) ranks the
+        chunks separately, then `greedy_cover` picks from the per-field top-k
+        lists. Fields whose query scores below `min_score` on every chunk
+        cannot be covered and are left out.
+
+        Returns:
+            List of (row, fields) in pick order, where fields are all the
+            fields the chunk is a top-k candidate for
+        """
+        ranked = {field: self.top_k(weights, k, min_score=min_score).tolist()
+                  for field, weights in queries.items()}
+        return greedy_cover(ranked, max_chunks)
+
+    def save(self, path):
+        """Write the matrix to an .npz file."""
+        indptr, indices, data, _ = self._csr()
+        np.savez_compressed(path, vocabulary=np.array(self.vocabulary),
+                            indptr=indptr, indices=indices, data=data)
+
+    @classmethod
+    def load(cls, path):
+        """Read a matrix written by `save`."""
+        with np.load(path) as saved:
+            features = cls(saved["vocabulary"].tolist())
+            features._indptr = saved["indptr"].tolist()
+            features._indices = saved["indices"].tolist()
+            features._data = saved["data"].tolist()
+        return features
+
+
+if __name__ == "__main__":
+    import sys
+    from chunking import iter_chunks
+    from pdf_text import iter_page_texts
+
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else "data/corporate-sustainability/google-env-2024.pdf"
+
+    start = time.perf_counter()
+    features = ChunkFeatures.from_texts(iter_chunks(iter_page_texts(pdf_path)))
+    print(f"Built {len(features)} x {len(features.vocabulary)} keyword matrix "
+          f"for {pdf_path} in {time.perf_counter() - start:.2f}s")
+    print()
+
+    for schema, weights in SCHEMA_KEYWORD_WEIGHTS.items():
+        start = time.perf_counter()
+        top = features.top_k(weights, 5)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        print(f"{schema:<22} top chunks {top.tolist()}  ({elapsed_us:.0f} µs)")
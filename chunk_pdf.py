@@ -1,8 +1,9 @@
 """
 Extract text from PDF and split into chunks using LangChain
 """
-import fitz  # PyMuPDF
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import os
+from pdf_text import cache_summary, iter_page_texts
+from chunking import iter_chunks
 
 print("=" * 70)
 print("PDF Text Chunking with LangChain")
@@ -14,76 +15,84 @@ pdf_paths = [
     "data/corporate-sustainability/google-env-2024.pdf",
 ]
 
-doc = None
 pdf_path = None
 
 for path in pdf_paths:
-    try:
-        temp_doc = fitz.open(path)
-        if len(temp_doc) > 0:
-            doc = temp_doc
-            pdf_path = path
-            print(f"✓ Successfully opened: {path}")
-            print(f"  Total pages: {len(doc)}")
-            break
-        else:
-            print(f"✗ Skipping {path} (0 pages)")
-            temp_doc.close()
-    except Exception as e:
-        print(f"✗ Error opening {path}: {e}")
-
-if doc is None:
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        pdf_path = path
+        print(f"✓ Found: {path}")
+        break
+    else:
+        print(f"✗ Skipping {path} (missing or empty)")
+
+if pdf_path is None:
     print("\nError: Could not open any PDF file")
     exit(1)
 
 print()
 print("-" * 70)
-print("Extracting text from all pages...")
+print("Extracting text and splitting into chunks...")
 print("-" * 70)
 
-# Extract text from all pages
-full_text = ""
-for page_num in range(len(doc)):
-    page = doc[page_num]
-    text = page.get_text()
-    full_text += text
-    if (page_num + 1) % 10 == 0:
-        print(f"  Processed {page_num + 1}/{len(doc)} pages...")
+# Pages are read lazily (from the page cache after the first run) and chunked
+# as they arrive, so the whole document is never held in memory. Each chunk is
+# written to the output file as soon as it is produced.
+stats = {"pages": 0, "characters": 0}
+
+def stream_pages():
+    for text in iter_page_texts(pdf_path):
+        stats["pages"] += 1
+        stats["characters"] += len(text)
+        if stats["pages"] % 10 == 0:
+            print(f"  Processed {stats['pages']} pages...")
+        yield text
+
+num_chunks = 0
+min_length = None
+max_length = 0
+total_length = 0
+first_chunk = None
 
-doc.close()
-
-print(f"✓ Extraction complete")
-print(f"  Total characters: {len(full_text):,}")
-print()
+output_file = "pdf_chunks.txt"
+with open(output_file, "w", encoding="utf-8") as f:
+    f.write(f"PDF: {pdf_path}\n")
+    f.write(f"=" * 70 + "\n\n")
 
-print("-" * 70)
-print("Splitting text into chunks...")
-print("-" * 70)
+    for chunk in iter_chunks(stream_pages(), chunk_size=4000, chunk_overlap=200):
+        num_chunks += 1
+        length = len(chunk)
+        min_length = length if min_length is None else min(min_length, length)
+        max_length = max(max_length, length)
+        total_length += length
+        if first_chunk is None:
+            first_chunk = chunk
+
+        f.write(f"CHUNK {num_chunks}\n")
+        f.write(f"Length: {length} characters\n")
+        f.write("-" * 70 + "\n")
+        f.write(chunk)
+        f.write("\n\n" + "=" * 70 + "\n\n")
 
-# Create text splitter with specified parameters
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=4000,
-    chunk_overlap=200,
-    length_function=len,
-    is_separator_regex=False,
-)
+    f.write(f"Total chunks: {num_chunks}\n")
 
-# Split the text into chunks
-chunks = text_splitter.split_text(full_text)
+print(f"✓ Extraction complete")
+print(f"  Total pages: {stats['pages']}")
+print(f"  Total characters: {stats['characters']:,}")
+print(f"  {cache_summary()}")
+print()
 
 print(f"✓ Text split complete")
-print(f"  Number of chunks created: {len(chunks)}")
+print(f"  Number of chunks created: {num_chunks}")
 print(f"  Chunk size: 4,000 characters")
 print(f"  Overlap: 200 characters")
 print()
 
 # Show statistics about chunk sizes
-if chunks:
-    chunk_lengths = [len(chunk) for chunk in chunks]
+if num_chunks:
     print(f"  Chunk sizes:")
-    print(f"    Min: {min(chunk_lengths):,} characters")
-    print(f"    Max: {max(chunk_lengths):,} characters")
-    print(f"    Average: {sum(chunk_lengths)//len(chunk_lengths):,} characters")
+    print(f"    Min: {min_length:,} characters")
+    print(f"    Max: {max_length:,} characters")
+    print(f"    Average: {total_length // num_chunks:,} characters")
 
 print()
 print("=" * 70)
@@ -91,28 +100,14 @@ print("First Chunk")
 print("=" * 70)
 print()
 
-if chunks:
-    print(chunks[0])
+if first_chunk is not None:
+    print(first_chunk)
     print()
     print("-" * 70)
-    print(f"First chunk length: {len(chunks[0])} characters")
+    print(f"First chunk length: {len(first_chunk)} characters")
     print("-" * 70)
 else:
     print("No chunks created")
 
-# Save chunks to file for reference
-output_file = "pdf_chunks.txt"
-with open(output_file, "w", encoding="utf-8") as f:
-    f.write(f"PDF: {pdf_path}\n")
-    f.write(f"Total chunks: {len(chunks)}\n")
-    f.write(f"=" * 70 + "\n\n")
-    
-    for i, chunk in enumerate(chunks, 1):
-        f.write(f"CHUNK {i}/{len(chunks)}\n")
-        f.write(f"Length: {len(chunk)} characters\n")
-        f.write("-" * 70 + "\n")
-        f.write(chunk)
-        f.write("\n\n" + "=" * 70 + "\n\n")
-
 print()
 print(f"✓ All chunks saved to: {output_file}")
@@ -0,0 +1,266 @@
+"""
+Array-backed chunk storage for one document
+
+Chunk dicts each hold their own copy of the chunk text (so the overlap is
+stored twice) next to a page number, an index and, once scored, a score, and
+scoring loops copy them again into (score, chunk) tuples. A ChunkStore keeps
+the document's page texts once, joined into a single buffer, and each chunk
+as a row of NumPy arrays: its start and end offset into the buffer, its page
+and its index on that page, and its score. Chunk text is sliced from the
+buffer only when it is asked for, and scoring, sorting and top-k run on the
+arrays (see chunk_features.top_k_indices).
+
+Indexing a store gives a Chunk, a two-slot view (store, row) that reads like
+the chunk dicts it replaces: chunk["text"], chunk["page_num"],
+chunk["chunk_index"], chunk["char_count"]. `take` copies a few rows into a
+compact store of their own, e.g. the selected chunks a pipeline stage keeps.
+"""
+import hashlib
+import sys
+
+import numpy as np
+
+from chunk_features import ChunkFeatures, top_k_indices
+from chunking import _split_with_starts, iter_chunk_records, make_splitter
+
+
+class Chunk:
+    """View of one row of a ChunkStore; reads like a chunk dict."""
+
+    __slots__ = ("store", "row")
+    KEYS = ("text", "page_num", "chunk_index", "char_count", "start", "end", "score")
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    @property
+    def text(self):
+        return self.store.text_of(self.row)
+
+    @property
+    def start(self):
+        return int(self.store.starts[self.row])
+
+    @property
+    def end(self):
+        return int(self.store.ends[self.row])
+
+    @property
+    def char_count(self):
+        return self.end - self.start
+
+    @property
+    def page_num(self):
+        return int(self.store.page_nums[self.row])
+
+    @property
+    def chunk_index(self):
+        return int(self.store.chunk_indices[self.row])
+
+    @property
+    def score(self):
+        scores = self.store.scores
+        return None if scores is None else float(scores[self.row])
+
+    @property
+    def pages(self):
+        """Page numbers the chunk spans."""
+        return self.store.pages_for_span(self.start, self.end)
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.KEYS else default
+
+    def __repr__(self):
+        return f"Chunk(row={self.row}, page_num={self.page_num}, char_count={self.char_count})"
+
+
+class ChunkStore:
+    """
+    A document's chunks: one text buffer plus per-chunk arrays.
+
+    Build it with `from_pages` (page dicts, split page by page like the
+    notebooks' chunk_pages), `from_page_texts` (a page stream, split across
+    pages like chunking.iter_chunk_records), `from_spans` or `from_texts`.
+
+    Attributes:
+        text: The buffer every chunk is a slice of
+        starts, ends: Each chunk's offsets into `text` (end exclusive)
+        page_nums: Page each chunk starts on
+        chunk_indices: Each chunk's index on its page (in the document for
+            chunks split across pages)
+        scores: One score per chunk once set (see `score`), else None
+        page_starts, page_numbers: Offset and number of each page in `text`
+    """
+
+    __slots__ = ("text", "starts", "ends", "page_nums", "chunk_indices", "scores", "page_starts",
+                 "page_numbers")
+
+    def __init__(self, text, starts, ends, page_nums, chunk_indices, page_starts, page_numbers,
+                 scores=None):
+        self.text = text
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.page_nums = np.asarray(page_nums, dtype=np.int32)
+        self.chunk_indices = np.asarray(chunk_indices, dtype=np.int32)
+        self.page_starts = np.asarray(page_starts, dtype=np.int64)
+        self.page_numbers = np.asarray(page_numbers, dtype=np.int32)
+        self.scores = None if scores is None else np.asarray(scores, dtype=np.float64)
+
+    @classmethod
+    def from_pages(cls, pages, chunk_size=4000, chunk_overlap=200, separators=None):
+        """
+        Split each page on its own (chunks never span pages).
+
+        Args:
+            pages: List of {"page_num", "text"} dicts
+        """
+        splitter = make_splitter(chunk_size, chunk_overlap, separators)
+        starts, ends, page_nums, chunk_indices = [], [], [], []
+        page_starts = []
+        offset = 0
+        for page in pages:
+            page_starts.append(offset)
+            for j, (start, chunk) in enumerate(_split_with_starts(splitter, page["text"], chunk_overlap)):
+                starts.append(offset + start)
+                ends.append(offset + start + len(chunk))
+                page_nums.append(page["page_num"])
+                chunk_indices.append(j)
+            offset += len(page["text"])
+        text = "".join(page["text"] for page in pages)
+        return cls(text, starts, ends, page_nums, chunk_indices, page_starts,
+                   [page["page_num"] for page in pages])
+
+    @classmethod
+    def from_spans(cls, page_texts, spans):
+        """
+        Chunks given as (start, end) spans of the joined page texts.
+
+        Args:
+            page_texts: Every page's text, in order (page 1 first)
+            spans: (start, end) offsets, e.g. from iter_chunk_records
+        """
+        lengths = np.fromiter((len(text) for text in page_texts), dtype=np.int64, count=len(page_texts))
+        page_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]) if len(lengths) else lengths
+        spans = np.asarray(spans, dtype=np.int64).reshape(-1, 2)
+        store = cls("".join(page_texts), spans[:, 0], spans[:, 1], [], np.arange(len(spans)),
+                    page_starts, np.arange(1, len(lengths) + 1))
+        store.page_nums = store.page_at(store.starts)
+        return store
+
+    @classmethod
+    def from_page_texts(cls, page_texts, chunk_size=4000, chunk_overlap=200, separators=None):
+        """Chunk a stream of page texts across page boundaries, as iter_chunk_records does."""
+        kept = []
+
+        def pages():
+            for text in page_texts:
+                kept.append(text)
+                yield text
+
+        spans = [(record["start"], record["end"])
+                 for record in iter_chunk_records(pages(), chunk_size, chunk_overlap, separators)]
+        return cls.from_spans(kept, spans)
+
+    @classmethod
+    def from_texts(cls, texts, page_nums, chunk_indices=None, scores=None):
+        """A compact store holding just `texts` (one chunk each) with their page numbers."""
+        texts = list(texts)
+        ends = np.cumsum([len(text) for text in texts], dtype=np.int64)
+        starts = ends - [len(text) for text in texts]
+        if chunk_indices is None:
+            chunk_indices = np.arange(len(texts))
+        return cls("".join(texts), starts, ends, page_nums, chunk_indices, starts,
+                   page_nums, scores)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("chunk row out of range")
+        return Chunk(self, int(row))
+
+    def __iter__(self):
+        return (Chunk(self, row) for row in range(len(self)))
+
+    def __repr__(self):
+        return f"ChunkStore({len(self)} chunks, {len(self.page_numbers)} pages, {len(self.text):,} chars)"
+
+    def text_of(self, row):
+        """Text of one chunk, sliced from the buffer."""
+        return self.text[self.starts[row]:self.ends[row]]
+
+    def texts(self, rows=None):
+        """Texts of `rows` (default: every chunk), sliced one at a time as the iterator is consumed."""
+        rows = range(len(self)) if rows is None else rows
+        return (self.text_of(row) for row in rows)
+
+    @property
+    def lengths(self):
+        return self.ends - self.starts
+
+    def page_at(self, offsets):
+        """Page number holding each buffer offset (empty pages are skipped, as in chunking.PageIndex)."""
+        return self.page_numbers[np.searchsorted(self.page_starts, offsets, side="right") - 1]
+
+    def pages_for_span(self, start, end):
+        """Page numbers covered by the buffer span [start, end)."""
+        first, last = self.page_at([start, max(start, end - 1)])
+        return list(range(int(first), int(last) + 1))
+
+    def features(self, vocabulary=None):
+        """ChunkFeatures keyword counts over every chunk (one pass over the text)."""
+        return ChunkFeatures.from_texts(self.texts(), vocabulary)
+
+    def score(self, weights, features=None, binary=False):
+        """
+        Score every chunk with ChunkFeatures weights and keep the scores.
+
+        Args:
+            weights: {keyword: weight} or a keyword list
+            features: ChunkFeatures of this store (built over `weights` if omitted)
+            binary: Count each keyword once per chunk (ChunkFeatures.scores)
+
+        Returns:
+            The scores array
+        """
+        if features is None:
+            features = self.features(weights)
+        self.scores = features.scores(weights, binary=binary)
+        return self.scores
+
+    def top_k(self, k, min_score=None):
+        """Rows of the k best-scoring chunks, best first (ties: earlier chunk first)."""
+        if self.scores is None:
+            raise ValueError("ChunkStore has no scores yet; call score() or set scores first")
+        return top_k_indices(self.scores, k, min_score)
+
+    def take(self, rows):
+        """A compact store of just `rows`, in that order, with their own buffer."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return ChunkStore.from_texts(self.texts(rows), self.page_nums[rows], self.chunk_indices[rows],
+                                     None if self.scores is None else self.scores[rows])
+
+    @property
+    def nbytes(self):
+        """Memory held by the buffer and the arrays."""
+        arrays = (self.starts, self.ends, self.page_nums, self.chunk_indices, self.page_starts,
+                  self.page_numbers, self.scores)
+        return sys.getsizeof(self.text) + sum(a.nbytes for a in arrays if a is not None)
+
+    def content_digest(self):
+        """sha256 of the chunks' text and offsets (used as the pipeline cache digest)."""
+        h = hashlib.sha256(self.text.encode("utf-8"))
+        for array in (self.starts, self.ends, self.page_nums, self.chunk_indices):
+            h.update(array.tobytes())
+        if self.scores is not None:
+            h.update(self.scores.tobytes())
+        return h.hexdigest()
@@ -0,0 +1,483 @@
+"""
+Streaming text chunker for page-by-page PDF text
+"""
+import random
+from bisect import bisect_right
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# How much text (in chunk_size units) to buffer before splitting. Memory use
+# is bounded by this window plus one page, whatever the document length.
+WINDOW_CHUNKS = 8
+# RecursiveCharacterTextSplitter's separators when none are given
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
+def make_splitter(chunk_size=4000, chunk_overlap=200, separators=None):
+    """The RecursiveCharacterTextSplitter configuration used across the repo."""
+    kwargs = {}
+    if separators is not None:
+        kwargs["separators"] = separators
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        is_separator_regex=False,
+        **kwargs,
+    )
+
+
+def _split_with_starts(splitter, text, chunk_overlap):
+    """Split `text`, returning (start, chunk) pairs with each chunk's offset in `text`."""
+    pieces = []
+    index = 0
+    previous_len = 0
+    for chunk in splitter.split_text(text):
+        # Same search LangChain uses for add_start_index: the next chunk starts
+        # no earlier than the end of the previous one minus the overlap.
+        offset = index + previous_len - chunk_overlap
+        found = text.find(chunk, max(0, offset))
+        index = found if found != -1 else text.find(chunk)
+        previous_len = len(chunk)
+        pieces.append((index, chunk))
+    return pieces
+
+
+def _merge_ranges(lengths, chunk_size, chunk_overlap):
+    """
+    RecursiveCharacterTextSplitter's merge of small splits into chunks.
+
+    Same rules as LangChain's _merge_splits (splits keep their separator, so
+    they are joined with ""), but returns each chunk as the (first, end) range
+    of split indices it joins. The last range is the chunk still open when the
+    splits ran out.
+    """
+    ranges = []
+    first = 0
+    total = 0
+    for i, length in enumerate(lengths):
+        if total + length > chunk_size:
+            if i > first:
+                ranges.append((first, i))
+                # Keep the trailing splits that fit in the overlap (and leave room for this one)
+                while total > chunk_overlap or (total + length > chunk_size and total > 0):
+                    total -= lengths[first]
+                    first += 1
+        total += length
+    if len(lengths) > first:
+        ranges.append((first, len(lengths)))
+    return ranges
+
+
+class _SplitStream:
+    """
+    RecursiveCharacterTextSplitter.split_text over text that arrives in pieces.
+
+    Feed text with `feed`, call `close` at the end, and collect (offset,
+    chunk) pairs with `take` as they become final. The chunks are exactly
+    those split_text returns for the whole text, but at most about a window
+    of text is held at a time:
+
+    - The separator in use is the first of `separators` seen so far. When an
+      earlier one turns up, everything before it is one split at the new
+      level, so it is finished at the old level (or, while still shorter
+      than a chunk, re-read at the new one).
+    - Once a window of text is buffered it is cut into splits. Every chunk
+      but the one still open is final; the buffer restarts at that chunk's
+      first split, where a fresh merge reproduces the splitter's state.
+    - A split that is already a chunk long (a huge paragraph) is fed, as it
+      arrives, to a nested stream over the remaining separators, as
+      split_text recurses into it.
+    """
+
+    def __init__(self, chunk_size, chunk_overlap, separators, window):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators
+        self.window = window
+        # Until a separator is seen, "" (if listed) or the last separator applies
+        self.level = separators.index("") if "" in separators else len(separators) - 1
+        # A separator may straddle two pieces; hold back enough to see it whole
+        self._hold = max(map(len, separators), default=1) - 1
+        self.held = ""
+        self.length = 0  # characters fed so far
+        self.buffer = ""  # text not yet split
+        self.buffer_start = 0  # stream offset of buffer[0]
+        self.child = None  # stream of an oversized split still arriving
+        self.child_start = 0  # stream offset of the child's text
+        self.oversized = False  # buffer holds an oversized split (child, or raw when no separators remain)
+        self.search_from = 0  # where the oversized split's end may start in buffer
+        self.out = []
+
+    @property
+    def separator(self):
+        return self.separators[self.level]
+
+    @property
+    def inner_separators(self):
+        return [] if self.separator == "" else self.separators[self.level + 1:]
+
+    def take(self):
+        """(offset, chunk) pairs final so far, in order."""
+        out, self.out = self.out, []
+        return out
+
+    def feed(self, text):
+        self.length += len(text)
+        region = self.held + text
+        base = self.length - len(region)
+        while True:
+            found = min(((region.find(sep), i) for i, sep in enumerate(self.separators[:self.level])
+                         if sep in region), default=None)
+            if found is None:
+                break
+            position, level = found
+            self._push(region[:position])
+            if base + position >= self.chunk_size:
+                self._finish()
+                self.buffer_start = base + position
+            # else: everything so far is still in the buffer and is simply re-split at the new level
+            self.level = level
+            region = region[position:]
+            base += position
+        cut = max(0, len(region) - self._hold)
+        self._push(region[:cut])
+        self.held = region[cut:]
+
+    def close(self):
+        self._push(self.held)
+        self.held = ""
+        self._finish()
+
+    def _push(self, text):
+        if not text:
+            return
+        self.buffer += text
+        if self.oversized:
+            self._continue_oversized()
+        elif len(self.buffer) >= self.window:
+            self._split(final=False)
+
+    def _finish(self):
+        if self.oversized:
+            self._end_oversized(len(self.buffer))
+        if self.buffer:
+            self._split(final=True)
+        self.buffer_start += len(self.buffer)
+        self.buffer = ""
+
+    def _splits(self, text):
+        """(offset, split) pairs of `text` at the current level, separators kept at the start."""
+        separator = self.separator
+        if not separator:
+            return list(enumerate(text))
+        starts = [0]
+        i = text.find(separator)
+        while i != -1:
+            starts.append(i)
+            i = text.find(separator, i + len(separator))
+        ends = starts[1:] + [len(text)]
+        return [(start, text[start:end]) for start, end in zip(starts, ends) if end > start]
+
+    def _split(self, final):
+        splits = self._splits(self.buffer)
+        last = None if final or not splits else splits.pop()
+        good = []
+        for offset, split in splits:
+            if len(split) < self.chunk_size:
+                good.append((offset, split))
+            else:
+                self._merge(good)
+                good = []
+                self._oversized_whole(offset, split)
+        if last is None:
+            self._merge(good)
+            return
+        if len(last[1]) >= self.chunk_size:
+            # Already a chunk long, so it is recursed into whatever follows
+            self._merge(good)
+            self._start_oversized(last[0])
+            return
+        restart = self._merge(good, keep_open=True)
+        restart = last[0] if restart is None else restart
+        self.buffer = self.buffer[restart:]
+        self.buffer_start += restart
+
+    def _merge(self, good, keep_open=False):
+        """Emit the chunks merged from `good`; with keep_open, return the open chunk's offset instead of emitting it."""
+        ranges = _merge_ranges([len(split) for _, split in good], self.chunk_size, self.chunk_overlap)
+        if keep_open and ranges:
+            *ranges, (open_first, _) = ranges
+        else:
+            open_first = None
+        for first, end in ranges:
+            joined = "".join(split for _, split in good[first:end])
+            chunk = joined.strip()
+            if chunk:
+                lead = len(joined) - len(joined.lstrip())
+                self.out.append((self.buffer_start + good[first][0] + lead, chunk))
+        return None if open_first is None else good[open_first][0]
+
+    def _oversized_whole(self, offset, split):
+        if not self.inner_separators:
+            self.out.append((self.buffer_start + offset, split))
+            return
+        child = _SplitStream(self.chunk_size, self.chunk_overlap, self.inner_separators, self.window)
+        child.feed(split)
+        child.close()
+        start = self.buffer_start + offset
+        self.out.extend((start + o, chunk) for o, chunk in child.take())
+
+    def _start_oversized(self, offset):
+        self.buffer = self.buffer[offset:]
+        self.buffer_start += offset
+        self.oversized = True
+        separator = self.separator
+        self.search_from = len(separator) if separator and self.buffer.startswith(separator) else 0
+        if self.inner_separators:
+            self.child = _SplitStream(self.chunk_size, self.chunk_overlap, self.inner_separators, self.window)
+            self.child_start = self.buffer_start
+        self._continue_oversized()
+
+    def _continue_oversized(self):
+        separator = self.separator
+        end = self.buffer.find(separator, self.search_from) if separator else -1
+        if end != -1:
+            self._end_oversized(end)
+            if len(self.buffer) >= self.window:
+                self._split(final=False)
+        elif self.child is not None:
+            # Pass on all but a possible partial separator at the end
+            cut = max(self.search_from, len(self.buffer) - max(len(separator) - 1, 0))
+            self._forward(cut)
+
+    def _forward(self, cut):
+        if cut > 0:
+            self.child.feed(self.buffer[:cut])
+            self.out.extend((self.child_start + o, chunk) for o, chunk in self.child.take())
+            self.buffer = self.buffer[cut:]
+            self.buffer_start += cut
+            self.search_from = max(0, self.search_from - cut)
+
+    def _end_oversized(self, end):
+        """The oversized split ends at buffer[end]; emit its chunks and go back to normal splitting."""
+        if self.child is not None:
+            self._forward(end)
+            self.child.close()
+            self.out.extend((self.child_start + o, chunk) for o, chunk in self.child.take())
+            self.child = None
+        elif end:
+            self.out.append((self.buffer_start, self.buffer[:end]))
+            self.buffer = self.buffer[end:]
+            self.buffer_start += end
+        self.oversized = False
+
+
+class PageIndex:
+    """
+    Cumulative page start offsets into the concatenated document text.
+
+    Pages are registered in order as they stream past; any character span can
+    then be mapped to its pages with a binary search.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.length = 0
+
+    def add(self, text):
+        self.starts.append(self.length)
+        self.length += len(text)
+
+    def page_at(self, offset):
+        """1-indexed page containing character `offset`."""
+        # bisect_right skips empty pages, which share their start with the next page
+        return bisect_right(self.starts, offset)
+
+    def pages_for_span(self, start, end):
+        """1-indexed pages covered by the character span [start, end)."""
+        first = self.page_at(start)
+        last = self.page_at(max(start, end - 1))
+        return list(range(first, last + 1))
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def iter_chunk_records(page_texts, chunk_size=4000, chunk_overlap=200, separators=None,
+                       page_index=None):
+    """
+    Chunk a stream of page texts as if they had been joined into one string.
+
+    The chunks are exactly those RecursiveCharacterTextSplitter.split_text
+    returns for the joined text, but text is buffered only until a window of
+    WINDOW_CHUNKS * chunk_size characters is available; that window is split,
+    every chunk that later text can no longer change is yielded, and the
+    buffer restarts where the splitter's merge can be picked up again (see
+    _SplitStream). A 1,000-page document is therefore chunked with memory
+    bounded by the window, and callers can score chunks before the final page
+    has been parsed.
+
+    Args:
+        page_texts: Iterable of page text strings, in document order
+        chunk_size: Maximum characters per chunk
+        chunk_overlap: Characters shared between consecutive chunks
+        separators: Optional splitter separators (LangChain defaults otherwise)
+        page_index: Optional PageIndex to fill in as pages stream past
+
+    Yields:
+        Dicts with "index", "text", "start" and "end" (character offsets into
+        the concatenated document, end exclusive) and "pages" (1-indexed pages
+        the chunk spans)
+    """
+    stream = _SplitStream(chunk_size, chunk_overlap, separators or DEFAULT_SEPARATORS,
+                          chunk_size * WINDOW_CHUNKS)
+    if page_index is None:
+        page_index = PageIndex()
+    index = 0
+
+    def records():
+        nonlocal index
+        for start, chunk in stream.take():
+            end = start + len(chunk)
+            yield {
+                "index": index,
+                "text": chunk,
+                "start": start,
+                "end": end,
+                "pages": page_index.pages_for_span(start, end),
+            }
+            index += 1
+
+    for text in page_texts:
+        page_index.add(text)
+        stream.feed(text)
+        yield from records()
+    stream.close()
+    yield from records()
+
+
+def read_spans(page_texts, spans):
+    """
+    Text of each (start, end) character span of a page stream.
+
+    The pages are read once, in order, keeping only the span text, and reading
+    stops after the last span ends. Chunk records keep their spans, so a few
+    selected chunks can be re-read from the page cache instead of holding
+    every chunk's text in memory.
+
+    Returns:
+        List of span texts, in the order of `spans`
+    """
+    parts = [[] for _ in spans]
+    last_end = max((end for _, end in spans), default=0)
+    offset = 0
+    for text in page_texts:
+        page_end = offset + len(text)
+        for part, (start, end) in zip(parts, spans):
+            if start < page_end and end > offset:
+                part.append(text[max(start - offset, 0):end - offset])
+        offset = page_end
+        if offset >= last_end:
+            break
+    return ["".join(part) for part in parts]
+
+
+def iter_span_texts(page_texts, spans):
+    """
+    Yield the text of each (start, end) span of a page stream, in order.
+
+    Spans must be sorted by start (chunk spans are). Only the pages from the
+    current span's start onwards are buffered, so memory stays bounded by a
+    chunk plus a page, as in `iter_chunk_records`.
+    """
+    pages = iter(page_texts)
+    buffer = ""
+    buffer_start = 0  # document offset of buffer[0]
+    for start, end in spans:
+        while buffer_start + len(buffer) < end:
+            text = next(pages, None)
+            if text is None:
+                break
+            buffer += text
+        yield buffer[start - buffer_start:end - buffer_start]
+        # Drop the text before this span once it outweighs the rest
+        if start - buffer_start > len(buffer) // 2:
+            buffer = buffer[start - buffer_start:]
+            buffer_start = start
+
+
+def iter_chunks(page_texts, chunk_size=4000, chunk_overlap=200, separators=None):
+    """Like `iter_chunk_records`, but yield only the chunk text strings."""
+    for chunk in iter_chunk_records(page_texts, chunk_size, chunk_overlap, separators):
+        yield chunk["text"]
+
+
+def _random_document(rng, chunk_size):
+    """Text with runs of every kind of separator, whitespace and separator-free stretches."""
+    parts = []
+    paragraphs = rng.random() < 0.5  # else "\n\n" is rare, so the level changes late
+    for _ in range(rng.randint(0, 600)):
+        roll = rng.random()
+        if roll < 0.004:
+            parts.append("y" * rng.randint(chunk_size // 2, chunk_size * 4))
+        elif roll < (0.024 if paragraphs else 0.0045):
+            parts.append("\n\n")
+        elif roll < 0.1:
+            parts.append("\n")
+        elif roll < 0.14:
+            parts.append(rng.choice(["  ", " \n ", "\n\n\n", "\t", ". ", "..", "\n \n"]))
+        else:
+            parts.append(rng.choice(["ab", "c", "de ", "f g ", "2023 ", "h."]))
+    return "".join(parts)
+
+
+def _random_pages(rng, text):
+    """`text` cut at random points, down to one-character pages."""
+    pages = []
+    i = 0
+    while i < len(text):
+        n = rng.choice([1, 2, 3, rng.randint(1, 50), rng.randint(1, 3000)])
+        pages.append(text[i:i + n])
+        i += n
+    return pages
+
+
+def check_streaming_split(trials=400, seed=0):
+    """
+    iter_chunk_records gives exactly split_text's chunks on random documents.
+
+    Chunk sizes, overlaps, separator lists and page cuts are random; the
+    window is shrunk to 2-8 chunks so every document restarts it many times.
+
+    Returns:
+        Number of documents checked; raises AssertionError on the first mismatch
+    """
+    global WINDOW_CHUNKS
+    rng = random.Random(seed)
+    window_chunks = WINDOW_CHUNKS
+    try:
+        for trial in range(trials):
+            chunk_size = rng.choice([20, 60, 150, 400, 1000, 4000])
+            chunk_overlap = rng.randint(0, chunk_size // 2)
+            separators = rng.choice([None, None, ["\n", ". ", " "], [". ", "\n\n", ""], ["\n\n", "."]])
+            WINDOW_CHUNKS = rng.choice([2, 3, 8])
+            text = _random_document(rng, chunk_size)
+            expected = make_splitter(chunk_size, chunk_overlap, separators).split_text(text)
+            records = list(iter_chunk_records(_random_pages(rng, text), chunk_size, chunk_overlap, separators))
+            assert [r["text"] for r in records] == expected, (
+                f"document {trial} (chunk_size={chunk_size}, chunk_overlap={chunk_overlap}, "
+                f"separators={separators!r}, window {WINDOW_CHUNKS} chunks): chunks differ from split_text"
+            )
+            for r in records:
+                assert text[r["start"]:r["end"]] == r["text"], f"document {trial}: chunk {r['index']} offsets are wrong"
+    finally:
+        WINDOW_CHUNKS = window_chunks
+    return trials
+
+
+if __name__ == "__main__":
+    # Usage: python chunking.py   (checks the streaming chunker against split_text)
+    import logging
+    logging.getLogger("langchain_text_splitters").setLevel(logging.ERROR)
+    print(f"Streaming chunks match split_text on {check_streaming_split():,} random documents")
@@ -3,12 +3,15 @@ Process all four sustainability reports and create comparison table
 """
 import os
 import pandas as pd
-from extract_report import extract_sustainability_data
+from extract_report import extract_chunks, merge_extractions, select_report_chunks
+from sustainability_schema import SustainabilityReport
+from tracing import default_tracer, trace_summary
+from usage_log import default_usage_log, usage_table
 
 # Set up environment variables
-os.environ["OPENAI_BASE_URL"] = "https://ellm.nrp-nautilus.io/v1"
-os.environ["OPENAI_API_KEY"] = "KK6sZ0tDaA0CS2uOUbSbBYD1L5uf0Arv"
-os.environ["OPENAI_MODEL"] = "qwen3"
+os.environ.setdefault("OPENAI_BASE_URL", "https://ellm.nrp-nautilus.io/v1")
+os.environ.setdefault("OPENAI_API_KEY", "KK6sZ0tDaA0CS2uOUbSbBYD1L5uf0Arv")
+os.environ.setdefault("OPENAI_MODEL", "qwen3")
 
 print("=" * 70)
 print("MULTI-COMPANY SUSTAINABILITY DATA EXTRACTION")
@@ -35,39 +38,73 @@ reports = [
     }
 ]
 
-# Extract data from each report
-results = []
+# Steps 1-3 for each report: select its top chunks
+selected = {}
 
 for i, report in enumerate(reports, 1):
     print(f"\n{'=' * 70}")
-    print(f"PROCESSING REPORT {i}/4: {report['company']}")
+    print(f"SELECTING CHUNKS {i}/4: {report['company']}")
     print(f"{'=' * 70}\n")
     
     try:
-        result = extract_sustainability_data(
-            pdf_path=report["path"],
-            company_name=report["company"],
-            top_chunks=5  # Process top 5 chunks for each company
-        )
-        
-        if result:
-            results.append(result.model_dump())
-            print(f"\n✓ {report['company']} extraction complete")
-        else:
-            print(f"\n✗ {report['company']} extraction failed - no data returned")
-            # Add empty result to maintain table structure
-            results.append({"company_name": report["company"]})
-    
+        # Process top 5 chunks for each company
+        with default_tracer.span("select", document=report["company"]):
+            selected[report["company"]] = select_report_chunks(report["path"], top_chunks=5)
     except Exception as e:
-        print(f"\n✗ {report['company']} extraction failed: {e}")
+        print(f"\n✗ {report['company']} chunk selection failed: {e}")
+
+# Step 4: all companies' chunks share one concurrency budget, so a slow report
+# does not leave the endpoint idle while the others wait their turn
+# Jobs name their PDF, so finished chunks are checkpointed and a rerun after a
+# crash or Ctrl+C only sends the chunks that are still missing
+paths = {report["company"]: report["path"] for report in reports}
+jobs = [(chunk, company, SustainabilityReport, paths[company])
+        for company, chunks in selected.items() for chunk in chunks]
+print(f"\n{'=' * 70}")
+print(f"EXTRACTING {len(jobs)} CHUNKS FROM {len(selected)} REPORTS")
+print(f"{'=' * 70}\n")
+with default_tracer.span("extract"):
+    job_statuses, interrupted = extract_chunks(jobs)
+
+# Step 5: merge each company's results
+results = []
+
+for report in reports:
+    company = report["company"]
+    company_statuses = [status for job, status in zip(jobs, job_statuses) if job[1] == company]
+    print(f"\n--- {company} ---")
+    with default_tracer.span("merge", document=company):
+        result = merge_extractions(company_statuses, interrupted)
+    
+    if result:
+        results.append(result.model_dump())
+        print(f"✓ {company} extraction complete")
+    else:
+        print(f"✗ {company} extraction failed - no data returned")
         # Add empty result to maintain table structure
-        results.append({"company_name": report["company"]})
+        results.append({"company_name": company})
 
 print("\n" + "=" * 70)
 print("ALL EXTRACTIONS COMPLETE")
 print("=" * 70)
 print()
 
+# Token use, latency and cost of this run's LLM calls, per company and per model
+print("LLM COST & LATENCY:")
+print("-" * 70)
+print(usage_table(default_usage_log.records, by="document"))
+print()
+print(usage_table(default_usage_log.records, by="model"))
+print()
+
+# Where the time went (with EXTRACTION_TRACE=trace.json set): PDF parsing,
+# splitting, scoring, queueing, network wait and parsing, per company
+if default_tracer.enabled:
+    print("TIME BY STAGE:")
+    print("-" * 70)
+    print(trace_summary())
+    print()
+
 # Create DataFrame
 df = pd.DataFrame(results)
 
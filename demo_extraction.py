@@ -2,14 +2,15 @@
 Demonstration of complete PDF extraction pipeline
 (Simplified version for demonstration)
 """
+import heapq
 import os
-import time
-import fitz
-from openai import OpenAI
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from llm_client import make_client
 from sustainability_schema import SustainabilityReport
+from pdf_text import cache_summary, iter_page_texts
+from chunking import iter_chunks
+from keyword_matcher import KeywordMatcher
 
-client = OpenAI(
+client = make_client(
     base_url=os.environ.get("OPENAI_BASE_URL"),
     api_key=os.environ.get("OPENAI_API_KEY"),
 )
@@ -20,45 +21,38 @@ print("PDF EXTRACTION PIPELINE DEMONSTRATION")
 print("=" * 70)
 print()
 
-# Step 1: Load PDF
+# Steps 1-3 stream: each page is chunked and scored as soon as it is read,
+# so the full document text is never built in memory
 pdf_path = "data/corporate-sustainability/google-env-2024.pdf"
 print("STEP 1: Loading PDF...")
-doc = fitz.open(pdf_path)
-num_pages = len(doc)
-
-full_text = ""
-for page_num in range(num_pages):
-    full_text += doc[page_num].get_text()
-
-doc.close()
-print(f"✓ Extracted {len(full_text):,} characters from {num_pages} pages")
-print()
-
-# Step 2: Chunk text
 print("STEP 2: Chunking text...")
-splitter = RecursiveCharacterTextSplitter(
-    chunk_size=4000,
-    chunk_overlap=200,
-)
-chunks = splitter.split_text(full_text)
-print(f"✓ Created {len(chunks)} chunks")
-print()
-
-# Step 3: Score and select top chunks
 print("STEP 3: Scoring chunks...")
 keywords = ["emissions", "Scope 1", "Scope 2", "Scope 3", "renewable", "target", "GHG"]
 
+stream_stats = {"pages": 0, "characters": 0, "chunks": 0}
+
+def stream_pages():
+    for text in iter_page_texts(pdf_path):
+        stream_stats["pages"] += 1
+        stream_stats["characters"] += len(text)
+        yield text
+
+matcher = KeywordMatcher(keywords)
+
 def score_chunk(chunk):
-    score = 0
-    chunk_lower = chunk.lower()
-    for kw in keywords:
-        score += chunk_lower.count(kw.lower())
-    return score
+    return matcher.score(chunk)
+
+def scored_chunks():
+    for i, chunk in enumerate(iter_chunks(stream_pages(), chunk_size=4000, chunk_overlap=200)):
+        stream_stats["chunks"] += 1
+        yield (i, score_chunk(chunk), chunk)
 
-chunk_scores = [(i, score_chunk(chunk), chunk) for i, chunk in enumerate(chunks)]
-chunk_scores.sort(key=lambda x: x[1], reverse=True)
+# Keep only the 3 best chunks (ties go to the earlier chunk)
+top_3 = heapq.nlargest(3, scored_chunks(), key=lambda x: x[1])
 
-top_3 = chunk_scores[:3]
+print(f"✓ Extracted {stream_stats['characters']:,} characters from {stream_stats['pages']} pages")
+print(f"  {cache_summary()}")
+print(f"✓ Created {stream_stats['chunks']} chunks")
 print(f"✓ Top 3 chunk scores: {[score for _, score, _ in top_3]}")
 print()
 
@@ -1,7 +1,9 @@
 """
 Simple Climate Commitment Extraction - Saves to JSON and CSV
 """
-from openai import OpenAI
+from llm_client import make_client
+from resilience import EmptyResponseError
+from structured_output import create_structured, format_summary, parse_structured
 from pydantic import BaseModel, Field
 from typing import Optional
 import os
@@ -21,7 +23,7 @@ class ClimateCommitment(BaseModel):
     interim_target: Optional[str] = Field(None, description="Any intermediate target")
 
 # Configure client
-client = OpenAI(
+client = make_client(
     base_url=os.environ.get("OPENAI_BASE_URL", "https://ellm.nrp-nautilus.io/v1"),
     api_key=os.environ.get("OPENAI_API_KEY"),
 )
@@ -49,7 +51,10 @@ for company, text in company_texts.items():
     print(f"Processing {company}...", end=" ")
     
     try:
-        response = client.chat.completions.create(
+        # Answer constrained to the ClimateCommitment schema (json_object fallback)
+        response, request = create_structured(
+            client,
+            ClimateCommitment,
             model=MODEL,
             messages=[
                 {
@@ -58,20 +63,20 @@ for company, text in company_texts.items():
                 },
                 {"role": "user", "content": text}
             ],
-            response_format={"type": "json_object"},
             extra_body={"chat_template_kwargs": {"thinking": False}},
         )
         
-        if response.choices[0].message.content:
-            extracted = json.loads(response.choices[0].message.content)
-            commitment = ClimateCommitment(**extracted)
-            results.append(commitment.model_dump())
-            print(f"✓ ({commitment.target_year})")
-        else:
-            print("✗ (no content)")
+        commitment = parse_structured(response, ClimateCommitment, request["response_format"])
+        results.append(commitment.model_dump())
+        print(f"✓ ({commitment.target_year})")
+    except EmptyResponseError:
+        print("✗ (no content)")
     except Exception as e:
         print(f"✗ ({e})")
 
+print()
+print(format_summary())
+
 # Save JSON
 json_file = f"climate_commitments_output.json"
 output = {
@@ -2,6 +2,7 @@
 Extract text from Google Environmental Report using PyMuPDF
 """
 import fitz  # PyMuPDF
+from pdf_text import cache_summary, load_page_texts
 
 # Open the PDF file
 pdf_path = "data/corporate-sustainability/apple-env-2024.pdf"
@@ -21,11 +22,13 @@ try:
     file_size = os.path.getsize(pdf_path) / 1024 / 1024
     print(f"File size: {file_size:.2f} MB")
     
-    # Open the PDF
+    # Open the PDF (metadata only; page text comes from the page cache)
     doc = fitz.open(pdf_path)
+    page_texts = load_page_texts(pdf_path)
     
     print(f"Total pages: {len(doc)}")
     print(f"PDF metadata: {doc.metadata}")
+    print(cache_summary())
     print()
     
     # Extract text from page 10 (index 9, since PyMuPDF uses 0-based indexing)
@@ -38,8 +41,7 @@ try:
         print("=" * 70)
         print()
         
-        page = doc[page_index]
-        text = page.get_text()
+        text = page_texts[page_index]
         
         print(text)
         
@@ -1,41 +1,102 @@
 """
 Complete PDF extraction pipeline for sustainability report data
 """
+import asyncio
+import json
+import math
 import os
+import sys
 import time
-import fitz  # PyMuPDF
-from openai import OpenAI
+from collections import Counter
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from sustainability_schema import SustainabilityReport
+from pdf_text import cache_summary, iter_page_texts, load_page_texts
+from chunking import iter_chunk_records, iter_span_texts, read_spans
+from chunk_features import ChunkFeatures, field_queries, greedy_cover, top_k_indices
+from bm25_index import default_index
+from vector_index import field_query_texts, hybrid_scores, load_index
+from keyword_matcher import get_matcher
+from llm_client import make_async_client, make_client
+from rate_limiter import limiter_summary
+from response_cache import response_cache_summary
+from usage_log import usage_context
+from structured_output import (create_structured, create_structured_async, format_summary,
+                               parse_structured, strict_json_schema, sub_model)
+from resilience import (RetryBudget, call_with_retries, call_with_retries_async,
+                        get_breaker, interrupted_status, replayed_status, skipped_status)
+from checkpoint_journal import chunk_id, default_journal, document_hash, prompt_version
+from pipeline import Pipeline, Stage, format_plan
+from profiling import default_profiler, profile_summary
+from tracing import default_tracer, trace_summary
+from openai.types.chat import ChatCompletion
 
-# Initialize OpenAI client
-client = OpenAI(
+# Initialize OpenAI client (rate-limited, see llm_client.py)
+# Retries are handled by resilience.call_with_retries, not the SDK
+client = make_client(
     base_url=os.environ.get("OPENAI_BASE_URL"),
     api_key=os.environ.get("OPENAI_API_KEY"),
+    max_retries=0,
 )
 MODEL = os.environ.get("OPENAI_MODEL", "qwen3")
 
+# Chunk extraction requests in flight at once (see extract_chunks)
+EXTRACTION_CONCURRENCY = int(os.environ.get("EXTRACTION_CONCURRENCY", "4"))
+
+# A document's extraction stops once these fields are filled (see FieldTracker).
+# company_name always comes from the caller and free-text notes never count
+TARGET_FIELDS = [name for name in SustainabilityReport.model_fields
+                 if name not in ("company_name", "notes")]
+# Chunks that must report a field before it counts as filled
+MIN_FIELD_SOURCES = int(os.environ.get("EXTRACTION_MIN_FIELD_SOURCES", "1"))
+
+# How the extraction prompt words each schema's documents: (what to extract,
+# the kind of documents, where an excerpt comes from given the document's name)
+PROMPT_WORDING = {
+    "SustainabilityReport": ("sustainability and environmental data",
+                             "sustainability metrics from corporate reports", "{name}'s report"),
+    "CityClimatePlan": ("climate targets and strategies",
+                        "climate targets and strategies from city climate action plans",
+                        "the climate action plan of {name}"),
+    "EnergyPlanReport": ("energy planning data and projections",
+                         "energy projections from energy planning reports and IRPs",
+                         "the energy planning report {name}"),
+}
+
 # Keywords for scoring chunks
 DATA_KEYWORDS = [
     "emissions", "Scope 1", "Scope 2", "Scope 3", "renewable",
     "target", "GHG", "tCO2", "MWh", "percent", "carbon neutral", "net zero"
 ]
 
-def extract_pdf_text(pdf_path):
-    """Extract text from all pages of a PDF."""
+def extract_pdf_text(pdf_path, workers=None):
+    """Extract text from all pages of a PDF.
+
+    Page text comes from the on-disk page cache when this exact PDF has been
+    parsed before. Otherwise large documents are extracted page-parallel across
+    `workers` processes (default: one per CPU); `workers=1` forces serial extraction.
+    """
+    return "".join(load_pdf_pages(pdf_path, workers))
+
+def load_pdf_pages(pdf_path, workers=None):
+    """Like extract_pdf_text, but return the list of page texts."""
     print(f"Loading PDF: {pdf_path}")
-    doc = fitz.open(pdf_path)
+    page_texts = load_page_texts(pdf_path, workers=workers)
     
-    num_pages = len(doc)
-    full_text = ""
-    for page_num in range(num_pages):
-        page = doc[page_num]
-        text = page.get_text()
-        full_text += text
-    
-    doc.close()
-    print(f"  Extracted {len(full_text):,} characters from {num_pages} pages")
-    return full_text
+    print(f"  Extracted {sum(map(len, page_texts)):,} characters from {len(page_texts)} pages")
+    print(f"  {cache_summary()}")
+    return page_texts
+
+def stream_pdf_pages(pdf_path, workers=None):
+    """Yield page texts lazily, reporting totals once the last page has been read."""
+    print(f"Loading PDF: {pdf_path}")
+    num_pages = 0
+    num_chars = 0
+    for text in iter_page_texts(pdf_path, workers=workers):
+        num_pages += 1
+        num_chars += len(text)
+        yield text
+    print(f"  Extracted {num_chars:,} characters from {num_pages} pages")
+    print(f"  {cache_summary()}")
 
 def chunk_text(text, chunk_size=4000, chunk_overlap=200):
     """Split text into overlapping chunks."""
@@ -53,89 +114,392 @@ def chunk_text(text, chunk_size=4000, chunk_overlap=200):
     return chunks
 
 def score_chunk(chunk, keywords):
-    """Score a chunk by counting keyword occurrences."""
-    chunk_lower = chunk.lower()
-    score = 0
-    for keyword in keywords:
-        count = chunk_lower.count(keyword.lower())
-        score += count
-    return score
-
-def select_top_chunks(chunks, keywords, top_n=10):
-    """Score all chunks and return the top N highest-scoring ones."""
+    """Score a chunk by counting keyword occurrences (case-insensitive)."""
+    return get_matcher(keywords).score(chunk)
+
+def build_chunk_features(chunks, vocabulary=None):
+    """Count keywords in a stream of chunk records, keeping each chunk's span.
+
+    This is the only pass over the chunk text. Any keyword list or weighting
+    over the vocabulary (default: chunk_features.KEYWORD_VOCABULARY) can then
+    rank the chunks without rescanning them.
+
+    Returns:
+        (ChunkFeatures, list of (start, end) chunk spans)
+    """
+    features = ChunkFeatures(vocabulary)
+    spans = []
+    for chunk in chunks:
+        features.add(chunk["text"])
+        spans.append((chunk["start"], chunk["end"]))
+    return features, spans
+
+def select_top_chunks(features, keywords, top_n=10, vector_scores=None, vector_weight=0.5):
+    """Rank chunks by weighted keyword counts and return the top N chunk indices.
+
+    `keywords` is a keyword list (each occurrence scores 1, as in `score_chunk`)
+    or a {keyword: weight} dict such as chunk_features.SCHEMA_KEYWORD_WEIGHTS.
+    With `vector_scores` (one cosine score per chunk, see vector_index) the
+    ranking blends the two after scaling each to [0, 1]; vector_weight=1
+    ranks by the vectors alone.
+    """
     print(f"Scoring chunks and selecting top {top_n}...")
     
-    # Score each chunk
-    chunk_scores = []
-    for i, chunk in enumerate(chunks):
-        score = score_chunk(chunk, keywords)
-        chunk_scores.append({
-            'index': i,
-            'score': score,
-            'chunk': chunk
-        })
+    scores = features.scores(keywords)
+    if vector_scores is not None:
+        scores = hybrid_scores(scores, vector_scores, vector_weight)
+    top = top_k_indices(scores, top_n)
+    
+    print(f"  Scored {len(features)} chunks")
+    print(f"  Top chunk scores: {[float(scores[i]) for i in top[:5]]}...")
+    
+    return top.tolist()
+
+def select_field_chunks(features, queries, per_field=3, max_chunks=None):
+    """Rank chunks per field and keep the fewest that cover every field.
+
+    Each field is ranked with its own query (chunk_features.field_queries:
+    keywords from the field's name and description) and the chunk set is a
+    greedy set cover over the per-field top `per_field` lists, so one chunk
+    holding an emissions table serves every emissions field.
+
+    Returns:
+        List of (chunk index, fields the chunk was retrieved for), best first
+    """
+    print(f"Selecting chunks for {len(queries)} fields (top {per_field} per field)...")
     
-    # Sort by score (descending) and take top N
-    chunk_scores.sort(key=lambda x: x['score'], reverse=True)
-    top_chunks = chunk_scores[:top_n]
+    picked = features.cover(queries, per_field, max_chunks=max_chunks)
+    covered = {field for _, fields in picked for field in fields}
     
-    print(f"  Top chunk scores: {[c['score'] for c in top_chunks[:5]]}...")
+    print(f"  Scored {len(features)} chunks")
+    print(f"  {len(picked)} chunks cover {len(covered)}/{len(queries)} fields")
     
-    return [c['chunk'] for c in top_chunks]
+    return picked
 
-def extract_from_chunk(chunk, company_name):
-    """Send a chunk to the AI and extract structured data."""
-    try:
-        # Create the extraction prompt
-        prompt = f"""Extract sustainability and environmental data from the following text excerpt from {company_name}'s report.
+def prompt_wording(response_model):
+    """PROMPT_WORDING for a schema or a sub-schema of it (structured_output.sub_model)."""
+    name = response_model.__name__
+    base = name.removesuffix("Fields")
+    return PROMPT_WORDING.get(name) or PROMPT_WORDING.get(base) or (
+        "structured data", "structured data from documents", "{name}"
+    )
+
+def build_extraction_request(chunk, company_name, response_model=SustainabilityReport):
+    """Keyword arguments for the chat completion that extracts one chunk.
+
+    The prompt describes the documents `response_model` is for (see
+    PROMPT_WORDING); the response format is left to `structured_output`,
+    which constrains the answer to that schema.
+    """
+    what, documents, source = prompt_wording(response_model)
+    # Create the extraction prompt
+    prompt = f"""Extract {what} from the following text excerpt from {source.format(name=company_name)}.
 
 Extract all available information according to the schema. If a field is not mentioned or cannot be determined from this text, leave it as null.
 
 Text excerpt:
 {chunk}
 """
-        
-        # Call API with JSON mode and thinking disabled
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a data extraction assistant. Extract sustainability metrics from corporate reports accurately. Return only the requested structured data."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            response_format={"type": "json_object"},
-            extra_body={"chat_template_kwargs": {"thinking": False}},
-            temperature=0.0,
-            timeout=120.0,  # 120 second timeout
+    
+    # Thinking disabled for reliable structured output
+    return dict(
+        model=MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": f"You are a data extraction assistant. Extract {documents} accurately. Return only the requested structured data."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        extra_body={"chat_template_kwargs": {"thinking": False}},
+        temperature=0.0,
+        timeout=120.0,  # 120 second timeout
+    )
+
+def parse_extraction(response, company_name, response_format=None,
+                     response_model=SustainabilityReport):
+    """Validate a chat completion's JSON content as a SustainabilityReport (or a sub-schema of it)."""
+    # Add company_name if not present
+    defaults = {"company_name": company_name} if "company_name" in response_model.model_fields else None
+    return parse_structured(response, response_model, response_format, defaults=defaults)
+
+def _parse_or_discard(api_client, response, request, company_name, response_model):
+    try:
+        return parse_extraction(response, company_name, request["response_format"], response_model)
+    except Exception:
+        # Don't let a retry replay the same unusable answer from the cache
+        if api_client.cache is not None:
+            api_client.cache.discard(request)
+        raise
+
+def _request_and_parse(api_client, chunk, company_name, response_model):
+    with default_tracer.span("request", category="llm"):
+        response, request = create_structured(
+            api_client, response_model, **build_extraction_request(chunk, company_name, response_model)
         )
+    with default_tracer.span("parse", category="llm"):
+        return _parse_or_discard(api_client, response, request, company_name, response_model)
+
+async def _request_and_parse_async(async_client, chunk, company_name, response_model, raw=None):
+    with default_tracer.span("request", category="llm"):
+        response, request = await create_structured_async(
+            async_client, response_model, **build_extraction_request(chunk, company_name, response_model)
+        )
+    with default_tracer.span("parse", category="llm"):
+        result = _parse_or_discard(async_client, response, request, company_name, response_model)
+    if raw is not None:
+        raw.update(response=response, response_format=request["response_format"])
+    return result
+
+def extract_from_chunk(chunk, company_name, budget=None, response_model=SustainabilityReport):
+    """
+    Send a chunk to the AI and extract structured data.
+    
+    Transient failures (timeouts, 429s, 5xx, unparseable or empty answers) are
+    retried with exponential backoff, drawing on `budget` (a RetryBudget
+    shared by the document's chunks) when given. `response_model` may be a
+    sub-schema of SustainabilityReport (see structured_output.sub_model) to
+    ask for only some fields.
+    
+    Returns:
+        Status dict: "status" ("ok" or "failed"), "result" (SustainabilityReport
+        or None), "error_kind", "error" and "attempts"
+    """
+    return call_with_retries(
+        lambda: _request_and_parse(client, chunk, company_name, response_model),
+        breaker=get_breaker(client.base_url),
+        budget=budget,
+    )
+
+async def extract_from_chunk_async(async_client, chunk, company_name, budget=None,
+                                   response_model=SustainabilityReport, raw=None):
+    """
+    Async `extract_from_chunk` on an async client; returns the same status dict.
+    
+    When given, `raw` (a dict) receives the successful attempt's "response"
+    (the ChatCompletion) and "response_format".
+    """
+    return await call_with_retries_async(
+        lambda: _request_and_parse_async(async_client, chunk, company_name, response_model, raw),
+        breaker=get_breaker(async_client.base_url),
+        budget=budget,
+    )
+
+class FieldTracker:
+    """
+    Incremental first-non-null merge state for one document's chunks.
+    
+    Chunk results arrive out of order under concurrency, but the merge takes
+    the first non-null value in chunk (score) order. So a field only counts
+    as filled once it is reported by `min_sources` chunks in the finished
+    prefix of the chunk list: later chunks can then no longer change any
+    target field, and skipping them gives the same merged values as
+    processing them all.
+    """
+    
+    def __init__(self, num_chunks, target_fields=TARGET_FIELDS, min_sources=MIN_FIELD_SOURCES):
+        self.target_fields = list(target_fields)
+        self.min_sources = min_sources
+        self.sources = Counter()
+        self.prefix = 0  # chunks before this position have all finished
+        self._filled = [None] * num_chunks
+    
+    def record(self, position, result):
+        """Record the chunk at `position` finishing, with its result (None if it failed)."""
+        self._filled[position] = {field for field in self.target_fields
+                                  if getattr(result, field, None) is not None}
+        while self.prefix < len(self._filled) and self._filled[self.prefix] is not None:
+            self.sources.update(self._filled[self.prefix])
+            self.prefix += 1
+    
+    @property
+    def missing(self):
+        """Target fields not yet filled with enough sources."""
+        return [field for field in self.target_fields if self.sources[field] < self.min_sources]
+    
+    def stop_at(self):
+        """Position from which the remaining chunks are not needed, or None to keep going."""
+        if not self.target_fields or self.missing or self.prefix >= len(self._filled):
+            return None
+        return self.prefix
+
+def _status_label(status):
+    if status["status"] == "ok":
+        retried = f" after {status['attempts']} attempts" if status["attempts"] > 1 else ""
+        return f"✓{retried}"
+    return f"✗ ({status['error_kind']}: {(status['error'] or '')[:50]})"
+
+def extraction_prompt_version(response_model):
+    """Version of the extraction prompt for `response_model`: a hash of the templates and schema."""
+    template = build_extraction_request("{chunk}", "{company_name}", response_model)
+    return prompt_version(template["messages"], template["extra_body"], template["temperature"],
+                          strict_json_schema(response_model))
+
+def journal_key(job, journal=default_journal):
+    """Checkpoint journal key of a job, or None if the job does not name its document."""
+    if len(job) < 4 or job[3] is None:
+        return None
+    chunk, _, response_model, pdf_path = job[:4]
+    return journal.key(document_hash(pdf_path), chunk_id(chunk), MODEL,
+                       extraction_prompt_version(response_model))
+
+def _replay(entry, company_name, response_model):
+    """Rebuild a journaled chunk's result from its raw response (None if it no longer parses)."""
+    try:
+        response = ChatCompletion.model_validate_json(entry["response"])
+        data = json.loads(response.choices[0].message.content)
+        if "company_name" in response_model.model_fields and not data.get("company_name"):
+            data["company_name"] = company_name
+        return response_model(**data)
+    except Exception:
+        return None
+
+async def _extract_all(jobs, statuses, concurrency, target_fields, min_sources, journal):
+    semaphore = asyncio.Semaphore(concurrency)
+    total = len(jobs)
+    # One retry budget per document, so a bad report can't starve the others
+    budgets = {job[1]: RetryBudget() for job in jobs}
+    # Each document's jobs in order, and a tracker of the fields they have filled
+    positions = {}
+    documents = {}
+    for i, job in enumerate(jobs):
+        name = job[1]
+        positions[i] = len(documents.setdefault(name, []))
+        documents[name].append(i)
+    trackers = {name: FieldTracker(len(indices), target_fields, min_sources)
+                for name, indices in documents.items()}
+    tasks = {}
+    
+    # Chunks finished in an earlier run come back from the checkpoint journal
+    keys = {}
+    replayed = 0
+    for i, job in enumerate(jobs):
+        keys[i] = journal_key(job, journal) if journal is not None else None
+        entry = journal.lookup(keys[i]) if keys[i] is not None else None
+        if entry is None:
+            continue
+        result = _replay(entry, job[1], job[2])
+        if result is not None:
+            statuses[i] = replayed_status(result)
+            trackers[job[1]].record(positions[i], result)
+            replayed += 1
+    if replayed:
+        journal.replayed += replayed
+        print(f"  Replayed {replayed}/{total} chunks from the checkpoint journal")
+    
+    def stop_early(company_name):
+        tracker = trackers[company_name]
+        stop = tracker.stop_at()
+        if stop is None:
+            return
+        skipped = [i for i in documents[company_name][stop:] if i in tasks and tasks[i].cancel()]
+        if skipped:
+            print(f"  {company_name}: all target fields filled after {stop} chunks, "
+                  f"skipping {len(skipped)} more")
+    
+    # The semaphore caps requests in flight; the shared rate limiter inside the
+    # client paces how fast they start
+    async with make_async_client(
+        base_url=os.environ.get("OPENAI_BASE_URL"),
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        max_retries=0,
+    ) as async_client:
+        async def run(i, chunk, company_name, response_model=SustainabilityReport, pdf_path=None):
+            raw = {}
+            # Each task has its own context, so the tag (and the trace lane)
+            # only covers this job's calls
+            with usage_context(document=company_name), default_tracer.span(
+                "job", lane=f"{company_name} chunk {positions[i] + 1}", document=company_name, job=i,
+            ):
+                queued = time.perf_counter()
+                async with semaphore:
+                    default_tracer.add("queue", queued, time.perf_counter())
+                    status = await extract_from_chunk_async(
+                        async_client, chunk, company_name, budget=budgets[company_name],
+                        response_model=response_model, raw=raw,
+                    )
+            statuses[i] = status
+            if keys[i] is not None:
+                journal.record(keys[i], status, raw.get("response"), raw.get("response_format"))
+            print(f"  Chunk {i + 1}/{total} ({company_name}) {_status_label(status)}")
+            trackers[company_name].record(positions[i], status["result"])
+            stop_early(company_name)
         
-        # Parse response
-        result_json = response.choices[0].message.content
-        
-        # Validate with Pydantic schema
-        # Add company_name if not present
-        import json
-        result_dict = json.loads(result_json)
-        if "company_name" not in result_dict or not result_dict["company_name"]:
-            result_dict["company_name"] = company_name
-        
-        result = SustainabilityReport(**result_dict)
-        return result
-        
+        for i, job in enumerate(jobs):
+            if statuses[i] is not None:
+                continue
+            stop = trackers[job[1]].stop_at()
+            if stop is not None and positions[i] >= stop:
+                # Replayed chunks already filled this document's fields
+                statuses[i] = skipped_status()
+                continue
+            tasks[i] = asyncio.create_task(run(i, *job))
+        # Cancelled (skipped) jobs come back as CancelledError instead of raising here
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+    
+    for i, task in tasks.items():
+        if task.cancelled() and statuses[i] is None:
+            statuses[i] = skipped_status()
+
+def extract_chunks(jobs, concurrency=None, target_fields=TARGET_FIELDS, min_sources=MIN_FIELD_SOURCES,
+                   journal=default_journal):
+    """
+    Extract many chunks concurrently on the async OpenAI client.
+    
+    Each document stops early once its finished chunks have filled every
+    target field (see FieldTracker): chunks still waiting are skipped and
+    requests already in flight for them are cancelled.
+    
+    Jobs that name their PDF are checkpointed: each finished chunk is
+    appended to the journal, and chunks that succeeded in an earlier
+    (crashed or interrupted) run are replayed from it instead of being sent
+    again.
+    
+    Args:
+        jobs: List of (chunk, company_name) pairs; they may come from several
+            reports, which then share one concurrency budget. Each report's
+            chunks should be in score order. A job may add a third item, the
+            response model to ask for (e.g. a sub-schema, see fill_gaps), and
+            a fourth, the PDF path the chunk came from (for checkpointing)
+        concurrency: Requests in flight at once (default: EXTRACTION_CONCURRENCY)
+        target_fields: SustainabilityReport fields that end a report's
+            extraction once filled (default: TARGET_FIELDS; empty to always
+            process every chunk)
+        min_sources: Chunks that must report a field before it counts as filled
+        journal: CheckpointJournal to replay from and record to (default:
+            the shared on-disk journal; None to disable)
+    
+    Returns:
+        (statuses, interrupted): one status dict per job, in job order (see
+        `extract_from_chunk`), and whether Ctrl+C stopped the run early. On
+        interrupt the jobs that had already finished keep their results and
+        the rest get status "interrupted". Jobs dropped by early stopping get
+        status "skipped"; replayed jobs are "ok" with 0 attempts.
+    """
+    if concurrency is None:
+        concurrency = EXTRACTION_CONCURRENCY
+    statuses = [None] * len(jobs)
+    
+    interrupted = False
+    try:
+        asyncio.run(_extract_all(jobs, statuses, max(1, concurrency), target_fields, min_sources, journal))
     except KeyboardInterrupt:
-        print(f"\n    User interrupted extraction")
-        raise  # Re-raise KeyboardInterrupt so it can be caught at higher level
-    except Exception as e:
-        print(f"✗ (error: {str(e)[:50]})")
-        return None
+        interrupted = True
+    statuses = [status or interrupted_status() for status in statuses]
+    print(f"  {limiter_summary()}")
+    print(f"  {response_cache_summary()}")
+    print(f"  {format_summary()}")
+    if journal is not None:
+        print(f"  {journal.summary()}")
+        if interrupted and journal.enabled:
+            print("  Finished chunks are checkpointed; rerun to resume from here")
+    return statuses, interrupted
 
 def merge_results(results):
-    """Merge multiple extraction results. First non-null value wins for each field."""
+    """Merge multiple extraction results (of one schema). First non-null value wins for each field."""
     if not results:
         return None
     
@@ -150,16 +514,277 @@ def merge_results(results):
             if merged[field] is None and value is not None:
                 merged[field] = value
     
-    return SustainabilityReport(**merged)
+    return type(results[0])(**merged)
+
+def infer_company_name(pdf_path):
+    """Company name from a report filename."""
+    filename = os.path.basename(pdf_path)
+    if "google" in filename.lower():
+        return "Google"
+    elif "apple" in filename.lower():
+        return "Apple"
+    elif "amazon" in filename.lower():
+        return "Amazon"
+    elif "bp" in filename.lower():
+        return "BP"
+    return "Unknown Company"
 
-def extract_sustainability_data(pdf_path, company_name=None, top_chunks=5):
+def select_index_chunks(pdf_path, top_chunks=5, per_field=3, index=default_index):
+    """
+    Per-field chunk selection from the persistent BM25 index.
+    
+    The report is added to the index first (a no-op once it is indexed and
+    unchanged); each field's query is then a BM25 search within the report,
+    and the fewest chunks covering every field are kept, as in
+    select_field_chunks.
+    
+    Returns:
+        Selected chunk texts, best first
+    """
+    print("Loading BM25 index...")
+    num_chunks = index.add_document(pdf_path)
+    print(f"  {'Indexed ' + str(num_chunks) + ' chunks' if num_chunks else 'Already indexed'}")
+    
+    queries = field_queries(SustainabilityReport, TARGET_FIELDS)
+    hits = {}
+    ranked = {}
+    for field, query in queries.items():
+        field_hits = index.search(query, per_field, documents=[pdf_path])
+        hits.update((hit["chunk"], hit) for hit in field_hits)
+        ranked[field] = [hit["chunk"] for hit in field_hits]
+    picked = greedy_cover(ranked, max_chunks=top_chunks)
+    covered = {field for _, fields in picked for field in fields}
+    print(f"  {len(picked)} chunks cover {len(covered)}/{len(queries)} fields")
+    return index.texts([hits[chunk] for chunk, _ in picked])
+
+def select_report_chunks(pdf_path, top_chunks=5, pdf_workers=None, retrieval="fields", per_field=3):
+    """
+    Steps 1-3: parse, chunk and score a report, returning its selected chunk texts.
+    
+    With retrieval="fields" (the default) chunks are ranked per
+    SustainabilityReport field and the fewest chunks covering every field
+    are kept, at most `top_chunks` (see select_field_chunks). With
+    retrieval="bm25" the same selection is made with BM25 ranking from the
+    persistent corpus index (see select_index_chunks). With
+    retrieval="keywords" the `top_chunks` best chunks by DATA_KEYWORDS are kept;
+    "vector" ranks by cosine similarity to the schema's field descriptions in
+    the saved vector index instead, and "hybrid" blends the two.
+    """
+    if retrieval == "bm25":
+        return select_index_chunks(pdf_path, top_chunks, per_field)
+    # Pages are parsed and chunked as they arrive, and only keyword counts and
+    # offsets are kept per chunk, so the whole document is never held in memory
+    pages = default_tracer.traced(stream_pdf_pages(pdf_path, workers=pdf_workers), "page")
+    if retrieval in ("vector", "hybrid"):
+        vectors = load_index()
+        if vectors is None:
+            raise FileNotFoundError("No vector index yet; build it with: python vector_index.py build")
+        features, spans = build_chunk_features(default_tracer.traced(iter_chunk_records(pages), "split"))
+        # One query made of every field's name and description
+        query = "\n".join(field_query_texts(SustainabilityReport, TARGET_FIELDS).values())
+        cosine = vectors.cosine([query], document=pdf_path)[0]
+        if len(cosine) != len(features):
+            raise ValueError(f"{pdf_path} changed since the vector index was built; rebuild it")
+        top = select_top_chunks(features, DATA_KEYWORDS, top_n=top_chunks, vector_scores=cosine,
+                                vector_weight=1.0 if retrieval == "vector" else 0.5)
+    elif retrieval == "fields":
+        queries = field_queries(SustainabilityReport, TARGET_FIELDS)
+        vocabulary = {keyword for weights in queries.values() for keyword in weights}
+        features, spans = build_chunk_features(default_tracer.traced(iter_chunk_records(pages), "split"),
+                                               vocabulary)
+        top = [i for i, _ in select_field_chunks(features, queries, per_field, max_chunks=top_chunks)]
+    elif retrieval == "keywords":
+        features, spans = build_chunk_features(default_tracer.traced(iter_chunk_records(pages), "split"))
+        top = select_top_chunks(features, DATA_KEYWORDS, top_n=top_chunks)
+    else:
+        raise ValueError(f"Unknown retrieval {retrieval!r}; "
+                         f"use 'fields', 'bm25', 'keywords', 'vector' or 'hybrid'")
+    # Re-read just the selected chunks from the (now cached) page text
+    with default_tracer.span("read"):
+        return read_spans(iter_page_texts(pdf_path), [spans[i] for i in top])
+
+def merge_extractions(statuses, interrupted=False):
+    """Step 5: report how each chunk finished and merge the successes (None if none)."""
+    results = [status["result"] for status in statuses if status["status"] == "ok"]
+    skipped = sum(status["status"] == "skipped" for status in statuses)
+    num_chunks = len(statuses) - skipped
+    if interrupted:
+        print("\n\nExtraction interrupted by user.")
+        print(f"Processed {len(results)}/{num_chunks} chunks before interruption.")
+    
+    print()
+    print(f"Successfully extracted data from {len(results)}/{num_chunks} chunks")
+    if skipped:
+        print(f"  Skipped {skipped} chunks once every target field was filled")
+    failures = Counter(status["error_kind"] for status in statuses if status["status"] == "failed")
+    if failures:
+        print(f"  Failed: {', '.join(f'{kind} x{n}' for kind, n in failures.most_common())}")
+    print()
+    
+    if not results:
+        print("✗ No data extracted")
+        return None
+    
+    print("Merging results (first non-null value wins)...")
+    final_result = merge_results(results)
+    print("✓ Merge complete")
+    print()
+    
+    return final_result
+
+def _number_forms(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return {str(value), f"{value:,}"}
+
+def validate_extraction(data, texts, schema=SustainabilityReport):
+    """
+    Schema validation plus a grounding check against the chunks sent to the LLM.
+    
+    Returns:
+        (validated dict or None, list of validation notes)
+    """
+    notes = []
+    try:
+        validated = schema(**data).model_dump()
+        notes.append("✓ Schema validation passed")
+    except Exception as e:
+        notes.append(f"✗ Schema validation failed: {e}")
+        validated = None
+    source = " ".join(texts).lower()
+    for field, value in data.items():
+        if value is None or field == "notes":
+            continue
+        if isinstance(value, (int, float)):
+            forms = _number_forms(value)
+        elif len(str(value)) > 5:
+            forms = {str(value).lower()}
+        else:
+            continue  # Short values match too easily to be worth checking
+        if not any(form in source for form in forms):
+            notes.append(f"⚠️  {field}: '{str(value)[:50]}' not found verbatim in the selected chunks")
+    return validated, notes
+
+# Pipeline stages (see pipeline.py): each takes the outputs of the stages
+# it depends on, and only plain data goes between them, so it can be cached
+
+def ingest_stage(pdf_path, pdf_workers=None):
+    """
+    Parse the PDF into the page cache, page by page; returns the path.
+    
+    The document is never held whole: the chunk and score stages stream the
+    cached pages again instead of receiving a list of every page's text.
+    """
+    num_pages = sum(1 for _ in stream_pdf_pages(pdf_path, workers=pdf_workers))
+    default_profiler.tag(pages=num_pages)
+    return pdf_path
+
+def chunk_stage(pdf_path, chunk_size=4000, chunk_overlap=200):
+    """(start, end) character span of every chunk, chunked as the cached pages stream past."""
+    return [(record["start"], record["end"])
+            for record in iter_chunk_records(iter_page_texts(pdf_path), chunk_size, chunk_overlap)]
+
+def score_stage(pdf_path, spans, retrieval="fields", top_chunks=5, per_field=3, keywords=None, queries=None):
+    """Texts of the selected chunks, best first ("fields": per-field set cover, "keywords": top by count)."""
+    # Chunk texts are counted one at a time as the pages stream past, then
+    # only the selected chunks are re-read
+    texts = iter_span_texts(iter_page_texts(pdf_path), spans)
+    if retrieval == "fields":
+        vocabulary = {keyword for weights in queries.values() for keyword in weights}
+        features = ChunkFeatures.from_texts(texts, vocabulary)
+        top = [i for i, _ in select_field_chunks(features, queries, per_field, max_chunks=top_chunks)]
+    else:
+        top = select_top_chunks(ChunkFeatures.from_texts(texts), keywords, top_n=top_chunks)
+    return read_spans(iter_page_texts(pdf_path), [spans[i] for i in top])
+
+def extract_stage(texts, company_name, model, prompt_version, target_fields, min_sources,
+                  pdf_path=None, concurrency=None):
+    """
+    Status of every selected chunk, with results as plain dicts.
+    
+    `model` and `prompt_version` only key the cache (requests use MODEL and
+    the current prompt); `pdf_path` turns on checkpointing.
+    """
+    print(f"Extracting data from {len(texts)} chunks...")
+    jobs = [(text, company_name, SustainabilityReport, pdf_path) for text in texts]
+    statuses, _ = extract_chunks(jobs, concurrency, target_fields, min_sources)
+    # Interrupted chunks stay in the output (which is then not cached)
+    return [dict(status, result=status["result"].model_dump() if status["result"] else None)
+            for status in statuses]
+
+def _extraction_complete(statuses):
+    # Failed or interrupted chunks are retried on the next run rather than cached
+    return all(status["status"] in ("ok", "skipped") for status in statuses)
+
+def merge_stage(statuses):
+    """Merged SustainabilityReport fields, or None if no chunk produced data."""
+    statuses = [dict(status, result=SustainabilityReport(**status["result"]) if status["result"] else None)
+                for status in statuses]
+    interrupted = any(status["status"] == "interrupted" for status in statuses)
+    result = merge_extractions(statuses, interrupted)
+    return result.model_dump() if result else None
+
+def validate_stage(merged, texts):
+    """Validation notes for the merged result (see validate_extraction)."""
+    if merged is None:
+        return ["✗ No data extracted"]
+    return validate_extraction(merged, texts)[1]
+
+def report_pipeline(pdf_path, company_name, top_chunks=5, pdf_workers=None, concurrency=None,
+                    target_fields=TARGET_FIELDS, min_sources=MIN_FIELD_SOURCES, retrieval="fields",
+                    per_field=3, chunk_size=4000, chunk_overlap=200):
+    """
+    The stage-cached pipeline for one report: ingest -> chunk -> score -> extract -> merge -> validate.
+    
+    Each stage's cache key covers its parameters (chunking, keyword lists and
+    field queries, model and prompt version, ...) and its inputs, so only
+    the stages a change actually affects are recomputed.
+    """
+    queries = field_queries(SustainabilityReport, TARGET_FIELDS) if retrieval == "fields" else None
+    return Pipeline([
+        Stage("ingest", ingest_stage, options={"pdf_workers": pdf_workers}, persist=False),
+        Stage("chunk", chunk_stage, ["ingest"],
+              params={"chunk_size": chunk_size, "chunk_overlap": chunk_overlap}),
+        Stage("score", score_stage, ["ingest", "chunk"],
+              params={"retrieval": retrieval, "top_chunks": top_chunks, "per_field": per_field,
+                      "keywords": DATA_KEYWORDS, "queries": queries}),
+        Stage("extract", extract_stage, ["score"],
+              params={"company_name": company_name, "model": MODEL,
+                      "prompt_version": extraction_prompt_version(SustainabilityReport),
+                      "target_fields": list(target_fields), "min_sources": min_sources},
+              options={"pdf_path": pdf_path, "concurrency": concurrency}, keep=_extraction_complete),
+        Stage("merge", merge_stage, ["extract"]),
+        Stage("validate", validate_stage, ["merge", "score"]),
+    ])
+
+def extract_sustainability_data(pdf_path, company_name=None, top_chunks=5, pdf_workers=None,
+                                concurrency=None, target_fields=TARGET_FIELDS,
+                                min_sources=MIN_FIELD_SOURCES, retrieval="fields", dry_run=False):
     """
     Complete extraction pipeline for sustainability report data.
     
+    With "fields" or "keywords" retrieval this runs the stage-cached
+    report_pipeline: a rerun only recomputes the stages whose inputs or
+    parameters changed. The index-based retrievals depend on the saved
+    indexes rather than the document alone, so they run uncached.
+    
     Args:
         pdf_path: Path to the PDF file
         company_name: Name of the company (inferred from filename if not provided)
-        top_chunks: Number of top-scoring chunks to process (default: 5)
+        top_chunks: Most chunks to process (default: 5)
+        pdf_workers: Processes for PDF text extraction (default: one per CPU, 1 = serial)
+        concurrency: Chunk extraction requests in flight at once
+            (default: EXTRACTION_CONCURRENCY)
+        target_fields: Fields whose filling stops extraction before all
+            top_chunks are processed (default: TARGET_FIELDS; empty to
+            always process every chunk)
+        min_sources: Chunks that must report a field before it counts as filled
+        retrieval: "fields" (per-field ranking and set cover), "bm25" (the
+            same over the persistent BM25 index), "keywords" (top chunks by
+            DATA_KEYWORDS), "vector" or "hybrid" (cosine ranking from the
+            saved vector index, alone or blended with DATA_KEYWORDS), see
+            select_report_chunks
+        dry_run: Only print which stages would be recomputed (returns None)
     
     Returns:
         SustainabilityReport object with extracted data
@@ -171,80 +796,126 @@ def extract_sustainability_data(pdf_path, company_name=None, top_chunks=5):
     
     # Infer company name from filename if not provided
     if company_name is None:
-        filename = os.path.basename(pdf_path)
-        if "google" in filename.lower():
-            company_name = "Google"
-        elif "apple" in filename.lower():
-            company_name = "Apple"
-        elif "amazon" in filename.lower():
-            company_name = "Amazon"
-        elif "bp" in filename.lower():
-            company_name = "BP"
-        else:
-            company_name = "Unknown Company"
+        company_name = infer_company_name(pdf_path)
     
     print(f"Company: {company_name}")
     print()
     
-    # Step 1: Extract text from PDF
-    full_text = extract_pdf_text(pdf_path)
-    print()
+    if retrieval in ("fields", "keywords"):
+        pipeline = report_pipeline(pdf_path, company_name, top_chunks, pdf_workers, concurrency,
+                                   target_fields, min_sources, retrieval)
+        if dry_run:
+            print("Dry run - stages that would recompute:")
+            print(format_plan(pipeline.plan(document_hash(pdf_path))))
+            return None
+        with default_tracer.span("document", document=company_name), default_profiler.context(document=company_name):
+            outputs = pipeline.run(pdf_path, document_hash(pdf_path), outputs=["merge", "validate"])
+        print()
+        for note in outputs["validate"]:
+            print(f"  {note}")
+        print()
+        return SustainabilityReport(**outputs["merge"]) if outputs["merge"] else None
+    if dry_run:
+        raise ValueError(f"retrieval={retrieval!r} is not stage-cached; dry runs need 'fields' or 'keywords'")
     
-    # Step 2: Chunk the text
-    chunks = chunk_text(full_text)
-    print()
+    with default_tracer.span("document", document=company_name), default_profiler.context(document=company_name):
+        # Steps 1-3: Parse, chunk and score
+        with default_tracer.span("select", retrieval=retrieval), default_profiler.stage("select"):
+            selected_chunks = select_report_chunks(pdf_path, top_chunks, pdf_workers, retrieval)
+        print()
+        
+        # Step 4: Extract data from the chunks concurrently (results stay in chunk order)
+        print(f"Extracting data from {len(selected_chunks)} chunks...")
+        jobs = [(chunk, company_name, SustainabilityReport, pdf_path) for chunk in selected_chunks]
+        with default_tracer.span("extract"), default_profiler.stage("extract"):
+            statuses, interrupted = extract_chunks(jobs, concurrency, target_fields, min_sources)
+        
+        # Step 5: Merge results
+        with default_tracer.span("merge"), default_profiler.stage("merge"):
+            return merge_extractions(statuses, interrupted)
+
+def _is_null(value):
+    # Rows read back from a CSV hold NaN for empty cells
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def fill_gaps(pdf_path, existing, company_name=None, fields=None, chunks_per_field=3,
+              pdf_workers=None, concurrency=None):
+    """
+    Fill the null fields of an existing result without rerunning the whole pipeline.
     
-    # Step 3: Score and select top chunks
-    selected_chunks = select_top_chunks(chunks, DATA_KEYWORDS, top_n=top_chunks)
-    print()
+    For each missing field, the chunks most relevant to its name and
+    description are retrieved (see select_field_chunks), and the LLM is asked
+    for only the missing fields each chunk was retrieved for, with a reduced
+    sub-schema. Found values are upserted; every other field is left alone.
     
-    # Step 4: Extract data from each chunk
-    print(f"Extracting data from {len(selected_chunks)} chunks...")
-    results = []
+    Args:
+        pdf_path: Path to the PDF file
+        existing: SustainabilityReport, or a result row as a dict or pandas
+            Series (e.g. a row of sustainability_comparison.csv; NaN is null)
+        company_name: Name of the company (default: the row's company_name,
+            else inferred from the filename)
+        fields: Fields to fill (default: every null field in TARGET_FIELDS)
+        chunks_per_field: Candidate chunks ranked for each missing field
+        pdf_workers: Processes for PDF text extraction (default: one per CPU, 1 = serial)
+        concurrency: Chunk extraction requests in flight at once
+            (default: EXTRACTION_CONCURRENCY)
     
-    try:
-        for i, chunk in enumerate(selected_chunks, 1):
-            print(f"  Processing chunk {i}/{len(selected_chunks)}...", end=" ")
-            
-            result = extract_from_chunk(chunk, company_name)
-            
-            if result:
-                print("✓")
-                results.append(result)
-            elif result is None:
-                # Error message already printed in extract_from_chunk
-                pass
-            
-            # Rate limiting
-            if i < len(selected_chunks):
-                time.sleep(0.5)
+    Returns:
+        (report, filled): the updated SustainabilityReport and a
+        {field: value} dict of the fields that were filled
+    """
+    if isinstance(existing, SustainabilityReport):
+        existing = existing.model_dump()
+    row = {field: None if _is_null(value) else value for field, value in dict(existing).items()}
+    row["company_name"] = company_name or row.get("company_name") or infer_company_name(pdf_path)
+    company_name = row["company_name"]
+    if fields is None:
+        fields = [field for field in TARGET_FIELDS if row.get(field) is None]
     
-    except KeyboardInterrupt:
-        print("\n\nExtraction interrupted by user.")
-        print(f"Processed {len(results)}/{len(selected_chunks)} chunks before interruption.")
+    print(f"Filling {len(fields)} missing fields for {company_name}")
+    if not fields:
+        return SustainabilityReport(**row), {}
     
-    print()
-    print(f"Successfully extracted data from {len(results)}/{len(selected_chunks)} chunks")
-    print()
+    # One pass over the document counts the keywords of every missing field;
+    # each chunk is then asked once, for all the fields it was retrieved for
+    queries = field_queries(SustainabilityReport, fields)
+    vocabulary = {keyword for weights in queries.values() for keyword in weights}
+    pages = stream_pdf_pages(pdf_path, workers=pdf_workers)
+    features, spans = build_chunk_features(iter_chunk_records(pages), vocabulary)
+    chunk_fields = dict(select_field_chunks(features, queries, chunks_per_field))
+    if not chunk_fields:
+        return SustainabilityReport(**row), {}
     
-    # Step 5: Merge results
-    if not results:
-        print("✗ No data extracted")
-        return None
+    texts = read_spans(iter_page_texts(pdf_path), [spans[i] for i in chunk_fields])
+    jobs = [(text, company_name, sub_model(SustainabilityReport, chunk_fields[i]), pdf_path)
+            for text, i in zip(texts, chunk_fields)]
+    statuses, _ = extract_chunks(jobs, concurrency, target_fields=fields)
     
-    print("Merging results (first non-null value wins)...")
-    final_result = merge_results(results)
-    print("✓ Merge complete")
-    print()
+    # First non-null value in job order wins, as in merge_results
+    filled = {}
+    for status in statuses:
+        if status["status"] != "ok":
+            continue
+        for field, value in status["result"].model_dump().items():
+            if field not in filled and value is not None:
+                filled[field] = value
     
-    return final_result
+    print(f"  Filled {len(filled)}/{len(fields)} fields"
+          + (f": {', '.join(filled)}" if filled else ""))
+    row.update(filled)
+    return SustainabilityReport(**row), filled
 
 
 if __name__ == "__main__":
-    # Test with Google report
-    pdf_path = "data/corporate-sustainability/google-env-2024.pdf"
+    # Usage: python extract_report.py [pdf_path] [--dry-run] [--profile=cpu|mem]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    for arg in sys.argv[1:]:
+        if arg.startswith("--profile="):
+            default_profiler.enable(arg.split("=", 1)[1])
+    # Test with Google report by default
+    pdf_path = args[0] if args else "data/corporate-sustainability/google-env-2024.pdf"
     
-    result = extract_sustainability_data(pdf_path)
+    result = extract_sustainability_data(pdf_path, dry_run="--dry-run" in sys.argv)
     
     if result:
         print("=" * 70)
@@ -300,3 +971,12 @@ if __name__ == "__main__":
         print("=" * 70)
         print()
         print(result.model_dump_json(indent=2))
+    
+    # With EXTRACTION_TRACE=trace.json: time by stage, and a trace for chrome://tracing or Perfetto
+    if default_tracer.enabled:
+        print()
+        print(trace_summary())
+    # With --profile=cpu|mem (or PIPELINE_PROFILE): a .pstats file or allocation report per stage
+    if default_profiler.enabled:
+        print()
+        print(profile_summary())
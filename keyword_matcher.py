@@ -0,0 +1,170 @@
+"""
+Compiled multi-keyword matching for chunk relevance scoring
+"""
+import re
+from collections import Counter
+from functools import lru_cache
+
+# Below this many keywords, one C-level str.count per keyword on a single
+# folded copy of the text beats a regex scan (see bench_keyword_scoring.py);
+# at or above it, the single compiled pass wins and keeps winning as lists grow.
+# The scan tries every position (to find overlapping keywords), which puts the
+# crossover at about 64 keywords.
+SCAN_THRESHOLD = 64
+
+
+def _trie_pattern(words):
+    """Regex source for a trie of `words`: shared prefixes are matched once."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # end-of-word marker
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Greedy optional tail: the longest keyword at a position wins
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+_WORD_CHAR = re.compile(r"\w")
+
+
+def _is_word_char(text, i):
+    """True when text[i] exists and is a word character (what (?!\\w) rejects)."""
+    return i < len(text) and bool(_WORD_CHAR.match(text, i))
+
+
+class KeywordMatcher:
+    """
+    Compiled matcher that returns per-keyword counts for a text in one call.
+
+    The keywords are folded into a trie and compiled into a single regular
+    expression, so the scan walks the text once in C regardless of how many
+    keywords there are, instead of once per keyword with `str.count`. The text
+    is case-folded once per call rather than once per keyword. Short keyword
+    lists (fewer than SCAN_THRESHOLD, without word_boundary) are cheaper to
+    count with `str.count` on that single folded copy, so they skip the scan.
+
+    The scan is a lookahead, so it tries every position of the text and
+    finds the longest keyword starting there; the shorter keywords that are
+    prefixes of it ("scope 1" in "scope 1 emissions") are checked at the same
+    position. Every occurrence of every keyword is found, including keywords
+    that overlap each other ("scope 1 emissions" / "emissions units"), and
+    each keyword is counted without overlapping itself, so counts equal
+    calling `str.count` per keyword on either path.
+
+    Args:
+        keywords: Keywords to count
+        case_sensitive: Match case exactly (default: fold case, like the
+            existing `.lower()` loops)
+        word_boundary: Only count whole-word matches, so "target" does not
+            match inside "targeted"
+    """
+
+    def __init__(self, keywords, case_sensitive=False, word_boundary=False):
+        self.keywords = list(keywords)
+        self.case_sensitive = case_sensitive
+        self.word_boundary = word_boundary
+
+        # Several spellings may fold to the same pattern ("GHG" / "ghg")
+        self._owners = {}
+        for keyword in self.keywords:
+            self._owners.setdefault(self._fold(keyword), []).append(keyword)
+        patterns = sorted(self._owners)
+        self._patterns = patterns
+
+        self._regex = None
+        self._prefixes = {}
+        self._self_overlapping = set()
+        if len(patterns) < SCAN_THRESHOLD and not word_boundary:
+            return
+
+        source = _trie_pattern(patterns)
+        if word_boundary:
+            source = rf"(?<!\w)(?=((?:{source})(?!\w)))"
+        else:
+            source = f"(?=({source}))"
+        self._regex = re.compile(source)
+
+        # Keywords starting where a longer keyword starts: its prefixes, shortest first
+        for outer in patterns:
+            self._prefixes[outer] = [inner for inner in patterns if outer.startswith(inner)]
+        # Keywords that can overlap themselves ("aa" in "aaa"), recounted when found twice
+        self._self_overlapping = {
+            pattern for pattern in patterns
+            if any(pattern[:k] == pattern[-k:] for k in range(1, len(pattern)))
+        }
+
+    @property
+    def single_pass(self):
+        """True when texts are scanned once by the compiled trie expression."""
+        return self._regex is not None
+
+    def _fold(self, text):
+        return text if self.case_sensitive else text.lower()
+
+    def _count_literal(self, needle, haystack):
+        if self.word_boundary:
+            return len(re.findall(rf"(?<!\w){re.escape(needle)}(?!\w)", haystack))
+        return haystack.count(needle)
+
+    def _pattern_counts(self, text):
+        folded = self._fold(text)
+        if self._regex is None:
+            counts = {}
+            for pattern in self._patterns:
+                n = folded.count(pattern)
+                if n:
+                    counts[pattern] = n
+            return counts
+
+        # Each match is the longest keyword at one position; its prefixes start there too
+        counts = Counter()
+        if not self.word_boundary:
+            for longest, n in Counter(self._regex.findall(folded)).items():
+                for pattern in self._prefixes[longest]:
+                    counts[pattern] += n
+        else:
+            for match in self._regex.finditer(folded):
+                start = match.start()
+                for pattern in self._prefixes[match.group(1)]:
+                    if not _is_word_char(folded, start + len(pattern)):
+                        counts[pattern] += 1
+        # That counted every occurrence; str.count skips a keyword's overlaps with itself
+        for pattern in self._self_overlapping:
+            if counts.get(pattern, 0) > 1:
+                counts[pattern] = self._count_literal(pattern, folded)
+        return counts
+
+    def counts(self, text):
+        """Occurrences of each keyword in `text`, as {keyword: count} for keywords found."""
+        result = {}
+        for pattern, n in self._pattern_counts(text).items():
+            for keyword in self._owners[pattern]:
+                result[keyword] = n
+        return result
+
+    def score(self, text):
+        """Total keyword occurrences (the `score_chunk` relevance score)."""
+        return sum(self.counts(text).values())
+
+    def distinct(self, text):
+        """How many different keywords occur at least once in `text`."""
+        return len(self.counts(text))
+
+
+@lru_cache(maxsize=64)
+def _cached_matcher(keywords, case_sensitive, word_boundary):
+    return KeywordMatcher(keywords, case_sensitive, word_boundary)
+
+
+def get_matcher(keywords, case_sensitive=False, word_boundary=False):
+    """Shared compiled matcher for a keyword list, built on first use."""
+    return _cached_matcher(tuple(keywords), case_sensitive, word_boundary)
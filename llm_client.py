@@ -0,0 +1,220 @@
+"""
+Rate-limited, response-cached, usage-logged OpenAI clients shared by the
+scripts and notebooks
+
+With LLM_CASSETTE_RECORD set, real responses are also recorded for offline
+replay (see cassettes.py and llm_stand_in.py).
+"""
+import asyncio
+import os
+import time
+
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from cassettes import default_recorder
+from resilience import classify_error
+from tracing import default_tracer
+from response_cache import default_response_cache
+from rate_limiter import THROTTLE_STATUSES, default_limiter, estimate_tokens, parse_retry_after
+from usage_log import default_usage_log
+
+
+def _observe(response, limiter):
+    # Sees every HTTP attempt, including the SDK's own retries
+    if response.status_code in THROTTLE_STATUSES:
+        limiter.record_throttle(parse_retry_after(response.headers))
+    elif response.status_code >= 500:
+        limiter.record_error()
+
+
+def _usage_tokens(response):
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+class _Completions:
+    def __init__(self, completions, limiter, cache, usage_log, recorder=None):
+        self._completions = completions
+        self._limiter = limiter
+        self._cache = cache
+        self._usage_log = usage_log
+        self._recorder = recorder
+
+    def _cached(self, kwargs):
+        if self._cache is None or kwargs.get("stream"):
+            return None
+        response = self._cache.get(kwargs)
+        if response is not None:
+            self._log(kwargs, "ok", usage=response.usage, cached=True)
+        return response
+
+    def _log(self, kwargs, outcome, latency=None, ttfb=None, usage=None, cached=False):
+        if self._usage_log is not None:
+            self._usage_log.record(kwargs.get("model"), outcome, latency, ttfb, usage, cached)
+
+    def _failed(self, kwargs, error, start):
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            self._limiter.record_error()
+        self._log(kwargs, classify_error(error), latency=time.monotonic() - start)
+
+    def _succeeded(self, kwargs, response, estimate, start, ttfb):
+        latency = time.monotonic() - start
+        self._limiter.record_success(latency, _usage_tokens(response), estimate)
+        self._log(kwargs, "ok", latency, ttfb, getattr(response, "usage", None))
+        if self._cache is not None and not kwargs.get("stream"):
+            self._cache.put(kwargs, response, latency)
+        if self._recorder is not None and not kwargs.get("stream"):
+            self._recorder.record(kwargs, response, latency, ttfb)
+
+    def create(self, **kwargs):
+        cached = self._cached(kwargs)
+        if cached is not None:
+            return cached
+        estimate = estimate_tokens(kwargs)
+        with default_tracer.span("throttle", category="llm"):
+            self._limiter.acquire(estimate)
+        start = time.monotonic()
+        ttfb = None
+        try:
+            if kwargs.get("stream"):
+                response = self._completions.create(**kwargs)
+            else:
+                # Streaming the raw response separates time to first byte
+                # (headers received) from the time to read the whole body
+                with self._completions.with_streaming_response.create(**kwargs) as raw:
+                    ttfb = time.monotonic() - start
+                    response = raw.parse()
+        except Exception as e:
+            self._failed(kwargs, e, start)
+            raise
+        self._succeeded(kwargs, response, estimate, start, ttfb)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._completions, name)
+
+
+class _AsyncCompletions(_Completions):
+    async def create(self, **kwargs):
+        cached = self._cached(kwargs)
+        if cached is not None:
+            return cached
+        estimate = estimate_tokens(kwargs)
+        with default_tracer.span("throttle", category="llm"):
+            await self._limiter.acquire_async(estimate)
+        start = time.monotonic()
+        ttfb = None
+        try:
+            if kwargs.get("stream"):
+                response = await self._completions.create(**kwargs)
+            else:
+                async with self._completions.with_streaming_response.create(**kwargs) as raw:
+                    ttfb = time.monotonic() - start
+                    response = await raw.parse()
+        except asyncio.CancelledError:
+            # Abandoned by the caller (e.g. early stopping); the request is dropped
+            self._log(kwargs, "cancelled", latency=time.monotonic() - start, ttfb=ttfb)
+            raise
+        except Exception as e:
+            self._failed(kwargs, e, start)
+            raise
+        self._succeeded(kwargs, response, estimate, start, ttfb)
+        return response
+
+
+class _Chat:
+    def __init__(self, chat, completions):
+        self._chat = chat
+        self.completions = completions
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+class RateLimitedClient:
+    """
+    OpenAI client wrapper whose `chat.completions.create` goes through a
+    response cache and a RateLimiter, and is recorded in a UsageLog (and,
+    when a CassetteRecorder is given, in a cassette).
+
+    Cached responses are returned without touching the limiter or the network.
+    Everything else is passed through to the wrapped client, so it can be used
+    wherever an OpenAI / AsyncOpenAI client was (including `async with` for
+    the async client).
+    """
+
+    def __init__(self, client, limiter=default_limiter, cache=default_response_cache,
+                 usage_log=default_usage_log, recorder=default_recorder):
+        self._client = client
+        self.limiter = limiter
+        self.cache = cache
+        self.usage_log = usage_log
+        self.recorder = recorder
+        completions_cls = _AsyncCompletions if isinstance(client, AsyncOpenAI) else _Completions
+        completions = completions_cls(client.chat.completions, limiter, cache, usage_log, recorder)
+        self.chat = _Chat(client.chat, completions)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def __enter__(self):
+        self._client.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._client.__exit__(*exc)
+
+    async def __aenter__(self):
+        await self._client.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._client.__aexit__(*exc)
+
+
+def make_client(base_url=None, api_key=None, limiter=default_limiter,
+                cache=default_response_cache, usage_log=default_usage_log,
+                recorder=default_recorder, **kwargs):
+    """
+    Rate-limited, response-cached, usage-logged OpenAI client.
+
+    Args:
+        base_url: API endpoint (default: OPENAI_BASE_URL)
+        api_key: API key (default: OPENAI_API_KEY)
+        limiter: RateLimiter to share (default: the process-wide limiter)
+        cache: ResponseCache to use (default: the shared on-disk cache; None
+            to always call the API)
+        usage_log: UsageLog recording every call (default: the shared log;
+            None to skip recording)
+        recorder: CassetteRecorder for real responses (default: one
+            writing to LLM_CASSETTE_RECORD when set, else None)
+        **kwargs: Passed on to OpenAI()
+    """
+    http_client = openai.DefaultHttpxClient(
+        event_hooks={"response": [lambda response: _observe(response, limiter)]}
+    )
+    client = OpenAI(
+        base_url=base_url or os.environ.get("OPENAI_BASE_URL"),
+        api_key=api_key or os.environ.get("OPENAI_API_KEY"),
+        http_client=http_client,
+        **kwargs,
+    )
+    return RateLimitedClient(client, limiter, cache, usage_log, recorder)
+
+
+def make_async_client(base_url=None, api_key=None, limiter=default_limiter,
+                      cache=default_response_cache, usage_log=default_usage_log,
+                      recorder=default_recorder, **kwargs):
+    """Async counterpart of `make_client` (wraps AsyncOpenAI)."""
+    async def observe(response):
+        _observe(response, limiter)
+
+    http_client = openai.DefaultAsyncHttpxClient(event_hooks={"response": [observe]})
+    client = AsyncOpenAI(
+        base_url=base_url or os.environ.get("OPENAI_BASE_URL"),
+        api_key=api_key or os.environ.get("OPENAI_API_KEY"),
+        http_client=http_client,
+        **kwargs,
+    )
+    return RateLimitedClient(client, limiter, cache, usage_log, recorder)
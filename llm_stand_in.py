@@ -0,0 +1,316 @@
+"""
+Local OpenAI-compatible stand-in server
+
+Replays chat completions recorded in cassettes (see cassettes.py) so the
+extraction scripts can be run and timed without the real API, with
+configurable latency, injected errors and a concurrency cap:
+
+    python llm_stand_in.py cassettes/*.jsonl --port 8800 --latency recorded \\
+        --errors 429=0.05,503=0.02,empty=0.03 --max-concurrency 8
+    OPENAI_BASE_URL=http://127.0.0.1:8800/v1 python extract_report.py
+
+Endpoints: POST /v1/chat/completions, GET /v1/models, GET /stats.
+
+Latency (--latency):
+    recorded[:SCALE]          each response's recorded latency, times SCALE
+    fixed:S                   S seconds
+    uniform:A,B               uniform between A and B seconds
+    lognormal:MEDIAN,SIGMA    long-tailed, like a loaded shared endpoint
+
+Errors (--errors), as STATUS=PROBABILITY pairs: 429 (sent with Retry-After),
+any 5xx, and `empty` for a 200 whose message content is None (what reasoning
+models return when thinking uses up the tokens).
+
+Requests beyond --max-concurrency get a 429 with Retry-After: 1, like a
+provider's concurrency limit. Requests not in the cassettes are handled by
+--miss: `error` (404), `schema` (a placeholder object built from the request's
+json_schema) or `any` (a recorded response for the same schema or model).
+"""
+import argparse
+import copy
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cassettes import body_key, load_cassettes, schema_name
+
+
+def parse_latency(spec):
+    """
+    Latency sampler from a --latency spec.
+
+    Returns:
+        Function (rng, recorded latency or None) -> seconds
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "recorded":
+        scale = values[0] if values else 1.0
+        return lambda rng, recorded: (recorded or 0.0) * scale
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng, recorded: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng, recorded: rng.uniform(*values)
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda rng, recorded: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Bad --latency {spec!r}; expected recorded[:SCALE], fixed:S, "
+                     f"uniform:A,B or lognormal:MEDIAN,SIGMA")
+
+
+def parse_errors(spec):
+    """{"429": 0.05, "503": 0.02, "empty": 0.03} from "429=0.05,503=0.02,empty=0.03"."""
+    errors = {}
+    for part in filter(None, (spec or "").split(",")):
+        name, _, probability = part.partition("=")
+        name = name.strip()
+        if name != "empty" and not (name.isdigit() and (name == "429" or name.startswith("5"))):
+            raise ValueError(f"Bad --errors entry {part!r}; expected 429, 5xx or empty")
+        errors[name] = float(probability)
+    if sum(errors.values()) > 1:
+        raise ValueError("--errors probabilities add up to more than 1")
+    return errors
+
+
+def placeholder(schema, definitions=None):
+    """A value matching a JSON schema: null where allowed, else an empty/zero value."""
+    definitions = definitions if definitions is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return placeholder(definitions[schema["$ref"].split("/")[-1]], definitions)
+    options = schema.get("anyOf") or schema.get("oneOf")
+    if options:
+        if any(option.get("type") == "null" for option in options):
+            return None
+        return placeholder(options[0], definitions)
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        if "null" in kind:
+            return None
+        kind = kind[0]
+    if kind == "object":
+        return {name: placeholder(prop, definitions) for name, prop in schema.get("properties", {}).items()}
+    return {"string": "", "integer": 0, "number": 0.0, "boolean": False, "array": []}.get(kind)
+
+
+class Replayer:
+    """Picks the response for a request and decides its latency and injected errors."""
+
+    def __init__(self, cassettes, latency, errors, miss="error", seed=None):
+        self.cassettes = cassettes
+        self.latency = latency
+        self.errors = errors
+        self.miss = miss
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self._next = Counter()  # key -> next entry to replay (round robin)
+        self.by_schema = defaultdict(list)
+        self.by_model = defaultdict(list)
+        for entries in cassettes.values():
+            for entry in entries:
+                self.by_schema[schema_name(entry["request"])].append(entry)
+                self.by_model[entry["request"].get("model")].append(entry)
+
+    def entry_for(self, body):
+        """Recorded entry for a request body, or None on a miss."""
+        key = body_key(body)
+        with self.lock:
+            entries = self.cassettes.get(key)
+            if entries:
+                entry = entries[self._next[key] % len(entries)]
+                self._next[key] += 1
+                return entry, "hit"
+            if self.miss == "any":
+                similar = self.by_schema.get(schema_name(body)) or self.by_model.get(body.get("model"))
+                if similar:
+                    return self.rng.choice(similar), "similar"
+        if self.miss == "schema" and schema_name(body):
+            return self._synthesized(body), "synthesized"
+        return None, "miss"
+
+    @staticmethod
+    def _synthesized(body):
+        schema = body["response_format"]["json_schema"].get("schema", {})
+        return {
+            "latency": None,
+            "response": {
+                "id": "chatcmpl-stand-in",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": json.dumps(placeholder(schema))}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            },
+        }
+
+    def draw(self, entry):
+        """(seconds to wait, injected error name or None) for one response."""
+        with self.lock:
+            seconds = self.latency(self.rng, entry.get("latency") if entry else None)
+            roll = self.rng.random()
+        for name, probability in self.errors.items():
+            if roll < probability:
+                return seconds, name
+            roll -= probability
+        return seconds, None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server_version = "LLMStandIn/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.count(str(status))
+
+    def _error(self, status, message, kind, headers=None):
+        self._send(status, {"error": {"message": message, "type": kind, "code": status}}, headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            models = sorted(m for m in self.server.replayer.by_model if m)
+            self._send(200, {"object": "list",
+                             "data": [{"id": m, "object": "model", "owned_by": "stand-in"} for m in models]})
+        elif self.path.rstrip("/") == "/stats":
+            self._send(200, self.server.snapshot())
+        else:
+            self._error(404, f"Unknown path {self.path}", "not_found")
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._error(404, f"Unknown path {self.path}", "not_found")
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self._error(400, "Request body is not JSON", "invalid_request_error")
+            return
+        if body.get("stream"):
+            self._error(400, "The stand-in does not replay streamed responses", "invalid_request_error")
+            return
+        if not self.server.acquire():
+            self._error(429, "Too many concurrent requests", "rate_limit_exceeded", {"Retry-After": "1"})
+            return
+        try:
+            self._complete(body)
+        finally:
+            self.server.release()
+
+    def _complete(self, body):
+        replayer = self.server.replayer
+        entry, outcome = replayer.entry_for(body)
+        self.server.count(outcome)
+        seconds, error = replayer.draw(entry)
+        time.sleep(seconds)
+
+        if error == "429":
+            self._error(429, "Rate limit reached (injected)", "rate_limit_exceeded", {"Retry-After": "1"})
+            return
+        if error is not None and error != "empty":
+            self._error(int(error), "Server error (injected)", "server_error")
+            return
+        if entry is None:
+            self._error(404, f"No recorded response for this request (model {body.get('model')!r}, "
+                             f"schema {schema_name(body)!r}); record it with LLM_CASSETTE_RECORD",
+                        "cassette_miss")
+            return
+
+        response = copy.deepcopy(entry["response"])
+        response["created"] = int(time.time())
+        response["model"] = body.get("model", response.get("model"))
+        if error == "empty":
+            for choice in response.get("choices", []):
+                choice["message"]["content"] = None
+                choice["finish_reason"] = "length"
+            self.server.count("empty")
+        self._send(200, response)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, replayer, max_concurrency=None, verbose=False):
+        super().__init__(address, StandInHandler)
+        self.replayer = replayer
+        self.max_concurrency = max_concurrency
+        self.verbose = verbose
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                self.counts["over_concurrency"] += 1
+                return False
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {"in_flight": self.in_flight, "peak_in_flight": self.peak_in_flight, **self.counts}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve recorded chat completions as an OpenAI-compatible API.")
+    parser.add_argument("cassettes", nargs="+", help="Cassette files recorded with LLM_CASSETTE_RECORD")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", default="recorded",
+                        help="recorded[:SCALE], fixed:S, uniform:A,B or lognormal:MEDIAN,SIGMA (default: recorded)")
+    parser.add_argument("--errors", default="", help="Injected errors, e.g. 429=0.05,503=0.02,empty=0.03")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="Answer requests beyond this many in flight with 429")
+    parser.add_argument("--miss", choices=("error", "schema", "any"), default="error",
+                        help="How to answer requests that are not in the cassettes (default: error)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for latency and error draws")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+
+    try:
+        replayer = Replayer(load_cassettes(args.cassettes), parse_latency(args.latency),
+                            parse_errors(args.errors), args.miss, args.seed)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Error: {e}")
+    recorded = sum(len(entries) for entries in replayer.cassettes.values())
+    server = StandInServer((args.host, args.port), replayer, args.max_concurrency, args.verbose)
+    print(f"Replaying {recorded} responses ({len(replayer.cassettes)} distinct requests) "
+          f"at http://{args.host}:{args.port}/v1")
+    print(f"  latency {args.latency}, errors {args.errors or 'none'}, "
+          f"max concurrency {args.max_concurrency or 'unlimited'}, misses -> {args.miss}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stats: {json.dumps(server.snapshot())}")
+
+
+if __name__ == "__main__":
+    main()
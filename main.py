@@ -1,5 +1,362 @@
-def main():
-    print("Hello from module-3-template!")
+"""
+Batch extraction over every PDF under data/
+
+Each collection directory under data/ has its schema (COLLECTION_SCHEMAS).
+Every PDF found there goes through ingest -> chunk -> score -> extract ->
+merge -> validate:
+
+- Ingest, chunk and score run in a process pool, one document per task,
+  ahead of extraction: while a batch of documents is being extracted the
+  pool is already parsing the next ones. Page text goes through the page
+  cache, so re-runs skip PyMuPDF.
+- Each batch's selected chunks are extracted with concurrent LLM calls
+  (extract_report.extract_chunks), stopping a document early once its
+  schema's fields are filled. Finished chunks are checkpointed (see
+  checkpoint_journal), so rerunning after a crash or Ctrl+C only sends the
+  chunks that are still missing.
+- Merged, validated records are appended to output/<collection>.jsonl as
+  each batch finishes, and progress, throughput and ETA are printed.
+- With EXTRACTION_TRACE=trace.json set, every stage (including the workers'
+  parsing) is traced; a time-by-stage table is printed at the end.
+- With --profile cpu|mem, each document's prepare step (in its worker) and
+  the parent's extract, merge and validate steps are profiled with cProfile
+  or tracemalloc, tagged with the document and its page count (see
+  profiling.py).
+
+Usage:
+    python main.py [data_dir] [--collections a,b] [--workers N] [--concurrency N]
+                   [--batch-size N] [--top-chunks N] [--limit N] [--output-dir DIR]
+                   [--profile cpu|mem]
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from chunk_features import field_queries
+from chunking import iter_chunk_records, read_spans
+from extract_report import (
+    MIN_FIELD_SOURCES, build_chunk_features, extract_chunks, infer_company_name, merge_results,
+    validate_extraction,
+)
+from pdf_text import iter_page_texts
+from profiling import MODES, default_profiler, profile_summary
+from sustainability_schema import CityClimatePlan, EnergyPlanReport, SustainabilityReport
+from tracing import default_tracer, trace_summary
+from usage_log import default_usage_log, usage_table
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+OUTPUT_DIR = Path(os.environ.get("BATCH_OUTPUT_DIR", "output"))
+# Documents extracted per round of LLM calls; the pool parses ahead of it
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", "16"))
+
+# Collection directory under data/ -> schema its documents are extracted with
+COLLECTION_SCHEMAS = {
+    "climate-action-plans": CityClimatePlan,
+    "corporate-sustainability": SustainabilityReport,
+    "utility-irps": EnergyPlanReport,
+}
+
+
+def discover_documents(root=DATA_DIR, collections=None):
+    """
+    Every PDF under `root` whose collection (first directory level) has a schema.
+
+    Returns:
+        List of {"path", "collection"} dicts, sorted by path
+    """
+    root = Path(root)
+    documents = []
+    unknown = Counter()
+    for pdf_path in sorted(root.rglob("*.pdf")):
+        parts = pdf_path.relative_to(root).parts
+        collection = parts[0] if len(parts) > 1 else None
+        if collections is not None and collection not in collections:
+            continue
+        if collection not in COLLECTION_SCHEMAS:
+            unknown[collection or "(top level)"] += 1
+            continue
+        documents.append({"path": str(pdf_path), "collection": collection})
+    for collection, n in unknown.items():
+        print(f"⚠ Skipping {n} PDFs in {collection}: no schema for this collection")
+    return documents
+
+
+def target_fields(schema):
+    """Fields whose filling ends a document's extraction: the optional ones, except notes."""
+    return [name for name, field in schema.model_fields.items()
+            if not field.is_required() and name != "notes"]
+
+
+def document_names(documents):
+    """
+    A unique name per document, used in prompts and as its key in extraction.
+
+    Corporate reports use the company inferred from the filename; other
+    documents (and companies that would otherwise repeat) use the file stem.
+    """
+    names = [infer_company_name(d["path"]) if d["collection"] == "corporate-sustainability"
+             else Path(d["path"]).stem for d in documents]
+    counts = Counter(names)
+    return [name if counts[name] == 1 and name != "Unknown Company" else Path(d["path"]).stem
+            for name, d in zip(names, documents)]
+
+
+def prepare_document(task):
+    """
+    Worker: ingest, chunk and score one document, returning its selected chunk texts.
+
+    Chunks are ranked per schema field and the fewest covering every field
+    are kept (as extract_report.select_field_chunks, without its printing).
+    Errors are returned rather than raised so one bad PDF doesn't stop the run.
+    """
+    pdf_path, collection, top_chunks, per_field, name, profile = task
+    schema = COLLECTION_SCHEMAS[collection]
+    if profile and not default_profiler.enabled:
+        default_profiler.enable(*profile)
+    start = time.perf_counter()
+    try:
+        queries = field_queries(schema, target_fields(schema))
+        vocabulary = {keyword for weights in queries.values() for keyword in weights}
+        num_pages = 0
+
+        def pages():
+            nonlocal num_pages
+            for text in iter_page_texts(pdf_path, workers=1):
+                num_pages += 1
+                yield text
+
+        with default_tracer.span("prepare", document=name), default_profiler.stage(
+                "prepare", document=name, collection=collection) as profile_tags:
+            chunks = default_tracer.traced(iter_chunk_records(default_tracer.traced(pages(), "page")), "split")
+            features, spans = build_chunk_features(chunks, vocabulary)
+            with default_tracer.span("cover"):
+                picked = features.cover(queries, per_field, max_chunks=top_chunks)
+            with default_tracer.span("read"):
+                texts = read_spans(iter_page_texts(pdf_path, workers=1), [spans[i] for i, _ in picked])
+            profile_tags["pages"] = num_pages
+    except Exception as e:
+        return {"path": pdf_path, "error": f"{type(e).__name__}: {e}",
+                "seconds": time.perf_counter() - start, "trace": default_tracer.drain()}
+    covered = {field for _, fields in picked for field in fields}
+    return {
+        "path": pdf_path,
+        "error": None,
+        "pages": num_pages,
+        "chunks": len(features),
+        "texts": texts,
+        "fields_covered": len(covered),
+        "seconds": time.perf_counter() - start,
+        # This worker's spans, merged into the parent's trace
+        "trace": default_tracer.drain(),
+    }
+
+
+def extract_batch(prepared, names, concurrency=None, min_sources=MIN_FIELD_SOURCES):
+    """
+    Extract, merge and validate a batch of prepared documents.
+
+    Documents of one collection share one extract_chunks run (and its
+    concurrency); collections in the batch run one after another.
+
+    Returns:
+        (records, interrupted): one record dict per document, in batch
+        order, and whether Ctrl+C stopped the extraction
+    """
+    records = {}
+    interrupted = False
+    by_collection = {}
+    for doc in prepared:
+        if doc["error"] is None:
+            by_collection.setdefault(doc["collection"], []).append(doc)
+        else:
+            records[doc["path"]] = {"status": "failed", "error": doc["error"]}
+
+    for collection, docs in by_collection.items():
+        if interrupted:
+            for doc in docs:
+                records[doc["path"]] = {"status": "interrupted"}
+            continue
+        schema = COLLECTION_SCHEMAS[collection]
+        jobs = [(text, names[doc["path"]], schema, doc["path"]) for doc in docs for text in doc["texts"]]
+        print(f"\n{collection}: extracting {len(jobs)} chunks from {len(docs)} documents "
+              f"({schema.__name__})...")
+        with default_profiler.stage("extract", collection=collection, documents=len(docs),
+                                    pages=sum(doc["pages"] for doc in docs)):
+            statuses, interrupted = extract_chunks(jobs, concurrency, target_fields(schema), min_sources)
+        position = 0
+        for doc in docs:
+            doc_statuses = statuses[position:position + len(doc["texts"])]
+            position += len(doc["texts"])
+            results = [s["result"] for s in doc_statuses if s["status"] == "ok"]
+            outcomes = Counter(s["status"] for s in doc_statuses)
+            if not results:
+                records[doc["path"]] = {"status": "interrupted" if interrupted else "no_data",
+                                        "chunk_outcomes": dict(outcomes)}
+                continue
+            name = names[doc["path"]]
+            with default_profiler.context(document=name, pages=doc["pages"]):
+                with default_tracer.span("merge", document=name), default_profiler.stage("merge"):
+                    data = merge_results(results).model_dump()
+                with default_tracer.span("validate", document=name), default_profiler.stage("validate"):
+                    validated, notes = validate_extraction(data, doc["texts"], schema)
+            records[doc["path"]] = {"status": "ok", "data": data, "validated": validated is not None,
+                                    "validation": notes, "chunk_outcomes": dict(outcomes)}
+
+    output = []
+    for doc in prepared:
+        record = {
+            "source_file": os.path.basename(doc["path"]),
+            "path": doc["path"],
+            "collection": doc["collection"],
+            "name": names[doc["path"]],
+            "schema": COLLECTION_SCHEMAS[doc["collection"]].__name__,
+            "pages": doc.get("pages"),
+            "chunks_total": doc.get("chunks"),
+            "chunks_selected": len(doc.get("texts") or []),
+            "prepare_seconds": round(doc["seconds"], 2),
+            **records[doc["path"]],
+        }
+        output.append(record)
+    return output, interrupted
+
+
+def _format_duration(seconds):
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def write_records(records, output_dir=OUTPUT_DIR):
+    """Append records to output_dir/<collection>.jsonl."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    by_collection = {}
+    for record in records:
+        by_collection.setdefault(record["collection"], []).append(record)
+    for collection, group in by_collection.items():
+        with open(output_dir / f"{collection}.jsonl", "a", encoding="utf-8") as f:
+            for record in group:
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+def run(documents, workers=None, concurrency=None, batch_size=BATCH_SIZE, top_chunks=5,
+        per_field=3, output_dir=OUTPUT_DIR):
+    """
+    Run the whole pipeline over `documents` (from discover_documents).
+
+    Args:
+        workers: Processes for ingest/chunk/score (default: one per CPU)
+        concurrency: LLM requests in flight (default: EXTRACTION_CONCURRENCY)
+        batch_size: Documents per extraction round
+        top_chunks: Most chunks extracted per document
+        per_field: Candidate chunks ranked per field before the set cover
+
+    Returns:
+        Counter of document outcomes ("ok", "no_data", "failed", "interrupted")
+    """
+    names = dict(zip((d["path"] for d in documents), document_names(documents)))
+    collection_of = {d["path"]: d["collection"] for d in documents}
+    total = len(documents)
+    outcomes = Counter()
+    pages_done = 0
+    done = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Submitted up front, so the pool keeps parsing while batches are extracted
+        futures = [pool.submit(prepare_document,
+                               (d["path"], d["collection"], top_chunks, per_field, names[d["path"]],
+                                default_profiler.settings()))
+                   for d in documents]
+        try:
+            for first in range(0, total, batch_size):
+                batch = []
+                for future in futures[first:first + batch_size]:
+                    doc = future.result()
+                    doc["collection"] = collection_of[doc["path"]]
+                    default_tracer.extend(doc.pop("trace"))
+                    status = f"✗ {doc['error']}" if doc["error"] else (
+                        f"{doc['pages']} pages, {doc['chunks']} chunks -> {len(doc['texts'])} selected "
+                        f"({doc['fields_covered']} fields covered)")
+                    print(f"  [{first + len(batch) + 1}/{total}] {os.path.basename(doc['path'])}: "
+                          f"{status} in {doc['seconds']:.1f}s")
+                    batch.append(doc)
+
+                records, interrupted = extract_batch(batch, names, concurrency)
+                write_records(records, output_dir)
+                outcomes.update(record["status"] for record in records)
+                done += len(batch)
+                pages_done += sum(doc.get("pages") or 0 for doc in batch)
+
+                elapsed = time.perf_counter() - start
+                rate = done / elapsed
+                eta = (total - done) / rate if rate else None
+                print()
+                print(f"Progress: {done}/{total} documents ({done / total:.0%}), "
+                      f"{dict(outcomes)} | {rate * 60:.1f} docs/min, {pages_done / elapsed:.1f} pages/s | "
+                      f"elapsed {_format_duration(elapsed)}, ETA {_format_duration(eta)}")
+                print()
+                if interrupted:
+                    raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            print(f"\nInterrupted after {done}/{total} documents; finished batches are saved in {output_dir}/")
+            for future in futures:
+                future.cancel()
+    return outcomes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract structured data from every PDF under data/.")
+    parser.add_argument("data_dir", nargs="?", default=DATA_DIR, help="Corpus root (default: data/)")
+    parser.add_argument("--collections", help="Comma-separated collections to run (default: all)")
+    parser.add_argument("--workers", type=int, help="Processes for parsing and scoring (default: one per CPU)")
+    parser.add_argument("--concurrency", type=int, help="LLM requests in flight (default: EXTRACTION_CONCURRENCY)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Documents per extraction round")
+    parser.add_argument("--top-chunks", type=int, default=5, help="Most chunks extracted per document")
+    parser.add_argument("--limit", type=int, help="Only the first N documents")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Where <collection>.jsonl files go")
+    parser.add_argument("--profile", choices=MODES,
+                        help="Profile each stage per document with cProfile (cpu) or tracemalloc (mem)")
+    args = parser.parse_args(argv)
+    if args.profile:
+        default_profiler.enable(args.profile)
+
+    collections = set(args.collections.split(",")) if args.collections else None
+    documents = discover_documents(args.data_dir, collections)[:args.limit]
+
+    print("=" * 70)
+    print("BATCH EXTRACTION")
+    print("=" * 70)
+    for collection, n in sorted(Counter(d["collection"] for d in documents).items()):
+        print(f"  {collection}: {n} PDFs -> {COLLECTION_SCHEMAS[collection].__name__}")
+    if not documents:
+        print(f"No PDFs found under {args.data_dir}; run download_data.sh first")
+        return
+    print()
+
+    outcomes = run(documents, args.workers, args.concurrency, max(1, args.batch_size),
+                   args.top_chunks, output_dir=args.output_dir)
+
+    print("=" * 70)
+    print(f"Done: {dict(outcomes)}")
+    print(f"Results: {args.output_dir}/<collection>.jsonl")
+    print()
+    print("LLM COST & LATENCY:")
+    print(usage_table(default_usage_log.records, by="document"))
+    if default_tracer.enabled:
+        print()
+        print("TIME BY STAGE:")
+        print(trace_summary())
+    if default_profiler.enabled:
+        print()
+        print(profile_summary())
+        print(f"Compare with another run: python profiling.py compare <other run> {default_profiler.run_dir}")
 
 
 if __name__ == "__main__":
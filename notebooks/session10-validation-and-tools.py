@@ -30,45 +30,46 @@
 # our approach generalizes.
 
 # %%
-import fitz  # PyMuPDF
 import os
+import sys
 import json
-import time
+from collections import Counter
 from pathlib import Path
-from openai import OpenAI
-from pydantic import BaseModel, Field
-from typing import Optional
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pydantic import BaseModel
 
 # Project paths
 _PROJECT_ROOT = Path(__file__).resolve().parent.parent if '__file__' in dir() else Path.cwd().parent
 CAP_DIR = str(_PROJECT_ROOT / "data" / "climate-action-plans")
 CORP_DIR = str(_PROJECT_ROOT / "data" / "corporate-sustainability")
 
-# API client — credentials from environment variables, never hardcoded
-client = OpenAI(
+# Shared pipeline helpers (pdf_text.py etc.) live in the project root
+sys.path.insert(0, str(_PROJECT_ROOT))
+from pdf_text import cache_summary, load_page_texts
+from chunk_store import ChunkStore
+from chunk_features import field_queries, greedy_cover, top_k_indices
+from bm25_index import BM25Index, default_index, index_summary
+from vector_index import VectorIndex, field_query_texts, hybrid_scores
+from pipeline import Pipeline, Stage, format_plan
+from tracing import default_tracer, trace_summary
+from profiling import default_profiler
+from checkpoint_journal import document_hash
+from llm_client import make_client
+from structured_output import create_structured
+from usage_log import default_usage_log, usage_context, usage_table
+from usage_log import totals as usage_totals
+
+# API client — credentials from environment variables, never hardcoded.
+# make_client wraps OpenAI() with the shared adaptive rate limiter.
+client = make_client(
     base_url=os.environ.get("OPENAI_BASE_URL", "https://ellm.nrp-nautilus.io/v1"),
     api_key=os.environ.get("OPENAI_API_KEY", "your-api-key-here"),
 )
 
 # %%
 # A schema for city climate action plans — different from Session 9's
-# corporate sustainability schema
-class CityClimatePlan(BaseModel):
-    """Structured data extracted from a city climate action plan."""
-    city_name: str = Field(description="Name of the city or jurisdiction")
-    plan_title: str = Field(description="Title of the climate action plan document")
-    plan_year: Optional[int] = Field(None, description="Year the plan was published")
-    ghg_reduction_target: Optional[str] = Field(None, description="Primary GHG reduction target (e.g., '80% below 1990 levels by 2050')")
-    target_year: Optional[int] = Field(None, description="Target year for primary GHG goal")
-    baseline_year: Optional[int] = Field(None, description="Baseline year for measuring reductions")
-    interim_targets: Optional[str] = Field(None, description="Intermediate milestones before the main target")
-    carbon_neutrality_goal: Optional[str] = Field(None, description="Net zero or carbon neutrality commitment if any")
-    renewable_energy_target: Optional[str] = Field(None, description="Renewable energy goals")
-    transportation_strategy: Optional[str] = Field(None, description="Key transportation/mobility strategies")
-    building_strategy: Optional[str] = Field(None, description="Building efficiency or electrification strategies")
-    equity_commitment: Optional[str] = Field(None, description="Environmental justice or equity goals")
-    total_current_emissions: Optional[str] = Field(None, description="Current or most recent total GHG emissions figure")
+# corporate sustainability schema. It lives in sustainability_schema.py next
+# to the other schemas, so main.py extracts the same fields.
+from sustainability_schema import CityClimatePlan
 
 print("Schema fields:")
 for name, field in CityClimatePlan.model_fields.items():
@@ -81,35 +82,31 @@ for name, field in CityClimatePlan.model_fields.items():
 # but cleaner and more general.
 
 # %%
-def load_pdf_text(pdf_path: str) -> list[dict]:
-    """Load a PDF and return page-level text."""
-    doc = fitz.open(pdf_path)
+def load_pdf_text(pdf_path: str, workers: int | None = None) -> list[dict]:
+    """Load a PDF and return page-level text.
+    
+    Served from the on-disk page cache after the first load. `workers` caps
+    the processes used for page-parallel parsing on a cache miss
+    (default: one per CPU; short documents are always parsed serially).
+    """
     pages = []
-    for i, page in enumerate(doc):
-        text = page.get_text()
+    for i, text in enumerate(load_page_texts(pdf_path, workers=workers)):
         if text.strip():
             pages.append({"page_num": i + 1, "text": text})
-    doc.close()
     return pages
 
-def chunk_pages(pages: list[dict], chunk_size: int = 4000, overlap: int = 200) -> list[dict]:
-    """Split pages into overlapping chunks."""
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size, chunk_overlap=overlap,
-        separators=["\n\n", "\n", ". ", " "],
-    )
-    chunks = []
-    for page in pages:
-        for j, chunk_text in enumerate(splitter.split_text(page["text"])):
-            chunks.append({
-                "page_num": page["page_num"],
-                "chunk_index": j,
-                "text": chunk_text,
-            })
-    return chunks
+def chunk_pages(pages: list[dict], chunk_size: int = 4000, overlap: int = 200) -> ChunkStore:
+    """Split pages into overlapping chunks.
+    
+    The chunks share one text buffer (chunk_store.ChunkStore) and are sliced
+    from it on access; each reads like a dict with "text", "page_num" and
+    "chunk_index".
+    """
+    return ChunkStore.from_pages(pages, chunk_size, overlap, separators=["\n\n", "\n", ". ", " "])
 
 def extract_from_chunk(chunk_text: str, schema_prompt: str, model: str,
-                       disable_thinking: bool = True) -> dict:
+                       disable_thinking: bool = True,
+                       response_model: type[BaseModel] | None = None) -> dict:
     """Extract structured data from a text chunk using an LLM.
     
     Args:
@@ -117,6 +114,9 @@ def extract_from_chunk(chunk_text: str, schema_prompt: str, model: str,
         schema_prompt: System prompt describing what to extract  
         model: Which model to use
         disable_thinking: Disable reasoning/thinking mode for reliable JSON
+        response_model: Optional Pydantic schema; the answer is then constrained
+            to it with a strict json_schema response format (json_object
+            fallback for models that don't support schemas)
     
     Returns:
         Parsed JSON dict, or {"no_data": True} on failure
@@ -128,17 +128,22 @@ def extract_from_chunk(chunk_text: str, schema_prompt: str, model: str,
         else:
             extra_body = {"chat_template_kwargs": {"thinking": False}}
     
+    request = dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": schema_prompt},
+            {"role": "user", "content": f"Extract data from this text:\n\n{chunk_text}"}
+        ],
+        temperature=0.0,
+        extra_body=extra_body,
+    )
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": schema_prompt},
-                {"role": "user", "content": f"Extract data from this text:\n\n{chunk_text}"}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.0,
-            extra_body=extra_body,
-        )
+        if response_model is not None:
+            response, _ = create_structured(client, response_model, **request)
+        else:
+            response = client.chat.completions.create(
+                response_format={"type": "json_object"}, **request
+            )
         content = response.choices[0].message.content
         if content is None:
             return {"no_data": True, "_error": "model returned no content"}
@@ -169,15 +174,13 @@ print(f"Loaded: {os.path.basename(test_pdf)} — {len(pages)} pages, {len(chunks
 # Find data-rich chunks
 keywords = ["emissions", "reduction", "target", "goal", "GHG", "carbon neutral",
             "renewable", "net zero", "baseline", "percent", "by 2030", "by 2050"]
-scored = []
-for chunk in chunks:
-    score = sum(1 for kw in keywords if kw.lower() in chunk["text"].lower())
-    if score >= 3:
-        scored.append((score, chunk))
-scored.sort(key=lambda x: x[0], reverse=True)
-
-test_chunk = scored[0][1]
-print(f"\nBest chunk (score={scored[0][0]}, page {test_chunk['page_num']}):")
+# Scores live in an array on the store: binary=True counts how many different
+# keywords appear, and top_k sorts the array rather than (score, chunk) tuples
+chunks.score(keywords, binary=True)
+scored = chunks.top_k(len(chunks), min_score=3)
+
+test_chunk = chunks[scored[0]]
+print(f"\nBest chunk (score={test_chunk['score']:.0f}, page {test_chunk['page_num']}):")
 print(test_chunk["text"][:400])
 
 # %%
@@ -244,16 +247,20 @@ for key in sorted(all_keys):
 # we can't trust single-run results for quantitative work.
 
 # %%
-# Run the same extraction 3 times with the same model
+# Run the same extraction 3 times with the same model.
+# Identical requests are normally answered from the response cache, so
+# bypass() makes each run a real API call.
+from response_cache import bypass
+
 MODEL = os.environ.get("OPENAI_MODEL", "qwen3")
 reproducibility_results = []
 
 print(f"Running 3 extractions with {MODEL} on the same chunk...")
-for run in range(3):
-    result = extract_from_chunk(test_chunk["text"], SCHEMA_PROMPT, model=MODEL)
-    reproducibility_results.append(result)
-    print(f"  Run {run+1} complete")
-    time.sleep(1)
+with bypass():
+    for run in range(3):
+        result = extract_from_chunk(test_chunk["text"], SCHEMA_PROMPT, model=MODEL)
+        reproducibility_results.append(result)
+        print(f"  Run {run+1} complete")
 
 # %%
 # Check reproducibility across runs
@@ -432,20 +439,14 @@ print(json.dumps(full_context_result, indent=2))
 # %%
 # Now extract from just the top chunks (Session 9 approach)
 chunks = chunk_pages(pages)
-scored = []
-for chunk in chunks:
-    score = sum(1 for kw in keywords if kw.lower() in chunk["text"].lower())
-    if score >= 3:
-        scored.append((score, chunk))
-scored.sort(key=lambda x: x[0], reverse=True)
+chunks.score(keywords, binary=True)
 
 chunked_results = []
-for i, (score, chunk) in enumerate(scored[:5]):  # Top 5 chunks
+for i, chunk in enumerate(chunks[row] for row in chunks.top_k(5, min_score=3)):  # Top 5 chunks
     result = extract_from_chunk(chunk["text"], FULL_DOC_PROMPT, model=MODEL)
     if not result.get("no_data"):
         chunked_results.append(result)
     print(f"  Chunk {i+1}/5 (page {chunk['page_num']}): {'data found' if not result.get('no_data') else 'no data'}")
-    time.sleep(0.5)
 
 # Merge chunked results (take first non-null for each field)
 merged_chunked = {}
@@ -486,45 +487,15 @@ print("   Chunked focuses on the best sections but may miss document-wide contex
 # %%
 import pandas as pd
 
-def extract_document(
-    pdf_path: str,
-    schema: type[BaseModel],
-    model: str = None,
-    max_chunks: int = 10,
-    validate: bool = True,
-) -> dict:
-    """Extract structured data from a PDF using an LLM.
-    
-    This is a reusable tool: give it any PDF and any Pydantic schema,
-    and it returns structured, validated data.
-    
-    Args:
-        pdf_path: Path to a PDF file
-        schema: A Pydantic BaseModel class defining the fields to extract
-        model: LLM model name (defaults to OPENAI_MODEL env var or 'qwen3')
-        max_chunks: Maximum number of chunks to process
-        validate: Whether to run validation checks
-    
-    Returns:
-        dict with keys: 'data', 'metadata', 'validation'
-    """
-    if model is None:
-        model = os.environ.get("OPENAI_MODEL", "qwen3")
-    
-    filename = os.path.basename(pdf_path)
-    
-    # 1. Load and chunk
-    pages = load_pdf_text(pdf_path)
-    chunks = chunk_pages(pages)
-    
-    # 2. Build schema-aware prompt from the Pydantic model
+def _extraction_prompt(schema: type[BaseModel]) -> str:
+    """Schema-aware extraction prompt built from the Pydantic model's field descriptions."""
     field_descriptions = []
     for name, field in schema.model_fields.items():
         desc = field.description or "no description"
         field_descriptions.append(f"- {name}: {desc}")
     fields_text = "\n".join(field_descriptions)
     
-    prompt = f"""You are a document data extraction assistant.
+    return f"""You are a document data extraction assistant.
 Extract the following fields from the provided text as JSON.
 
 Fields to extract:
@@ -535,75 +506,234 @@ Rules:
 - Do NOT guess or infer values — only extract what is explicitly stated
 - Use exact numbers and quotes from the text where possible
 - If a field has multiple possible values, choose the most specific one"""
-    
-    # 3. Score and select best chunks
-    # Use field names as keywords for relevance scoring
-    score_keywords = [name.replace("_", " ") for name in schema.model_fields.keys()]
-    # Add common data indicator words
-    score_keywords.extend(["percent", "target", "goal", "emissions", "by 20"])
-    
-    scored = []
-    for chunk in chunks:
-        score = sum(1 for kw in score_keywords if kw.lower() in chunk["text"].lower())
-        if score >= 2:
-            scored.append((score, chunk))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    selected = scored[:max_chunks]
-    
-    # 4. Extract from each chunk
+
+
+# The tool's steps as pipeline stages (see pipeline.py): each stage's output is
+# cached under its inputs and parameters, so re-running after changing, say,
+# max_chunks only recomputes selection — and extraction only if the selected
+# chunks actually changed.
+
+def ingest_stage(pdf_path: str, workers: int = None) -> list[dict]:
+    """1. Load page texts (from the page cache after the first run)."""
+    pages = load_pdf_text(pdf_path, workers=workers)
+    default_profiler.tag(pages=len(pages))
+    return pages
+
+
+def chunk_stage(pages: list[dict], chunk_size: int = 4000, overlap: int = 200) -> ChunkStore:
+    """2. Split into chunks, keeping each chunk's page number (one shared text buffer)."""
+    return chunk_pages(pages, chunk_size, overlap)
+
+
+def select_stage(chunks: ChunkStore, schema: type[BaseModel], max_chunks: int = 10,
+                 vector_weight: float = 0.5, pdf_path: str = None,
+                 index: BM25Index = None, vectors: VectorIndex = None) -> ChunkStore:
+    """3. Rank chunks per field — each field's query comes from its name and
+    description — and keep the fewest chunks that cover every field (as a
+    compact store of just those chunks)."""
+    queries = field_queries(schema)
+    if index is not None:
+        index.add_document(pdf_path)
+        hits = {}
+        ranked = {}
+        for field, query in queries.items():
+            field_hits = index.search(query, 3, documents=[pdf_path])
+            hits.update((hit["chunk"], hit) for hit in field_hits)
+            ranked[field] = [hit["chunk"] for hit in field_hits]
+        picked = [hits[chunk] for chunk, _ in greedy_cover(ranked, max_chunks)]
+        return ChunkStore.from_texts(index.texts(picked), [hit["pages"][0] for hit in picked])
+    
+    vocabulary = {kw for weights in queries.values() for kw in weights}
+    features = chunks.features(vocabulary)
+    if vectors is None:
+        return chunks.take([row for row, _ in features.cover(queries, k=3, max_chunks=max_chunks)])
+    chunk_vectors = vectors.embed(list(chunks.texts()))
+    query_texts = field_query_texts(schema, list(queries))
+    cosine = vectors.cosine(list(query_texts.values()), chunk_vectors)
+    ranked = {field: top_k_indices(hybrid_scores(features.scores(query), cosine[i], vector_weight),
+                                   3, min_score=1e-9).tolist()
+              for i, (field, query) in enumerate(queries.items())}
+    return chunks.take([row for row, _ in greedy_cover(ranked, max_chunks)])
+
+
+def extract_stage(selected: list[dict], schema: type[BaseModel], model: str,
+                  target_fields: list[str], min_sources: int, filename: str) -> dict:
+    """4. Extract from each chunk (calls are tagged with the document for usage
+    accounting), stopping as soon as every target field has been found by enough chunks."""
+    prompt = _extraction_prompt(schema)
+    field_sources = Counter()
     all_results = []
-    for i, (score, chunk) in enumerate(selected):
-        result = extract_from_chunk(chunk["text"], prompt, model=model)
-        if not result.get("no_data"):
-            result["_page"] = chunk["page_num"]
-            all_results.append(result)
-        time.sleep(0.5)
-    
-    # 5. Merge results — first non-null value wins, track source pages
+    processed = 0
+    first_call = len(default_usage_log.records)
+    with usage_context(document=filename):
+        for chunk in selected:
+            if target_fields and all(field_sources[f] >= min_sources for f in target_fields):
+                break
+            with default_tracer.span("job", page=chunk["page_num"]):
+                result = extract_from_chunk(chunk["text"], prompt, model=model, response_model=schema)
+            processed += 1
+            if not result.get("no_data"):
+                result["_page"] = chunk["page_num"]
+                all_results.append(result)
+                field_sources.update(f for f in target_fields if result.get(f) is not None)
+    calls = [r for r in default_usage_log.records[first_call:] if r["document"] == filename]
+    return {"results": all_results, "processed": processed, "usage": usage_totals(calls)}
+
+
+def merge_stage(extraction: dict, schema: type[BaseModel]) -> dict:
+    """5. Merge results — first non-null value wins, track source pages."""
     merged = {}
     source_pages = {}
     for field in schema.model_fields:
-        for r in all_results:
+        for r in extraction["results"]:
             val = r.get(field)
             if val is not None:
                 merged[field] = val
                 source_pages[field] = r.get("_page", "unknown")
                 break
-    
-    # 6. Validate against schema
+    return {"data": merged, "source_pages": source_pages}
+
+
+def validate_stage(merged: dict, pages: list[dict], schema: type[BaseModel], validate: bool = True) -> dict:
+    """6. Validate against the schema, then 7. basic consistency checks."""
     validation_notes = []
     try:
-        validated = schema(**merged)
+        validated = schema(**merged["data"])
         validation_notes.append("✓ Schema validation passed")
     except Exception as e:
         validation_notes.append(f"✗ Schema validation failed: {e}")
         validated = None
     
-    # 7. Basic consistency checks
     if validate:
         # Check: are extracted values actually in the source text?
         full_text = " ".join(p["text"] for p in pages).lower()
-        for field, value in merged.items():
+        for field, value in merged["data"].items():
             if value is not None and str(value).lower() not in full_text:
                 # Don't flag short common words
                 if len(str(value)) > 5:
                     validation_notes.append(
                         f"⚠️  {field}: '{str(value)[:50]}' not found verbatim in document"
                     )
+    return {"validated": validated.model_dump() if validated else None, "notes": validation_notes}
+
+
+def document_pipeline(
+    pdf_path: str,
+    schema: type[BaseModel],
+    model: str,
+    max_chunks: int = 10,
+    validate: bool = True,
+    pdf_workers: int = None,
+    target_fields: list[str] = None,
+    min_sources: int = 1,
+    index: BM25Index = None,
+    vectors: VectorIndex = None,
+    vector_weight: float = 0.5,
+) -> Pipeline:
+    """The stages of extract_document, wired into a cached pipeline."""
+    if target_fields is None:
+        target_fields = list(schema.model_fields)
+    # Index-based selection depends on the saved index, not only on the
+    # chunks, so it reruns every time (extraction is still cached by its input)
+    indexed = index is not None or vectors is not None
+    return Pipeline([
+        Stage("ingest", ingest_stage, options={"workers": pdf_workers}, persist=False),
+        Stage("chunk", chunk_stage, ["ingest"]),
+        Stage("select", select_stage, ["chunk"],
+              params={"schema": schema, "max_chunks": max_chunks, "vector_weight": vector_weight},
+              options={"pdf_path": pdf_path, "index": index, "vectors": vectors}, persist=not indexed),
+        Stage("extract", extract_stage, ["select"],
+              params={"schema": schema, "model": model, "target_fields": target_fields,
+                      "min_sources": min_sources, "filename": os.path.basename(pdf_path)}),
+        Stage("merge", merge_stage, ["extract"], params={"schema": schema}),
+        Stage("validate", validate_stage, ["merge", "ingest"], params={"schema": schema, "validate": validate}),
+    ])
+
+
+def extract_document(
+    pdf_path: str,
+    schema: type[BaseModel],
+    model: str = None,
+    max_chunks: int = 10,
+    validate: bool = True,
+    pdf_workers: int = None,
+    target_fields: list[str] = None,
+    min_sources: int = 1,
+    index: BM25Index = None,
+    vectors: VectorIndex = None,
+    vector_weight: float = 0.5,
+    dry_run: bool = False,
+) -> dict:
+    """Extract structured data from a PDF using an LLM.
+    
+    This is a reusable tool: give it any PDF and any Pydantic schema,
+    and it returns structured, validated data. It runs as cached stages
+    (ingest → chunk → select → extract → merge → validate), so calling it
+    again only recomputes the stages whose inputs or parameters changed.
+    
+    Args:
+        pdf_path: Path to a PDF file
+        schema: A Pydantic BaseModel class defining the fields to extract
+        model: LLM model name (defaults to OPENAI_MODEL env var or 'qwen3')
+        max_chunks: Maximum number of chunks to process
+        validate: Whether to run validation checks
+        pdf_workers: Processes for page-parallel PDF parsing (default: one per CPU)
+        target_fields: Stop processing chunks once these fields are filled
+            (default: every schema field; [] to always process max_chunks)
+        min_sources: Chunks that must report a field before it counts as filled
+        index: Optional BM25Index; chunks are then ranked with BM25 from the
+            persistent index (the PDF is added to it if needed) instead of
+            keyword counts over freshly split chunks
+        vectors: Optional VectorIndex; each field's keyword scores are then
+            blended with the cosine similarity between the chunks and the
+            field's description (hashed TF-IDF from the saved index)
+        vector_weight: Share of the vector score in that blend (1 = vectors only)
+        dry_run: Only print which stages would recompute (returns None)
+    
+    Returns:
+        dict with keys: 'data', 'metadata', 'validation'. Token and timing
+        metadata describe the run that produced the (possibly cached) extraction.
+    """
+    if model is None:
+        model = os.environ.get("OPENAI_MODEL", "qwen3")
+    
+    pipeline = document_pipeline(pdf_path, schema, model, max_chunks, validate, pdf_workers,
+                                 target_fields, min_sources, index, vectors, vector_weight)
+    if dry_run:
+        print(format_plan(pipeline.plan(document_hash(pdf_path))))
+        return None
+    
+    # Every stage (and each chunk's LLM call) is a tracing span when EXTRACTION_TRACE is set,
+    # and with PIPELINE_PROFILE=cpu|mem each stage is profiled (see profiling.py)
+    name = os.path.basename(pdf_path)
+    with default_tracer.span("document", document=name), default_profiler.context(document=name):
+        out = pipeline.run(pdf_path, document_hash(pdf_path),
+                           outputs=["chunk", "select", "extract", "merge", "validate"])
+    extraction = out["extract"]
+    usage = extraction["usage"]
     
     return {
-        "data": merged,
-        "validated": validated.model_dump() if validated else None,
+        "data": out["merge"]["data"],
+        "validated": out["validate"]["validated"],
         "metadata": {
-            "source_file": filename,
-            "pages": len(pages),
-            "chunks_total": len(chunks),
-            "chunks_with_data": len(all_results),
-            "chunks_processed": len(selected),
+            "source_file": os.path.basename(pdf_path),
+            # The chunk store keeps every ingested page (not only those a chunk starts on),
+            # so a fully cached run can report the page count without re-reading the PDF
+            "pages": len(out["chunk"].page_numbers),
+            "chunks_total": len(out["chunk"]),
+            "chunks_with_data": len(extraction["results"]),
+            "chunks_processed": extraction["processed"],
+            "chunks_skipped": len(out["select"]) - extraction["processed"],
             "model": model,
-            "source_pages": source_pages,
+            "source_pages": out["merge"]["source_pages"],
+            "llm_calls": usage["calls"],
+            "cached_calls": usage["cached"],
+            "prompt_tokens": usage["prompt_tokens"],
+            "completion_tokens": usage["completion_tokens"],
+            "llm_seconds": round(usage["latency"], 2),
+            "cost_usd": usage["cost"],
         },
-        "validation": validation_notes,
+        "validation": out["validate"]["notes"],
     }
 
 print("✓ extract_document() tool defined")
@@ -625,18 +755,40 @@ for pdf_file in cap_files:
     pdf_path = os.path.join(CAP_DIR, pdf_file)
     print(f"📄 {pdf_file}")
     
-    result = extract_document(pdf_path, CityClimatePlan, max_chunks=8)
+    # Chunks come from the persistent BM25 index (each plan is indexed on first use)
+    result = extract_document(pdf_path, CityClimatePlan, max_chunks=8, index=default_index)
     all_extractions.append(result)
     
     # Show key findings
     data = result["data"]
     print(f"   City: {data.get('city_name', '?')}")
     print(f"   Target: {data.get('ghg_reduction_target', '?')}")
-    print(f"   Chunks with data: {result['metadata']['chunks_with_data']}/{result['metadata']['chunks_processed']}")
+    print(f"   Chunks with data: {result['metadata']['chunks_with_data']}/{result['metadata']['chunks_processed']}"
+          f" ({result['metadata']['chunks_skipped']} skipped once all fields were found)")
+    print(f"   Tokens: {result['metadata']['prompt_tokens']:,} prompt + "
+          f"{result['metadata']['completion_tokens']:,} completion in {result['metadata']['llm_seconds']}s")
     for note in result["validation"]:
         print(f"   {note}")
     print()
 
+print(cache_summary())  # re-runs skip PDF parsing entirely
+print(index_summary())
+print()
+print(usage_table(default_usage_log.records, by="document"))
+if default_tracer.enabled:  # time by stage: parsing vs splitting vs selection vs LLM calls
+    print()
+    print(trace_summary())
+
+# %%
+# Cross-document questions: the index covers every plan, so one query ranks
+# the chunks of all of them in milliseconds, without reading any text
+question = "carbon neutral net zero by 2045"
+hits = default_index.search(question, k=5, documents=[os.path.join(CAP_DIR, f) for f in cap_files])
+print(f"Top chunks for {question!r}:")
+for hit, text in zip(hits, default_index.texts(hits)):
+    print(f"  {hit['score']:5.2f}  {os.path.basename(hit['document'])} p.{hit['pages'][0]}: "
+          f"{' '.join(text.split())[:100]}...")
+
 # %%
 # Build the comparison table
 rows = []
@@ -33,12 +33,20 @@
 # - `model`: Which model to use
 
 # %%
-from openai import OpenAI
 import os
+import sys
+from pathlib import Path
+
+# Shared helpers (llm_client.py etc.) live in the project root
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent if '__file__' in dir() else Path.cwd().parent
+sys.path.insert(0, str(_PROJECT_ROOT))
+from llm_client import make_client
 
 # Configure the client to point at our API endpoint
-# The base_url and api_key will be set as environment variables
-client = OpenAI(
+# The base_url and api_key will be set as environment variables.
+# make_client returns an OpenAI client whose requests go through a shared
+# rate limiter that backs off on 429s and speeds up when the API is idle.
+client = make_client(
     base_url=os.environ.get("OPENAI_BASE_URL", "https://ellm.nrp-nautilus.io/v1"),
     api_key=os.environ.get("OPENAI_API_KEY"),
 )
@@ -28,6 +28,7 @@
 # %%
 import fitz  # PyMuPDF
 import os
+import sys
 from pathlib import Path
 
 # Point to our downloaded PDFs
@@ -35,6 +36,9 @@ from pathlib import Path
 _PROJECT_ROOT = Path(__file__).resolve().parent.parent if '__file__' in dir() else Path.cwd().parent
 DATA_DIR = str(_PROJECT_ROOT / "data" / "corporate-sustainability")
 
+# Shared pipeline helpers (pdf_text.py etc.) live in the project root
+sys.path.insert(0, str(_PROJECT_ROOT))
+
 # List available PDFs
 pdfs = [f for f in os.listdir(DATA_DIR) if f.endswith('.pdf')]
 print("Available sustainability reports:")
@@ -76,38 +80,31 @@ doc.close()
 # - **Boundaries**: Should we split on pages, paragraphs, or sections?
 
 # %%
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from chunk_store import ChunkStore
+from pdf_text import cache_summary, load_page_texts
 
-def load_pdf_pages(pdf_path: str) -> list[dict]:
-    """Load a PDF and return a list of {page_num, text} dicts."""
-    doc = fitz.open(pdf_path)
+def load_pdf_pages(pdf_path: str, workers: int | None = None) -> list[dict]:
+    """Load a PDF and return a list of {page_num, text} dicts.
+    
+    Repeat loads of the same PDF come from the on-disk page cache. Otherwise
+    long PDFs are parsed page-parallel across `workers` processes
+    (default: one per CPU); short ones, or `workers=1`, are parsed serially.
+    """
     pages = []
-    for i, page in enumerate(doc):
-        text = page.get_text()
+    for i, text in enumerate(load_page_texts(pdf_path, workers=workers)):
         if text.strip():  # Skip blank pages
             pages.append({"page_num": i + 1, "text": text})
-    doc.close()
     return pages
 
-def chunk_document(pages: list[dict], chunk_size: int = 4000, overlap: int = 200) -> list[dict]:
-    """Split document pages into overlapping text chunks."""
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
-        separators=["\n\n", "\n", ". ", " "],
-    )
+def chunk_document(pages: list[dict], chunk_size: int = 4000, overlap: int = 200) -> ChunkStore:
+    """Split document pages into overlapping text chunks.
     
-    chunks = []
-    for page in pages:
-        page_chunks = splitter.split_text(page["text"])
-        for j, chunk_text in enumerate(page_chunks):
-            chunks.append({
-                "page_num": page["page_num"],
-                "chunk_index": j,
-                "text": chunk_text,
-                "char_count": len(chunk_text),
-            })
-    return chunks
+    The chunks live in a ChunkStore (chunk_store.py): the page text is kept
+    once and each chunk is a pair of offsets into it, so overlapping chunks
+    don't copy text. Each chunk still reads like a dict: chunk["text"],
+    chunk["page_num"], chunk["chunk_index"], chunk["char_count"].
+    """
+    return ChunkStore.from_pages(pages, chunk_size, overlap, separators=["\n\n", "\n", ". ", " "])
 
 # Load and chunk the Google report
 pages = load_pdf_pages(pdf_path)
@@ -115,7 +112,7 @@ chunks = chunk_document(pages)
 
 print(f"Pages with text: {len(pages)}")
 print(f"Total chunks: {len(chunks)}")
-print(f"Avg chunk size: {sum(c['char_count'] for c in chunks) / len(chunks):.0f} chars")
+print(f"Avg chunk size: {chunks.lengths.mean():.0f} chars")
 print(f"\nSample chunk (page {chunks[10]['page_num']}):")
 print(chunks[10]["text"][:300])
 
@@ -185,10 +182,10 @@ print(f"EmissionsMetrics has {len(EmissionsMetrics.model_fields)} fields")
 # any sustainability metrics it finds.
 
 # %%
-from openai import OpenAI
+from llm_client import make_client
 import json
 
-client = OpenAI(
+client = make_client(
     base_url=os.environ.get("OPENAI_BASE_URL", "https://ellm.nrp-nautilus.io/v1"),
     api_key=os.environ.get("OPENAI_API_KEY", "your-api-key-here"),
 )
@@ -242,21 +239,19 @@ def extract_from_chunk(chunk_text: str, model: str = MODEL) -> dict:
 
 # Test on a single chunk — pick one likely to have data
 # We'll scan chunks for keywords first
-data_chunks = []
 keywords = ["emissions", "scope 1", "scope 2", "MWh", "renewable", "carbon", "water", "CO2"]
-for chunk in chunks:
-    score = sum(1 for kw in keywords if kw.lower() in chunk["text"].lower())
-    if score >= 2:
-        data_chunks.append((score, chunk))
+# One pass over the chunk text; binary=True scores how many different keywords appear
+chunks.score(keywords, binary=True)
+data_chunks = chunks.top_k(len(chunks), min_score=2)  # rows, best first
 
-data_chunks.sort(key=lambda x: x[0], reverse=True)
 print(f"Found {len(data_chunks)} chunks with sustainability keywords")
-print(f"Top chunk (score={data_chunks[0][0]}) from page {data_chunks[0][1]['page_num']}:")
-print(data_chunks[0][1]["text"][:300])
+top_chunk = chunks[data_chunks[0]]
+print(f"Top chunk (score={top_chunk['score']:.0f}) from page {top_chunk['page_num']}:")
+print(top_chunk["text"][:300])
 
 # %%
 # Extract from the top chunk
-test_chunk = data_chunks[0][1]
+test_chunk = top_chunk
 print(f"Extracting from page {test_chunk['page_num']}...\n")
 
 result = extract_from_chunk(test_chunk["text"])
@@ -271,8 +266,6 @@ print(json.dumps(result, indent=2))
 # hours of manual work.
 
 # %%
-import time
-
 def extract_full_report(pdf_path: str, max_chunks: int = 30) -> dict:
     """Extract sustainability metrics from an entire PDF report."""
     
@@ -289,19 +282,14 @@ def extract_full_report(pdf_path: str, max_chunks: int = 30) -> dict:
                  "renewable", "carbon", "CO2", "water", "net zero", "target", 
                  "megaliters", "metric tons", "mtco2e"]
     
-    scored = []
-    for chunk in chunks:
-        score = sum(1 for kw in keywords if kw.lower() in chunk["text"].lower())
-        if score >= 2:
-            scored.append((score, chunk))
-    
-    scored.sort(key=lambda x: x[0], reverse=True)
-    selected = scored[:max_chunks]
-    print(f"   Selected top {len(selected)} data-rich chunks (of {len(scored)} candidates)")
+    chunks.score(keywords, binary=True)
+    candidates = chunks.top_k(len(chunks), min_score=2)
+    selected = [chunks[row] for row in candidates[:max_chunks]]
+    print(f"   Selected top {len(selected)} data-rich chunks (of {len(candidates)} candidates)")
     
     # Extract from each chunk
     all_results = []
-    for i, (score, chunk) in enumerate(selected):
+    for i, chunk in enumerate(selected):
         try:
             result = extract_from_chunk(chunk["text"])
             if not result.get("no_data"):
@@ -312,8 +300,7 @@ def extract_full_report(pdf_path: str, max_chunks: int = 30) -> dict:
                 print(f"   · Chunk {i+1}/{len(selected)} (page {chunk['page_num']}): no data")
         except Exception as e:
             print(f"   ✗ Chunk {i+1}/{len(selected)}: error - {e}")
-        
-        time.sleep(0.5)  # Rate limiting
+        # No sleep needed: the client's rate limiter paces requests
     
     print(f"   📊 Extracted data from {len(all_results)} chunks")
     return all_results
@@ -394,6 +381,8 @@ for company, filename in report_files.items():
         all_company_results[company] = aggregate_report_results(results, company)
         print()
 
+print(cache_summary())  # re-runs skip PDF parsing entirely
+
 # Build comparison DataFrame
 df = pd.DataFrame(all_company_results.values())
 print("\n📊 SUSTAINABILITY METRICS COMPARISON")
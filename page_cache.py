@@ -0,0 +1,247 @@
+"""
+Content-addressed on-disk cache of extracted PDF page text
+
+Entries are keyed by the SHA-256 of the PDF bytes plus the PyMuPDF extraction
+mode, so renaming or re-downloading a file still hits, and any edit misses.
+Each entry is one file: a small header, the per-page byte offsets and CRC-32s,
+and a single zlib-compressed UTF-8 blob holding every page back to back. The cache is capped
+by total size and evicts least-recently-used entries first.
+"""
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import zlib
+from array import array
+from pathlib import Path
+
+CACHE_DIR = Path(os.environ.get(
+    "PAGE_CACHE_DIR", Path(__file__).resolve().parent / ".cache" / "page_text"
+))
+MAX_CACHE_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+_MAGIC = b"PTC2"
+_HEADER = struct.Struct("<4sI")  # magic, page count
+_ENTRY_SUFFIX = ".ptc"
+_READ_BLOCK = 256 * 1024
+# What reading a damaged entry raises (bad header, truncated or corrupt blob)
+CORRUPT_ENTRY_ERRORS = (OSError, ValueError, zlib.error, struct.error)
+
+
+# (path, size, mtime) -> running SHA-256 of the PDF bytes, so a document is
+# read and hashed once per run however many stages ask for its key
+_pdf_digests = {}
+
+
+def pdf_cache_key(pdf_path, mode="text"):
+    """SHA-256 of the PDF bytes and the extraction mode (the bytes are hashed once per file version)."""
+    stat = os.stat(pdf_path)
+    file_key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    if file_key not in _pdf_digests:
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        _pdf_digests[file_key] = digest
+    digest = _pdf_digests[file_key].copy()
+    digest.update(b"\0" + mode.encode())
+    return digest.hexdigest()
+
+
+def _encode(page_texts):
+    encoded = [text.encode("utf-8") for text in page_texts]
+    offsets = array("Q", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    crcs = array("I", [zlib.crc32(data) for data in encoded])
+    blob = zlib.compress(b"".join(encoded), 6)
+    return _HEADER.pack(_MAGIC, len(encoded)) + offsets.tobytes() + crcs.tobytes() + blob
+
+
+def _check_page(data, crc):
+    if zlib.crc32(data) != crc:
+        raise ValueError("corrupt page in page-text cache entry")
+    return data.decode("utf-8")
+
+
+def _read_index(f):
+    """Read an entry's header, page offsets and page CRCs from the open file `f`."""
+    magic, num_pages = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != _MAGIC:
+        raise ValueError("not a page-text cache entry")
+    offsets, crcs = array("Q"), array("I")
+    offsets.frombytes(f.read((num_pages + 1) * offsets.itemsize))
+    crcs.frombytes(f.read(num_pages * crcs.itemsize))
+    if len(crcs) != num_pages:
+        raise ValueError("truncated page-text cache entry")
+    return offsets, crcs
+
+
+def _decode(payload):
+    f = io.BytesIO(payload)
+    offsets, crcs = _read_index(f)
+    blob = zlib.decompress(f.read())
+    return [_check_page(blob[offsets[i]:offsets[i + 1]], crcs[i]) for i in range(len(crcs))]
+
+
+def _stream_pages(f, offsets, crcs):
+    """
+    Decompress a cache entry's blob block by block, yielding one page at a
+    time. Each page is checked against its CRC before it is handed out, since
+    zlib only verifies the blob as a whole once it reaches the end.
+    """
+    with f:
+        decompressor = zlib.decompressobj()
+        num_pages = len(offsets) - 1
+        pending = bytearray()
+        consumed = 0  # blob offset of pending[0]
+        page = 0
+        while page < num_pages:
+            block = f.read(_READ_BLOCK)
+            pending += decompressor.decompress(block) if block else decompressor.flush()
+            while page < num_pages and offsets[page + 1] - consumed <= len(pending):
+                end = offsets[page + 1] - consumed
+                yield _check_page(pending[:end], crcs[page])
+                del pending[:end]
+                consumed = offsets[page + 1]
+                page += 1
+            if not block and page < num_pages:
+                raise ValueError("truncated page-text cache entry")
+
+
+class _EntryWriter:
+    """Builds a cache entry one page at a time, compressing as it goes."""
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        cache.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._blob = tempfile.TemporaryFile(dir=cache.cache_dir)
+        self._compressor = zlib.compressobj(6)
+        self._offsets = array("Q", [0])
+        self._crcs = array("I")
+
+    def add(self, text):
+        data = text.encode("utf-8")
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._crcs.append(zlib.crc32(data))
+        self._blob.write(self._compressor.compress(data))
+
+    def commit(self):
+        """Write the finished entry into the cache."""
+        self._blob.write(self._compressor.flush())
+        self._blob.seek(0)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(self._offsets) - 1))
+            f.write(self._offsets.tobytes())
+            f.write(self._crcs.tobytes())
+            for block in iter(lambda: self._blob.read(_READ_BLOCK), b""):
+                f.write(block)
+        self._blob.close()
+        os.replace(tmp_path, self.cache._path(self.key))
+        self.cache.evict()
+
+    def discard(self):
+        """Drop a partially written entry (e.g. the reader stopped early)."""
+        self._blob.close()
+
+
+class PageTextCache:
+    """Size-bounded LRU cache of page texts, stored one file per document."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}{_ENTRY_SUFFIX}"
+
+    def get(self, key):
+        """Return the cached page texts for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            payload = path.read_bytes()
+            page_texts = _decode(payload)
+        except CORRUPT_ENTRY_ERRORS:
+            self.misses += 1
+            return None
+        os.utime(path)  # mark as recently used
+        self.hits += 1
+        return page_texts
+
+    def iter_pages(self, key):
+        """
+        Stream the cached page texts for `key` without decompressing the whole
+        document at once. Returns None on a miss.
+
+        Only the header is checked here; a truncated or damaged page raises
+        one of CORRUPT_ENTRY_ERRORS while streaming (see `discard`).
+        """
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            offsets, crcs = _read_index(f)
+        except (ValueError, struct.error):
+            f.close()
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return _stream_pages(f, offsets, crcs)
+
+    def discard(self, key):
+        """Delete an entry that turned out corrupt while streaming; its hit counts as a miss."""
+        self._path(key).unlink(missing_ok=True)
+        self.hits -= 1
+        self.misses += 1
+
+    def writer(self, key):
+        """Incremental writer for a new entry: call add(text) per page, then commit()."""
+        return _EntryWriter(self, key)
+
+    def put(self, key, page_texts):
+        """Store page texts under `key`, then evict old entries over the size cap."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(_encode(page_texts))
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.cache_dir.glob(f"*{_ENTRY_SUFFIX}"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self):
+        """Hit/miss counts for this process plus current on-disk usage."""
+        entries = list(self.cache_dir.glob(f"*{_ENTRY_SUFFIX}")) if self.cache_dir.exists() else []
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(p.stat().st_size for p in entries),
+        }
+
+
+# Shared by every entry point in this process
+default_cache = PageTextCache()
@@ -0,0 +1,169 @@
+"""
+Page-level PDF text extraction shared by the extraction scripts
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+from page_cache import CORRUPT_ENTRY_ERRORS, default_cache, pdf_cache_key
+
+# Below this many pages per worker, starting processes costs more than it saves,
+# so short reports are extracted serially.
+MIN_PAGES_PER_WORKER = 25
+
+
+def _extract_page_range(args):
+    """Worker: open our own document handle and return the texts of one page range."""
+    pdf_path, start, stop, mode = args
+    doc = fitz.open(pdf_path)
+    try:
+        return [doc[page_num].get_text(mode) for page_num in range(start, stop)]
+    finally:
+        doc.close()
+
+
+def _page_ranges(num_pages, num_shards):
+    """Split [0, num_pages) into contiguous, nearly equal (start, stop) ranges."""
+    base, extra = divmod(num_pages, num_shards)
+    ranges = []
+    start = 0
+    for shard in range(num_shards):
+        stop = start + base + (1 if shard < extra else 0)
+        if stop > start:
+            ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def _pool_context():
+    # Prefer fork: with spawn, every worker re-imports the calling script, and the
+    # notebooks and one-off scripts in this repo have no __main__ guard.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def resolve_workers(num_pages, workers=None):
+    """Number of processes to use for a document, 1 meaning serial extraction."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, num_pages // MIN_PAGES_PER_WORKER))
+
+
+def _iter_extracted_pages(pdf_path, workers, mode, start=0):
+    """Parse page texts with PyMuPDF from page `start` on, yielding them in page order as they are ready."""
+    doc = fitz.open(pdf_path)
+    num_pages = len(doc)
+    workers = resolve_workers(num_pages - start, workers)
+
+    if workers == 1:
+        try:
+            for page_num in range(start, num_pages):
+                yield doc[page_num].get_text(mode)
+        finally:
+            doc.close()
+        return
+    doc.close()
+
+    # Two shards per worker evens out documents whose heavy pages are clustered
+    ranges = _page_ranges(num_pages - start, workers * 2)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+        shards = pool.map(_extract_page_range,
+                          [(pdf_path, start + first, start + stop, mode) for first, stop in ranges])
+        for shard in shards:
+            yield from shard
+
+
+def extract_page_texts(pdf_path, workers=None, mode="text"):
+    """
+    Extract the text of every page of a PDF, in page order.
+
+    Pages are sharded into contiguous ranges and extracted by a process pool,
+    each worker opening its own PyMuPDF handle. Documents too short to benefit
+    fall back to serial extraction.
+
+    Args:
+        pdf_path: Path to the PDF file
+        workers: Maximum number of worker processes (default: one per CPU;
+            1 forces serial extraction)
+        mode: PyMuPDF `get_text` mode (default: "text")
+
+    Returns:
+        List with one text string per page
+    """
+    return list(_iter_extracted_pages(pdf_path, workers, mode))
+
+
+def iter_page_texts(pdf_path, workers=None, mode="text", cache=default_cache):
+    """
+    Yield the text of each page lazily, in page order.
+
+    Unlike `load_page_texts`, the whole document is never held in memory:
+    cached documents are decompressed page by page, and on a miss pages are
+    handed on as soon as PyMuPDF produces them while the cache entry is
+    written alongside. Pass `cache=None` to bypass the cache.
+
+    A cache entry found corrupt or truncated while streaming is discarded
+    (and counted as a miss); extraction picks up at the first page not yet
+    yielded, so the caller sees each page once either way.
+    """
+    writer = None
+    if cache is not None:
+        key = pdf_cache_key(pdf_path, mode)
+        cached = cache.iter_pages(key)
+        if cached is not None:
+            yielded = 0
+            try:
+                for text in cached:
+                    yield text
+                    yielded += 1
+                return
+            except CORRUPT_ENTRY_ERRORS as e:
+                print(f"⚠ Page cache entry for {pdf_path} is corrupt ({e}); re-extracting")
+                cache.discard(key)
+            if yielded:
+                # The remaining pages alone cannot make a new entry; the next read writes it
+                yield from _iter_extracted_pages(pdf_path, workers, mode, start=yielded)
+                return
+        writer = cache.writer(key)
+
+    completed = False
+    try:
+        for text in _iter_extracted_pages(pdf_path, workers, mode):
+            if writer is not None:
+                writer.add(text)
+            yield text
+        completed = True
+    finally:
+        if writer is not None:
+            if completed:
+                writer.commit()
+            else:
+                writer.discard()
+
+
+def load_page_texts(pdf_path, workers=None, mode="text", cache=default_cache):
+    """
+    Page texts for a PDF, served from the on-disk page cache when possible.
+
+    A warm run skips PyMuPDF entirely; a miss extracts with
+    `extract_page_texts` and stores the result. Pass `cache=None` to bypass.
+    """
+    if cache is None:
+        return extract_page_texts(pdf_path, workers=workers, mode=mode)
+
+    key = pdf_cache_key(pdf_path, mode)
+    page_texts = cache.get(key)
+    if page_texts is None:
+        page_texts = extract_page_texts(pdf_path, workers=workers, mode=mode)
+        cache.put(key, page_texts)
+    return page_texts
+
+
+def cache_summary(cache=default_cache):
+    """One-line page cache report for the end of a run."""
+    stats = cache.stats()
+    return (f"Page cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['entries']} documents, {stats['bytes'] / 1024 / 1024:.1f} MB on disk)")
@@ -0,0 +1,348 @@
+"""
+Stage-cached extraction pipelines
+
+A Pipeline is a small DAG of named stages (e.g. ingest -> chunk -> score ->
+extract -> merge -> validate). Each stage's output is saved under
+.cache/stages/<stage>/ keyed by a hash of:
+
+- the stage's name and a fingerprint of its code: the source of its
+  function and of every project function, class and module it uses,
+  followed transitively (so editing a helper such as validate_extraction
+  invalidates the stages that call it),
+- its parameters,
+- the digests of its inputs: the source document's hash for the first
+  stage, otherwise the content digests of the upstream outputs.
+
+Because keys follow the upstream *outputs*, changing a parameter only
+recomputes the stages downstream of it whose inputs actually changed: a new
+keyword list rescoring to the same chunks leaves extraction cached, and
+editing the validation function reruns validation alone. `plan` (a dry run)
+shows which stages would recompute without running anything.
+
+Stages run lazily: a stage's output is only loaded or computed when a stage
+that has to recompute needs it, so a fully cached run never touches the PDF.
+Stages with persist=False (e.g. ingest, which has its own page cache) are
+not stored; their digest is their key, so they still chain. Computed stages
+are recorded as tracing spans (see tracing.py) and, with profiling on,
+profiled one by one (see profiling.py).
+"""
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+
+from profiling import default_profiler
+from tracing import default_tracer
+
+STAGE_CACHE_DIR = Path(os.environ.get(
+    "PIPELINE_CACHE_DIR", Path(__file__).resolve().parent / ".cache" / "stages"
+))
+
+
+def _canonical(value):
+    # Pydantic schemas key by their JSON schema, so editing a field description
+    # invalidates the stages that use it; models by their data
+    if isinstance(value, type) and hasattr(value, "model_json_schema"):
+        return [value.__name__, value.model_json_schema()]
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    # Array-backed outputs (e.g. chunk_store.ChunkStore) digest their own content
+    if hasattr(value, "content_digest"):
+        return value.content_digest()
+    return repr(value)
+
+
+def digest(value):
+    """Content digest of a stage input or output (canonical JSON; schemas by their JSON schema)."""
+    canonical = json.dumps(value, sort_keys=True, default=_canonical, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+_PROJECT_ROOT = Path(__file__).resolve().parent
+
+
+def _project_source(obj):
+    """Source of a function, class or module defined in this project, or None (library, builtin)."""
+    try:
+        path = inspect.getsourcefile(obj)
+    except TypeError:
+        return None
+    if path is None:
+        return None
+    path = Path(path).resolve()
+    if not path.is_relative_to(_PROJECT_ROOT) or any(part in ("site-packages", ".venv", "venv")
+                                                      for part in path.parts):
+        return None
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return None
+
+
+def _code_names(code):
+    """Global and attribute names used by a code object and the functions nested in it."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _functions(obj):
+    """The plain functions making up a function or a class (its methods and properties)."""
+    if inspect.isfunction(obj):
+        return [obj]
+    functions = []
+    for member in vars(obj).values():
+        if isinstance(member, (staticmethod, classmethod)):
+            member = member.__func__
+        if isinstance(member, property):
+            functions.extend(f for f in (member.fget, member.fset, member.fdel) if f is not None)
+        elif inspect.isfunction(member):
+            functions.append(member)
+    return functions
+
+
+def code_fingerprint(fn):
+    """
+    Hash of `fn`'s source and of the project code it depends on.
+
+    Follows the global names `fn` uses to project functions and classes
+    (and, through those, the names they use), and includes the source of
+    project modules it refers to. Library and builtin code is left out:
+    upgrading a dependency does not invalidate the cache.
+    """
+    sources = {}
+    pending = [fn]
+    while pending:
+        obj = pending.pop()
+        key = (getattr(obj, "__module__", None), getattr(obj, "__qualname__", getattr(obj, "__name__", None)))
+        if key in sources:
+            continue
+        source = _project_source(obj)
+        if source is None:
+            if obj is not fn:
+                continue
+            source = getattr(fn, "__qualname__", repr(fn))
+        sources[key] = source
+        if inspect.ismodule(obj):
+            continue
+        for function in _functions(obj):
+            namespace = function.__globals__
+            for name in _code_names(function.__code__):
+                value = namespace.get(name)
+                if inspect.isfunction(value) or inspect.isclass(value) or inspect.ismodule(value):
+                    pending.append(value)
+    combined = "\n".join(f"{key}\n{sources[key]}" for key in sorted(sources, key=repr))
+    return hashlib.sha256(combined.encode("utf-8")).hexdigest()[:16]
+
+
+class Stage:
+    """
+    One pipeline step: `fn(*upstream outputs, **params)`.
+
+    The first stage is called with the pipeline's source (e.g. a PDF path)
+    instead of upstream outputs.
+
+    Args:
+        name: Stage name, also its cache directory
+        fn: The function computing the stage's output
+        deps: Names of the stages whose outputs are passed to fn, in order
+        params: Keyword arguments for fn that are part of the cache key
+        options: Keyword arguments for fn that don't change its output
+            (worker counts, concurrency) and are left out of the key
+        persist: Save the output to the stage cache
+        keep: Optional predicate on the output; outputs it rejects (e.g.
+            extraction with failed chunks) are used but not saved
+        version: Optional label for the stage's code. When given it replaces
+            the automatic code fingerprint (see code_fingerprint), so edits
+            to the code only rerun the stage once the label is bumped
+    """
+
+    def __init__(self, name, fn, deps=(), params=None, options=None, persist=True, keep=None,
+                 version=None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.params = dict(params or {})
+        self.options = dict(options or {})
+        self.persist = persist
+        self.keep = keep
+        self.version = version
+        self._fingerprint = None
+
+    def fingerprint(self):
+        """The stage's `version`, or its code fingerprint (computed once per Stage)."""
+        if self.version is not None:
+            return f"version:{self.version}"
+        if self._fingerprint is None:
+            self._fingerprint = code_fingerprint(self.fn)
+        return self._fingerprint
+
+    def key(self, input_digests):
+        return digest([self.name, self.fingerprint(), self.params, list(input_digests)])
+
+
+class StageCache:
+    """Stage outputs on disk: <dir>/<stage>/<key>.pkl plus a small <key>.json with its digest."""
+
+    def __init__(self, path=STAGE_CACHE_DIR):
+        self.path = Path(path)
+
+    def _files(self, stage, key):
+        base = self.path / stage / key[:32]
+        return base.with_suffix(".json"), base.with_suffix(".pkl")
+
+    def meta(self, stage, key):
+        """{"digest", "created", "seconds"} of a cached output, or None if it is not cached."""
+        meta_path, output_path = self._files(stage, key)
+        if not (meta_path.exists() and output_path.exists()):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def load(self, stage, key):
+        _, output_path = self._files(stage, key)
+        with open(output_path, "rb") as f:
+            return pickle.load(f)
+
+    def save(self, stage, key, output, output_digest, seconds):
+        meta_path, output_path = self._files(stage, key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so an interrupted save never leaves a half entry
+        for path, write in [
+            (output_path, lambda f: pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)),
+            (meta_path, lambda f: f.write(json.dumps({"digest": output_digest, "created": time.time(),
+                                                      "seconds": seconds}).encode("utf-8"))),
+        ]:
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            with open(tmp, "wb") as f:
+                write(f)
+            os.replace(tmp, path)
+
+
+default_stage_cache = StageCache()
+
+
+class Pipeline:
+    """A DAG of Stages run in order, each cached under its inputs and parameters."""
+
+    def __init__(self, stages, cache=default_stage_cache):
+        self.stages = list(stages)
+        self.cache = cache
+        self.timings = {}  # stage name -> seconds spent computing it in the last run
+        names = set()
+        for stage in self.stages:
+            missing = [dep for dep in stage.deps if dep not in names]
+            if missing:
+                raise ValueError(f"Stage {stage.name!r} depends on {missing}, which must come before it")
+            names.add(stage.name)
+
+    def plan(self, source_digest):
+        """
+        Dry run: what each stage would do, without running anything.
+
+        Returns:
+            List of (stage name, action) where action is "cached", "recompute",
+            "run" (not persisted; always runs) or "pending" (an input is
+            recomputed first, so whether it reruns depends on that output)
+        """
+        digests = {}
+        plan = []
+        for stage in self.stages:
+            inputs = [digests.get(dep) for dep in stage.deps] if stage.deps else [source_digest]
+            if any(d is None for d in inputs):
+                plan.append((stage.name, "pending"))
+                continue
+            key = stage.key(inputs)
+            if not stage.persist:
+                digests[stage.name] = key
+                plan.append((stage.name, "run"))
+                continue
+            meta = self.cache.meta(stage.name, key)
+            if meta is None:
+                plan.append((stage.name, "recompute"))
+            else:
+                digests[stage.name] = meta["digest"]
+                plan.append((stage.name, "cached"))
+        return plan
+
+    def run(self, source, source_digest, outputs=None):
+        """
+        Run the pipeline, reusing cached stage outputs.
+
+        Args:
+            source: Input of the first stage (e.g. a PDF path)
+            source_digest: Its content digest (e.g. the PDF's hash)
+            outputs: Names of the stages whose outputs to return (default:
+                the last stage); only what they need is loaded or computed
+
+        Returns:
+            {stage name: output} for `outputs`; `timings` then holds the
+            seconds each computed stage took
+        """
+        self.timings = {}
+        stages = {stage.name: stage for stage in self.stages}
+        keys = {}
+        digests = {}
+        results = {}
+
+        def compute(stage):
+            args = [output_of(dep) for dep in stage.deps] if stage.deps else [source]
+            start = time.perf_counter()
+            with default_tracer.span(stage.name, category="stage"), default_profiler.stage(stage.name):
+                output = stage.fn(*args, **stage.params, **stage.options)
+            seconds = time.perf_counter() - start
+            self.timings[stage.name] = seconds
+            results[stage.name] = output
+            if stage.persist:
+                digests[stage.name] = digest(output)
+                if stage.keep is None or stage.keep(output):
+                    self.cache.save(stage.name, keys[stage.name], output, digests[stage.name], seconds)
+                else:
+                    print(f"  [{stage.name}] not cached (incomplete output)")
+            print(f"  [{stage.name}] computed in {seconds:.1f}s")
+
+        def digest_of(name):
+            if name not in digests:
+                stage = stages[name]
+                inputs = [digest_of(dep) for dep in stage.deps] if stage.deps else [source_digest]
+                keys[name] = stage.key(inputs)
+                if not stage.persist:
+                    digests[name] = keys[name]
+                else:
+                    meta = self.cache.meta(name, keys[name])
+                    if meta is None:
+                        compute(stage)
+                    else:
+                        digests[name] = meta["digest"]
+                        print(f"  [{name}] cached ({meta['seconds']:.1f}s saved)")
+            return digests[name]
+
+        def output_of(name):
+            digest_of(name)
+            if name not in results:
+                stage = stages[name]
+                if stage.persist:
+                    results[name] = self.cache.load(name, keys[name])
+                else:
+                    compute(stage)
+            return results[name]
+
+        if outputs is None:
+            outputs = [self.stages[-1].name]
+        return {name: output_of(name) for name in outputs}
+
+
+def format_plan(plan):
+    """Printable dry-run plan."""
+    labels = {
+        "cached": "cached",
+        "recompute": "RECOMPUTE",
+        "run": "run when needed (not stored)",
+        "pending": "recompute if its inputs change",
+    }
+    return "\n".join(f"  {name:<10} {labels[action]}" for name, action in plan)
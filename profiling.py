@@ -0,0 +1,280 @@
+"""
+Opt-in CPU and memory profiling of pipeline stages
+
+With profiling on (`python main.py --profile cpu|mem`, `python
+extract_report.py --profile=cpu|mem`, or PIPELINE_PROFILE=cpu|mem for any
+entry point), each pipeline stage is profiled on its own:
+
+- cpu: cProfile; one .pstats file per stage (open with `python -m pstats`
+  or snakeviz).
+- mem: tracemalloc; per stage the peak traced memory, the memory the stage
+  left allocated, a text file of the top allocation sites and the raw
+  snapshot (tracemalloc.Snapshot.load) for diffing against another run.
+
+Files go to .cache/profiles/<run id>/ (PROFILE_DIR), with a manifest.jsonl
+line per stage tagged with the document, its page count, the stage's time
+and the code version (git commit), so runs can be compared across versions:
+
+    python profiling.py compare .cache/profiles/<old run> .cache/profiles/<new run>
+
+Stages nested in a profiled stage are part of its profile rather than
+profiled again. Profiling slows the run (tracemalloc several times over), so
+compare runs made with the same mode.
+"""
+import contextvars
+import cProfile
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from checkpoint_journal import locked_append
+
+PROFILE_DIR = Path(os.environ.get(
+    "PROFILE_DIR", Path(__file__).resolve().parent / ".cache" / "profiles"
+))
+MODES = ("cpu", "mem")
+# Allocation sites listed per stage in mem mode
+TOP_ALLOCATIONS = 25
+
+# Tag dicts of the enclosing contexts, outermost first
+_tags = contextvars.ContextVar("profile_tags", default=())
+
+
+def code_version():
+    """Short git commit of this checkout (with "+dirty" for uncommitted changes), or None."""
+    root = Path(__file__).resolve().parent
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True,
+                                text=True, timeout=5).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                               capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return f"{commit}+dirty" if commit and dirty else commit or None
+
+
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9._-]+", "-", str(value)).strip("-")[:60] or "run"
+
+
+class Profiler:
+    """
+    Profiles pipeline stages in "cpu" or "mem" mode; does nothing when mode is None.
+
+    Args:
+        mode: "cpu", "mem" or None
+        run_dir: Directory for this run's files (default: a new
+            PROFILE_DIR/<timestamp>; worker processes pass the parent's)
+        version: Code version recorded with each stage (default: git commit)
+    """
+
+    def __init__(self, mode=None, run_dir=None, version=None):
+        self.mode = None
+        self.run_dir = None
+        self.version = version
+        self.stages = 0
+        self._active = False
+        self._count = 0
+        if mode:
+            self.enable(mode, run_dir, version)
+
+    @property
+    def enabled(self):
+        return self.mode is not None
+
+    def enable(self, mode, run_dir=None, version=None):
+        """Turn profiling on for the rest of the run."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}; use 'cpu' or 'mem'")
+        self.mode = mode
+        self.run_dir = Path(run_dir) if run_dir else PROFILE_DIR / time.strftime("%Y%m%d-%H%M%S")
+        self.version = version or self.version or code_version()
+
+    def settings(self):
+        """(mode, run_dir, version) for a worker process's Profiler, or None when off."""
+        return (self.mode, str(self.run_dir), self.version) if self.enabled else None
+
+    @contextmanager
+    def context(self, **tags):
+        """Tag the stages profiled inside the block (e.g. document=..., pages=...)."""
+        token = _tags.set(_tags.get() + (dict(tags),))
+        try:
+            yield
+        finally:
+            _tags.reset(token)
+
+    def tag(self, **tags):
+        """
+        Add tags once they are known (e.g. the page count after ingest).
+
+        They apply to every enclosing context, so later stages of the same
+        document get them too.
+        """
+        for current in _tags.get():
+            current.update(tags)
+
+    @staticmethod
+    def _current_tags():
+        merged = {}
+        for tags in _tags.get():
+            merged.update(tags)
+        return merged
+
+    @contextmanager
+    def stage(self, name, **tags):
+        """
+        Profile the block as stage `name`.
+
+        Yields the stage's own tags dict, so tags known only at the end (a
+        page count) can still be added.
+        """
+        if not self.enabled or self._active:
+            yield tags
+            return
+        self._active = True
+        with self.context(**tags):
+            own_tags = _tags.get()[-1]
+            start = time.perf_counter()
+            profiler = None
+            started_tracing = False
+            if self.mode == "cpu":
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(10)
+                    started_tracing = True
+                tracemalloc.reset_peak()
+                before = tracemalloc.take_snapshot()
+            try:
+                yield own_tags
+            finally:
+                seconds = time.perf_counter() - start
+                stage_tags = self._current_tags()
+                if profiler is not None:
+                    profiler.disable()
+                    record = self._write_cpu(name, stage_tags, profiler)
+                else:
+                    record = self._write_mem(name, stage_tags, before)
+                    if started_tracing:
+                        tracemalloc.stop()
+                self._active = False
+                self._record(name, stage_tags, seconds, record)
+
+    def _base(self, name, tags):
+        """File name stem for a stage's files, unique within the run."""
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self._count += 1
+        document = tags.get("document")
+        label = f"{_slug(document)}-{name}" if document else name
+        return f"{label}-{os.getpid()}-{self._count}"
+
+    def _write_cpu(self, name, tags, profiler):
+        path = self.run_dir / f"{self._base(name, tags)}.pstats"
+        profiler.dump_stats(path)
+        return {"file": path.name}
+
+    def _write_mem(self, name, tags, before):
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        base = self._base(name, tags)
+        snapshot_path = self.run_dir / f"{base}.snapshot"
+        after.dump(snapshot_path)
+        grown = after.compare_to(before, "lineno")[:TOP_ALLOCATIONS]
+        largest = after.statistics("lineno")[:TOP_ALLOCATIONS]
+        text_path = self.run_dir / f"{base}.txt"
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write(f"{name} {json.dumps(tags, default=str)}\n")
+            f.write(f"peak {peak / 1e6:.1f} MB, traced at end {current / 1e6:.1f} MB\n\n")
+            f.write(f"Top {len(grown)} sites by growth during the stage:\n")
+            f.writelines(f"  {stat}\n" for stat in grown)
+            f.write(f"\nTop {len(largest)} sites by size at the end of the stage:\n")
+            f.writelines(f"  {stat}\n" for stat in largest)
+        net = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        return {"file": text_path.name, "snapshot": snapshot_path.name, "peak_bytes": peak, "net_bytes": net}
+
+    def _record(self, name, tags, seconds, record):
+        entry = {
+            "stage": name,
+            "mode": self.mode,
+            "version": self.version,
+            "pid": os.getpid(),
+            "time": time.time(),
+            "seconds": round(seconds, 4),
+            **{key: value for key, value in tags.items() if key not in ("stage", "mode")},
+            **record,
+        }
+        locked_append(self.run_dir / "manifest.jsonl", (json.dumps(entry, default=str) + "\n").encode("utf-8"))
+        self.stages += 1
+
+    def summary(self):
+        """One-line summary for this process."""
+        if not self.enabled:
+            return "Profiling: off"
+        return f"Profiling ({self.mode}): {self.stages} stages profiled, files in {self.run_dir}"
+
+
+def load_manifest(run_dir):
+    """The manifest entries of a profiled run."""
+    with open(Path(run_dir) / "manifest.jsonl", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def stage_totals(entries):
+    """{(document, stage): {"count", "pages", "seconds", "peak_bytes"}} over manifest entries."""
+    totals = defaultdict(lambda: {"count": 0, "pages": None, "seconds": 0.0, "peak_bytes": None})
+    for entry in entries:
+        t = totals[(entry.get("document") or "-", entry["stage"])]
+        t["count"] += 1
+        t["pages"] = entry.get("pages", t["pages"])
+        t["seconds"] += entry["seconds"]
+        if entry.get("peak_bytes") is not None:
+            t["peak_bytes"] = max(t["peak_bytes"] or 0, entry["peak_bytes"])
+    return dict(totals)
+
+
+def compare_table(old_entries, new_entries):
+    """Printable per-(document, stage) time and peak memory of two runs."""
+    old, new = stage_totals(old_entries), stage_totals(new_entries)
+    versions = [sorted({e.get("version") or "?" for e in entries}) for entries in (old_entries, new_entries)]
+    header = (f"{'Document':<28} {'Stage':<10} {'pages':>6} {'old s':>8} {'new s':>8} {'change':>7} "
+              f"{'old MB':>7} {'new MB':>7}")
+    lines = [f"Versions: {', '.join(versions[0])} -> {', '.join(versions[1])}", header, "-" * len(header)]
+    for key in sorted(set(old) | set(new)):
+        a, b = old.get(key), new.get(key)
+        change = f"{b['seconds'] / a['seconds'] - 1:+.0%}" if a and b and a["seconds"] else "-"
+        cells = []
+        for t in (a, b):
+            cells.append(f"{t['peak_bytes'] / 1e6:>7.1f}" if t and t["peak_bytes"] is not None else f"{'-':>7}")
+        pages = (b or a)["pages"]
+        seconds = [f"{t['seconds']:>8.2f}" if t else f"{'-':>8}" for t in (a, b)]
+        lines.append(f"{key[0][:28]:<28} {key[1][:10]:<10} {pages if pages is not None else '-':>6} "
+                     f"{seconds[0]} {seconds[1]} {change:>7} {cells[0]} {cells[1]}")
+    return "\n".join(lines)
+
+
+# Shared by every pipeline in this process; PIPELINE_PROFILE=cpu|mem turns it on
+default_profiler = Profiler(os.environ.get("PIPELINE_PROFILE") or None)
+
+
+def profile_summary(profiler=default_profiler):
+    return profiler.summary()
+
+
+if __name__ == "__main__":
+    # Usage: python profiling.py compare OLD_RUN_DIR NEW_RUN_DIR
+    #        python profiling.py show RUN_DIR
+    if len(sys.argv) == 4 and sys.argv[1] == "compare":
+        print(compare_table(load_manifest(sys.argv[2]), load_manifest(sys.argv[3])))
+    elif len(sys.argv) == 3 and sys.argv[1] == "show":
+        entries = load_manifest(sys.argv[2])
+        print(compare_table([], entries))
+    else:
+        sys.exit("Usage: python profiling.py compare OLD_RUN_DIR NEW_RUN_DIR | show RUN_DIR")
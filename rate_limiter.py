@@ -0,0 +1,186 @@
+"""
+Adaptive rate limiting for LLM API calls
+"""
+import asyncio
+import os
+import threading
+import time
+
+# Starting request rate; 2 requests/s matches the old fixed 0.5s sleeps
+INITIAL_RPS = float(os.environ.get("LLM_RPS", "2"))
+MIN_RPS = float(os.environ.get("LLM_MIN_RPS", "0.2"))
+MAX_RPS = float(os.environ.get("LLM_MAX_RPS", "10"))
+# Tokens-per-minute budget (prompt + completion); 0 means no token budget
+TOKENS_PER_MINUTE = int(os.environ.get("LLM_TPM", "0"))
+# Responses slower than this are treated as a sign the endpoint is saturated
+TARGET_LATENCY = float(os.environ.get("LLM_TARGET_LATENCY", "20"))
+
+# HTTP statuses that mean "slow down"
+THROTTLE_STATUSES = {429, 503}
+
+
+def parse_retry_after(headers):
+    """Seconds to wait from Retry-After / retry-after-ms headers, or None."""
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            return None  # HTTP-date form; fall back to the limiter's own backoff
+    return None
+
+
+def estimate_tokens(request):
+    """Rough token count for a chat completion request (~4 characters per token)."""
+    chars = 0
+    for message in request.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+    completion = request.get("max_tokens") or request.get("max_completion_tokens") or 512
+    return chars // 4 + completion
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter with a requests-per-second and a tokens-per-minute budget.
+
+    Callers reserve capacity before each request (`acquire`, or `acquire_async`
+    from asyncio code) and report how it went (`record_success`,
+    `record_throttle`, `record_error`). The request rate adapts AIMD-style:
+    it creeps up by `step` after each fast success, drops by 10% when
+    responses are slower than `target_latency`, and halves on a throttle (429
+    or 503) or a connection error. A Retry-After header pauses every caller
+    for that long. One limiter is shared by all threads and event loops in
+    the process.
+
+    Args:
+        rps: Starting requests per second
+        min_rps: Lowest rate the limiter will back off to
+        max_rps: Highest rate it will climb to
+        tokens_per_minute: Token budget per minute (None or 0 for no budget)
+        target_latency: Latency in seconds above which the rate is reduced
+        step: Requests per second added after each fast success
+    """
+
+    def __init__(self, rps=INITIAL_RPS, min_rps=MIN_RPS, max_rps=MAX_RPS,
+                 tokens_per_minute=TOKENS_PER_MINUTE, target_latency=TARGET_LATENCY, step=0.25):
+        self.rps = rps
+        self.min_rps = min_rps
+        self.max_rps = max_rps
+        self.tokens_per_minute = tokens_per_minute or None
+        self.target_latency = target_latency
+        self.step = step
+
+        self._lock = threading.Lock()
+        self._updated = time.monotonic()
+        # Bucket balances; they go negative while callers are queued behind them
+        self._requests = 1.0
+        self._tokens = float(self.tokens_per_minute or 0)
+        self._paused_until = 0.0
+
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.tokens_used = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        # Allow a burst of at most one second's worth of requests
+        self._requests = min(max(self.rps, 1.0), self._requests + elapsed * self.rps)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute,
+                               self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _reserve(self, tokens):
+        """Take one request and `tokens` from the buckets; return seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._requests -= 1
+            wait = max(0.0, -self._requests / self.rps)
+            if self.tokens_per_minute:
+                self._tokens -= min(tokens, self.tokens_per_minute)
+                wait = max(wait, -self._tokens / (self.tokens_per_minute / 60))
+            wait = max(wait, self._paused_until - now)
+            self.requests += 1
+            self.wait_seconds += wait
+            return wait
+
+    def _pause_remaining(self):
+        with self._lock:
+            return self._paused_until - time.monotonic()
+
+    def acquire(self, tokens=0):
+        """Block until a request of about `tokens` tokens may be sent."""
+        wait = self._reserve(tokens)
+        while wait > 0:
+            time.sleep(wait)
+            # A Retry-After received while we slept pushes us back further
+            wait = self._pause_remaining()
+
+    async def acquire_async(self, tokens=0):
+        """`acquire` for asyncio code: waits without blocking the event loop."""
+        wait = self._reserve(tokens)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._pause_remaining()
+
+    def record_success(self, latency, tokens_used=None, tokens_reserved=0):
+        """Report a completed request, its latency and (if known) its actual token usage."""
+        with self._lock:
+            if latency > self.target_latency:
+                self.rps = max(self.min_rps, self.rps * 0.9)
+            else:
+                self.rps = min(self.max_rps, self.rps + self.step)
+            if tokens_used is not None:
+                self.tokens_used += tokens_used
+                if self.tokens_per_minute:
+                    # Settle the estimate reserved in acquire against real usage
+                    self._tokens -= tokens_used - min(tokens_reserved, self.tokens_per_minute)
+
+    def record_throttle(self, retry_after=None):
+        """Report a 429/503: halve the rate and pause everyone for Retry-After seconds."""
+        with self._lock:
+            self.throttled += 1
+            self.rps = max(self.min_rps, self.rps / 2)
+            pause = retry_after if retry_after is not None else 1 / self.rps
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def record_error(self):
+        """Report a failed request (timeout, connection error, 5xx)."""
+        with self._lock:
+            self.errors += 1
+            self.rps = max(self.min_rps, self.rps / 2)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "tokens_used": self.tokens_used,
+            "rps": self.rps,
+            "wait_seconds": self.wait_seconds,
+        }
+
+
+# Shared by every client made in llm_client
+default_limiter = RateLimiter()
+
+
+def limiter_summary(limiter=default_limiter):
+    """One-line rate limiter report for pipeline logs."""
+    s = limiter.stats()
+    return (f"Rate limiter: {s['requests']} requests, {s['throttled']} throttled, "
+            f"{s['errors']} errors, {s['tokens_used']:,} tokens, "
+            f"now {s['rps']:.2f} req/s, {s['wait_seconds']:.1f}s total wait")
@@ -0,0 +1,275 @@
+"""
+Retries, retry budgets and circuit breaking for LLM extraction calls
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import openai
+from pydantic import ValidationError
+
+from rate_limiter import parse_retry_after
+
+# Attempts per chunk, including the first
+MAX_ATTEMPTS = int(os.environ.get("LLM_MAX_ATTEMPTS", "4"))
+# Retries shared by all chunks of one document
+DOCUMENT_RETRY_BUDGET = int(os.environ.get("LLM_DOCUMENT_RETRIES", "8"))
+BACKOFF_BASE = 1.0   # seconds before the first retry (before jitter)
+BACKOFF_CAP = 30.0   # longest wait between attempts
+# Consecutive endpoint failures that open the circuit, and how long it stays open
+BREAKER_THRESHOLD = int(os.environ.get("LLM_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+
+# Error kinds
+TIMEOUT = "timeout"
+RATE_LIMITED = "rate_limited"
+SERVER_ERROR = "server_error"
+CONNECTION = "connection"
+INVALID_JSON = "invalid_json"
+EMPTY_CONTENT = "empty_content"
+SCHEMA_MISMATCH = "schema_mismatch"
+CLIENT_ERROR = "client_error"
+CIRCUIT_OPEN = "circuit_open"
+BUDGET_EXHAUSTED = "retry_budget_exhausted"
+OTHER = "other"
+
+# Worth another attempt: the next response may well differ
+RETRYABLE = {TIMEOUT, RATE_LIMITED, SERVER_ERROR, CONNECTION, INVALID_JSON, EMPTY_CONTENT}
+# Count against the endpoint's health (bad answers from a healthy server do not)
+ENDPOINT_FAILURES = {TIMEOUT, SERVER_ERROR, CONNECTION}
+
+
+class EmptyResponseError(Exception):
+    """The model returned no content (e.g. content=None from a thinking model)."""
+
+
+class CircuitOpenError(Exception):
+    """The endpoint's circuit breaker is open; the request was not sent."""
+
+
+def classify_error(error):
+    """Error kind for an exception raised while calling or parsing a completion."""
+    if isinstance(error, openai.APITimeoutError):
+        return TIMEOUT
+    if isinstance(error, openai.APIConnectionError):
+        return CONNECTION
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMITED
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 503:
+            return RATE_LIMITED
+        return SERVER_ERROR if error.status_code >= 500 else CLIENT_ERROR
+    if isinstance(error, json.JSONDecodeError):
+        return INVALID_JSON
+    if isinstance(error, EmptyResponseError):
+        return EMPTY_CONTENT
+    if isinstance(error, ValidationError):
+        return SCHEMA_MISMATCH
+    if isinstance(error, CircuitOpenError):
+        return CIRCUIT_OPEN
+    return OTHER
+
+
+def backoff_delay(attempt, error=None):
+    """
+    Seconds to wait before retry number `attempt` (1-based).
+
+    Exponential backoff with full jitter, so chunks that failed together do
+    not retry together. A Retry-After header on the error sets a floor.
+    """
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
+    response = getattr(error, "response", None)
+    retry_after = parse_retry_after(getattr(response, "headers", None))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class RetryBudget:
+    """Retries shared by every chunk of one document."""
+
+    def __init__(self, retries=DOCUMENT_RETRY_BUDGET):
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Use one retry; False once the budget is spent."""
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to an endpoint that keeps failing.
+
+    After `threshold` consecutive endpoint failures (timeouts, connection
+    errors, 5xx) the circuit opens and calls fail fast with CircuitOpenError.
+    After `cooldown` seconds one trial request is let through: success closes
+    the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a request may be sent now.
+
+        Returns:
+            True if the call was given the half-open trial slot (to hand back
+            with `release` if it ends without an outcome), else False
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            raise CircuitOpenError(f"circuit open after {self.failures} consecutive failures")
+
+    def release(self):
+        """The trial call granted by `before_call` ended without an outcome (it was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record(self, kind=None):
+        """Record the outcome of a call: None for success, else its error kind."""
+        with self._lock:
+            self._trial_in_flight = False
+            if kind not in ENDPOINT_FAILURES:
+                # The endpoint answered, even if the answer was unusable
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.threshold or self.opened_at is not None:
+                    self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint):
+    """The shared circuit breaker for an endpoint URL."""
+    with _breakers_lock:
+        return _breakers.setdefault(str(endpoint), CircuitBreaker())
+
+
+def _status(status, result=None, kind=None, error=None, attempts=0):
+    return {
+        "status": status,
+        "result": result,
+        "error_kind": kind,
+        "error": str(error)[:200] if error is not None else None,
+        "attempts": attempts,
+    }
+
+
+def _next_step(error, attempt, max_attempts, budget):
+    """(kind, delay) for a failed attempt; delay is None when it is final."""
+    kind = classify_error(error)
+    if kind not in RETRYABLE or attempt >= max_attempts:
+        return kind, None
+    if budget is not None and not budget.take():
+        return BUDGET_EXHAUSTED, None
+    return kind, backoff_delay(attempt, error)
+
+
+def call_with_retries(call, breaker=None, budget=None, max_attempts=MAX_ATTEMPTS):
+    """
+    Run `call()` with classified retries; never raises for call errors.
+
+    Returns:
+        Status dict: "status" ("ok" or "failed"), "result", "error_kind",
+        "error" and "attempts"
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        trial = False
+        try:
+            if breaker is not None:
+                trial = breaker.before_call()
+            result = call()
+        except KeyboardInterrupt:
+            if trial:
+                breaker.release()
+            raise
+        except Exception as e:
+            kind = classify_error(e)
+            if breaker is not None and kind != CIRCUIT_OPEN:
+                breaker.record(kind)
+            final_kind, delay = _next_step(e, attempt, max_attempts, budget)
+            if delay is None:
+                return _status("failed", kind=final_kind, error=e, attempts=attempt)
+            time.sleep(delay)
+            continue
+        if breaker is not None:
+            breaker.record(None)
+        return _status("ok", result=result, attempts=attempt)
+
+
+async def call_with_retries_async(call, breaker=None, budget=None, max_attempts=MAX_ATTEMPTS):
+    """`call_with_retries` for an async `call`; waits without blocking the event loop."""
+    attempt = 0
+    while True:
+        attempt += 1
+        trial = False
+        try:
+            if breaker is not None:
+                trial = breaker.before_call()
+            result = await call()
+        except asyncio.CancelledError:
+            # Only the trial slot is held by a call; a cancelled call in the
+            # closed state must not free a trial another task is running
+            if trial:
+                breaker.release()
+            raise
+        except Exception as e:
+            kind = classify_error(e)
+            if breaker is not None and kind != CIRCUIT_OPEN:
+                breaker.record(kind)
+            final_kind, delay = _next_step(e, attempt, max_attempts, budget)
+            if delay is None:
+                return _status("failed", kind=final_kind, error=e, attempts=attempt)
+            await asyncio.sleep(delay)
+            continue
+        if breaker is not None:
+            breaker.record(None)
+        return _status("ok", result=result, attempts=attempt)
+
+
+def interrupted_status():
+    """Status for a chunk that had not finished when the run was interrupted."""
+    return _status("interrupted")
+
+
+def skipped_status():
+    """Status for a chunk that was not needed (its document's fields were already filled)."""
+    return _status("skipped")
+
+
+def replayed_status(result):
+    """Status for a chunk whose result was replayed from the checkpoint journal (no API call)."""
+    return _status("ok", result=result)
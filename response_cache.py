@@ -0,0 +1,187 @@
+"""
+Persistent cache of LLM chat completion responses
+
+Responses are stored in a SQLite database keyed by the SHA-256 of the request:
+model, messages, response_format, temperature, extra_body and every other
+argument that can change the answer (transport-only arguments such as
+`timeout` are left out). Entries expire after a TTL, and the database is
+capped by total size, evicting least-recently-used entries first. Rerunning an
+unchanged pipeline is then served entirely from disk.
+"""
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from openai.types.chat import ChatCompletion
+
+CACHE_PATH = Path(os.environ.get(
+    "LLM_CACHE_PATH", Path(__file__).resolve().parent / ".cache" / "llm_responses.sqlite"
+))
+TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL", 30 * 24 * 3600))
+MAX_CACHE_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# LLM_CACHE=off disables the cache for a whole run
+ENABLED = os.environ.get("LLM_CACHE", "on").lower() not in ("0", "off", "false", "no")
+
+# Arguments that only affect how the request is sent, not what comes back
+_TRANSPORT_ARGS = {"timeout", "extra_headers", "extra_query"}
+
+_bypassed = contextvars.ContextVar("response_cache_bypassed", default=False)
+
+
+def request_key(request):
+    """SHA-256 of the answer-relevant arguments of a chat completion request."""
+    relevant = {k: v for k, v in request.items() if k not in _TRANSPORT_ARGS}
+    canonical = json.dumps(relevant, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def bypass():
+    """
+    Send every request inside the block to the API, without reading or writing the cache.
+
+    For deliberate repeatability experiments, where the same request is meant
+    to be answered more than once:
+
+        with bypass():
+            runs = [extract(chunk) for _ in range(3)]
+    """
+    token = _bypassed.set(True)
+    try:
+        yield
+    finally:
+        _bypassed.reset(token)
+
+
+class ResponseCache:
+    """SQLite-backed chat completion cache with TTL and size-based LRU eviction."""
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL_SECONDS, max_bytes=MAX_CACHE_BYTES, enabled=ENABLED):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def active(self):
+        """False when disabled or inside a `bypass()` block."""
+        return self.enabled and not _bypassed.get()
+
+    def _db(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,"
+                " latency REAL, size INTEGER, created REAL, accessed REAL)"
+            )
+        return self._conn
+
+    def get(self, request):
+        """Cached ChatCompletion for `request`, or None on a miss (or when inactive)."""
+        if not self.active:
+            return None
+        key = request_key(request)
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT response, latency, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[2] > self.ttl:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self.saved_seconds += row[1] or 0.0
+        return ChatCompletion.model_validate_json(row[0])
+
+    def put(self, request, response, latency):
+        """Store a successful response and how long the API took to produce it."""
+        if not self.active:
+            return
+        # Empty answers (e.g. content=None from a thinking model) are not worth replaying
+        if not response.choices or response.choices[0].message.content is None:
+            return
+        blob = response.model_dump_json()
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (request_key(request), request.get("model"), blob, latency, len(blob), now, now),
+            )
+        self.evict()
+
+    def discard(self, request):
+        """Forget the response to `request`, e.g. because it could not be parsed."""
+        if not self.active:
+            return
+        with self._lock:
+            self._db().execute("DELETE FROM responses WHERE key = ?", (request_key(request),))
+
+    def evict(self):
+        """Drop expired entries, then least-recently-used ones until under max_bytes."""
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in db.execute(
+                "SELECT key, size FROM responses ORDER BY accessed"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+
+    def clear(self):
+        """Delete every cached response."""
+        with self._lock:
+            self._db().execute("DELETE FROM responses")
+
+    def stats(self):
+        """Hit/miss counts and saved API time for this process plus current on-disk usage."""
+        entries, size = 0, 0
+        if self.path.exists():
+            with self._lock:
+                entries, size = self._db().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "saved_seconds": self.saved_seconds,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+# Shared by every client made in llm_client
+default_response_cache = ResponseCache()
+
+
+def response_cache_summary(cache=default_response_cache):
+    """One-line response cache report for the end of a run."""
+    if not cache.enabled:
+        return "Response cache: off"
+    stats = cache.stats()
+    return (f"Response cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['saved_seconds']:.1f}s of API time saved "
+            f"({stats['entries']} responses, {stats['bytes'] / 1024 / 1024:.1f} MB on disk)")
@@ -1,17 +1,21 @@
 """
-Retry extraction for Amazon and BP with increased chunks and retries
+Fill the missing fields of Amazon's row in sustainability_comparison.csv
+
+Rather than rerunning the whole pipeline with more chunks, only the null
+fields are re-queried, from the chunks most relevant to each field (see
+extract_report.fill_gaps). The rest of the row is left as it is.
 """
 import os
 import pandas as pd
-from extract_report import extract_sustainability_data
+from extract_report import fill_gaps
 
 # Set up environment variables
-os.environ["OPENAI_BASE_URL"] = "https://ellm.nrp-nautilus.io/v1"
-os.environ["OPENAI_API_KEY"] = "KK6sZ0tDaA0CS2uOUbSbBYD1L5uf0Arv"
-os.environ["OPENAI_MODEL"] = "qwen3"
+os.environ.setdefault("OPENAI_BASE_URL", "https://ellm.nrp-nautilus.io/v1")
+os.environ.setdefault("OPENAI_API_KEY", "KK6sZ0tDaA0CS2uOUbSbBYD1L5uf0Arv")
+os.environ.setdefault("OPENAI_MODEL", "qwen3")
 
 print("=" * 70)
-print("RETRY EXTRACTION: Amazon")
+print("RETRY EXTRACTION: Amazon (fill missing fields)")
 print("=" * 70)
 print()
 print("Note: BP PDF not found in data directory, skipping")
@@ -25,61 +29,49 @@ reports = [
     }
 ]
 
-# Extract data from each report with more chunks
-results = []
+# Load existing results
+existing_df = pd.read_csv("sustainability_comparison.csv")
 
 for i, report in enumerate(reports, 1):
     print(f"\n{'=' * 70}")
     print(f"PROCESSING: {report['company']}")
     print(f"{'=' * 70}\n")
     
+    mask = existing_df['company_name'] == report["company"]
+    if not mask.any():
+        print(f"✗ {report['company']} has no row in sustainability_comparison.csv")
+        continue
+    
     try:
-        # Try with 8 chunks instead of 5 for better coverage
-        result = extract_sustainability_data(
+        _, filled = fill_gaps(
             pdf_path=report["path"],
+            existing=existing_df[mask].iloc[0],
             company_name=report["company"],
-            top_chunks=8  # Process more chunks
         )
-        
-        if result:
-            results.append(result.model_dump())
-            print(f"\n✓ {report['company']} extraction complete")
-            
-            # Show what was extracted
-            print(f"\nExtracted fields:")
-            for key, value in result.model_dump().items():
-                if value is not None:
-                    print(f"  • {key}: {value}")
-        else:
-            print(f"\n✗ {report['company']} extraction failed - no data returned")
-            results.append({"company_name": report["company"]})
-    
     except Exception as e:
         print(f"\n✗ {report['company']} extraction failed: {e}")
-        results.append({"company_name": report["company"]})
+        continue
+    
+    # Upsert only the newly filled values
+    for col, value in filled.items():
+        if col in existing_df.columns:
+            # Columns that were empty throughout are read as float; allow text values
+            existing_df[col] = existing_df[col].astype(object)
+            existing_df.loc[mask, col] = value
+    
+    print(f"\n✓ {report['company']} gap filling complete")
+    if filled:
+        print(f"\nFilled fields:")
+        for key, value in filled.items():
+            print(f"  • {key}: {value}")
+    else:
+        print("\nNo missing fields found in the report")
 
 print("\n" + "=" * 70)
 print("RETRY COMPLETE")
 print("=" * 70)
 print()
 
-# Create DataFrame with new results
-new_df = pd.DataFrame(results)
-
-# Load existing results
-existing_df = pd.read_csv("sustainability_comparison.csv")
-
-# Update Amazon row (BP file doesn't exist)
-for company in ["Amazon"]:
-    if company in new_df['company_name'].values:
-        # Get the new data for this company
-        new_data = new_df[new_df['company_name'] == company].iloc[0].to_dict()
-        # Update the existing dataframe
-        mask = existing_df['company_name'] == company
-        for col in new_data.keys():
-            if col in existing_df.columns:
-                existing_df.loc[mask, col] = new_data[col]
-
 # Save updated results
 existing_df.to_csv("sustainability_comparison.csv", index=False)
 existing_df.to_json("sustainability_comparison.json", orient='records', indent=2)
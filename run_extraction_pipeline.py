@@ -2,7 +2,7 @@
 Climate Commitment Extraction Pipeline
 Runs structured extraction and saves outputs to files
 """
-from openai import OpenAI
+from llm_client import make_client
 from pydantic import BaseModel, Field
 from typing import Optional
 import os
@@ -43,7 +43,7 @@ logger.info("Schema loaded: ClimateCommitment")
 
 # Configure the OpenAI client
 try:
-    client = OpenAI(
+    client = make_client(
         base_url=os.environ.get("OPENAI_BASE_URL", "https://ellm.nrp-nautilus.io/v1"),
         api_key=os.environ.get("OPENAI_API_KEY"),
     )
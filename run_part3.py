@@ -2,7 +2,7 @@
 Part 3: Extract from a Text Passage
 Extract structured climate commitment data from Apple's text
 """
-from openai import OpenAI
+from llm_client import make_client
 from pydantic import BaseModel, Field
 from typing import Optional
 import os
@@ -25,7 +25,7 @@ class ClimateCommitment(BaseModel):
     interim_target: Optional[str] = Field(None, description="Any intermediate target before the main goal")
 
 # Configure the client
-client = OpenAI(
+client = make_client(
     base_url=os.environ.get("OPENAI_BASE_URL", "https://ellm.nrp-nautilus.io/v1"),
     api_key=os.environ.get("OPENAI_API_KEY"),
 )
@@ -2,7 +2,7 @@
 Part 4: Compare Across Models
 Test extraction with multiple models to compare results
 """
-from openai import OpenAI
+from llm_client import make_client
 import os
 import json
 
@@ -11,7 +11,7 @@ print("Part 4: Compare Across Models")
 print("=" * 70)
 
 # Configure the client
-client = OpenAI(
+client = make_client(
     base_url=os.environ.get("OPENAI_BASE_URL", "https://ellm.nrp-nautilus.io/v1"),
     api_key=os.environ.get("OPENAI_API_KEY"),
 )
@@ -0,0 +1,242 @@
+"""
+Schema-constrained structured output from Pydantic models
+
+Each Pydantic model is compiled once into a strict JSON schema and sent as a
+`json_schema` response format, so the model can only produce the schema's
+keys and types. Models or endpoints that reject schemas fall back to
+`json_object` mode, with the field list written into the system prompt
+instead. Parse outcomes and output tokens are tallied per schema and format so
+the two modes can be compared (see bench_response_format.py).
+"""
+import json
+import os
+from collections import defaultdict
+from functools import lru_cache
+
+import openai
+from pydantic import create_model
+
+from resilience import EmptyResponseError
+from usage_log import usage_context
+
+JSON_OBJECT = {"type": "json_object"}
+
+# LLM models known not to accept json_schema; extended at runtime when a
+# request with a schema is rejected. Seed with LLM_JSON_OBJECT_MODELS=a,b
+_json_object_models = {
+    name.strip() for name in os.environ.get("LLM_JSON_OBJECT_MODELS", "").split(",") if name.strip()
+}
+
+# (schema name, response format type) -> counters
+_stats = defaultdict(lambda: {"calls": 0, "parse_failures": 0, "completion_tokens": 0})
+
+
+# Keywords whose value maps names to subschemas: the names are field or
+# definition names (a field may be called "title"), only the values are schemas
+_SCHEMA_MAPS = ("properties", "$defs", "definitions", "patternProperties")
+# Keywords whose value is instance data, not a schema
+_DATA_KEYWORDS = ("enum", "const", "examples")
+
+
+def _make_strict(node):
+    """Rewrite a JSON schema (in place) into the strict subset: closed, all keys required."""
+    if isinstance(node, list):
+        for value in node:
+            _make_strict(value)
+    elif isinstance(node, dict):
+        node.pop("default", None)
+        node.pop("title", None)
+        if "properties" in node:
+            node["additionalProperties"] = False
+            # Optional fields are already nullable (anyOf [..., null]), so
+            # requiring every key still lets the model answer null
+            node["required"] = list(node["properties"])
+        for key, value in node.items():
+            if key in _SCHEMA_MAPS and isinstance(value, dict):
+                for schema in value.values():
+                    _make_strict(schema)
+            elif key not in _DATA_KEYWORDS:
+                _make_strict(value)
+    return node
+
+
+@lru_cache(maxsize=None)
+def _strict_schema_json(response_model):
+    return json.dumps(_make_strict(response_model.model_json_schema()))
+
+
+def strict_json_schema(response_model):
+    """Strict JSON schema for a Pydantic model (compiled once per model)."""
+    return json.loads(_strict_schema_json(response_model))
+
+
+@lru_cache(maxsize=None)
+def _sub_model(response_model, fields):
+    definitions = {name: (response_model.model_fields[name].annotation, response_model.model_fields[name])
+                   for name in fields}
+    return create_model(f"{response_model.__name__}Fields", **definitions)
+
+
+def sub_model(response_model, fields):
+    """
+    Pydantic model with only `fields` of `response_model` (same types and
+    descriptions), for asking the LLM for just those fields. Built once per
+    field list.
+    """
+    return _sub_model(response_model, tuple(fields))
+
+
+def field_instructions(response_model):
+    """The model's fields and descriptions as prompt text, for json_object mode."""
+    lines = [f"- {name}: {field.description or 'no description'}"
+             for name, field in response_model.model_fields.items()]
+    return "Return a JSON object with exactly these fields (null when not found):\n" + "\n".join(lines)
+
+
+def response_format_for(response_model, llm_model=None):
+    """`json_schema` response format for `response_model`, or json_object for models without schema support."""
+    if llm_model in _json_object_models:
+        return JSON_OBJECT
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_model.__name__,
+            "schema": strict_json_schema(response_model),
+            "strict": True,
+        },
+    }
+
+
+# Words in a 400/422 error that say the response format itself was refused
+_SCHEMA_ERROR_HINTS = ("response_format", "json_schema")
+
+
+def _schema_rejected(error, request):
+    """
+    True (and remember the model) if `error` is the endpoint refusing a json_schema request.
+
+    Only errors that point at the response format count: a 400 for an
+    oversized prompt or a bad parameter would fail again in json_object
+    mode, and must not switch the model to it for the rest of the run.
+    """
+    if request.get("response_format", {}).get("type") != "json_schema":
+        return False
+    if not isinstance(error, (openai.BadRequestError, openai.UnprocessableEntityError)):
+        return False
+    param = (getattr(error, "param", None) or "").lower()
+    if not param.startswith(_SCHEMA_ERROR_HINTS):
+        details = " ".join(str(part) for part in (getattr(error, "code", None), error.message, error.body)
+                           if part is not None).lower()
+        if not any(hint in details for hint in _SCHEMA_ERROR_HINTS):
+            return False
+    _json_object_models.add(request.get("model"))
+    return True
+
+
+def _fallback_request(request, response_model):
+    request = dict(request, response_format=JSON_OBJECT)
+    messages = [dict(message) for message in request["messages"]]
+    if messages and messages[0]["role"] == "system":
+        messages[0]["content"] += "\n\n" + field_instructions(response_model)
+    else:
+        messages.insert(0, {"role": "system", "content": field_instructions(response_model)})
+    request["messages"] = messages
+    return request
+
+
+def structured_request(response_model, **request):
+    """
+    Chat completion arguments constrained to `response_model`.
+
+    Uses the strict json_schema format, or json_object plus the field list in
+    the system prompt for models already known not to support schemas.
+    """
+    request["response_format"] = response_format_for(response_model, request.get("model"))
+    if request["response_format"] is JSON_OBJECT:
+        return _fallback_request(request, response_model)
+    return request
+
+
+def create_structured(client, response_model, **request):
+    """
+    `client.chat.completions.create` constrained to `response_model`.
+
+    If the endpoint rejects the schema (a 400/422 naming response_format or
+    json_schema), the model is remembered as json_object-only and the
+    request is sent again in that mode; other errors are raised as they are.
+
+    Returns:
+        (response, request): the completion and the arguments it was
+        actually requested with
+    """
+    request = structured_request(response_model, **request)
+    with usage_context(schema=response_model.__name__):
+        try:
+            return client.chat.completions.create(**request), request
+        except openai.APIStatusError as e:
+            if not _schema_rejected(e, request):
+                raise
+        request = _fallback_request(request, response_model)
+        return client.chat.completions.create(**request), request
+
+
+async def create_structured_async(client, response_model, **request):
+    """`create_structured` for an async client."""
+    request = structured_request(response_model, **request)
+    with usage_context(schema=response_model.__name__):
+        try:
+            return await client.chat.completions.create(**request), request
+        except openai.APIStatusError as e:
+            if not _schema_rejected(e, request):
+                raise
+        request = _fallback_request(request, response_model)
+        return await client.chat.completions.create(**request), request
+
+
+def parse_structured(response, response_model, response_format=None, defaults=None):
+    """
+    Validate a completion's JSON content as `response_model`.
+
+    Raises EmptyResponseError, json.JSONDecodeError or pydantic's
+    ValidationError on failure. The outcome and the completion's output tokens
+    are tallied under the schema name and response format type.
+
+    Args:
+        response: The chat completion
+        response_model: Pydantic model class
+        response_format: Format the request was sent with (for the tally)
+        defaults: Values for fields the answer left missing or empty
+    """
+    format_type = (response_format or {}).get("type", "unknown")
+    stats = _stats[(response_model.__name__, format_type)]
+    stats["calls"] += 1
+    usage = getattr(response, "usage", None)
+    stats["completion_tokens"] += getattr(usage, "completion_tokens", None) or 0
+    try:
+        content = response.choices[0].message.content
+        if content is None:
+            raise EmptyResponseError("model returned no content")
+        data = json.loads(content)
+        for field, value in (defaults or {}).items():
+            if not data.get(field):
+                data[field] = value
+        return response_model(**data)
+    except Exception:
+        stats["parse_failures"] += 1
+        raise
+
+
+def format_stats():
+    """{(schema name, format type): {"calls", "parse_failures", "completion_tokens"}}."""
+    return {key: dict(value) for key, value in _stats.items()}
+
+
+def format_summary():
+    """Parse-failure rate and mean output tokens per schema and response format."""
+    lines = []
+    for (schema, format_type), s in sorted(_stats.items()):
+        calls = s["calls"] or 1
+        lines.append(f"{schema} [{format_type}]: {s['calls']} calls, "
+                     f"{s['parse_failures'] / calls:.0%} parse failures, "
+                     f"{s['completion_tokens'] / calls:.0f} output tokens/call")
+    return "\n".join(lines) or "No structured calls yet"
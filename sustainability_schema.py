@@ -1,5 +1,9 @@
 """
-Pydantic schema for sustainability report data extraction
+Pydantic schemas for sustainability report data extraction
+
+SustainabilityReport covers corporate sustainability reports; CityClimatePlan
+(as in the session 10 notebook) and EnergyPlanReport cover the climate action
+plan and energy planning collections under data/.
 """
 from pydantic import BaseModel, Field
 from typing import Optional
@@ -129,6 +133,37 @@ class SustainabilityReport(BaseModel):
     )
 
 
+class CityClimatePlan(BaseModel):
+    """Structured data extracted from a city climate action plan."""
+    city_name: str = Field(description="Name of the city or jurisdiction")
+    plan_title: str = Field(description="Title of the climate action plan document")
+    plan_year: Optional[int] = Field(None, description="Year the plan was published")
+    ghg_reduction_target: Optional[str] = Field(None, description="Primary GHG reduction target (e.g., '80% below 1990 levels by 2050')")
+    target_year: Optional[int] = Field(None, description="Target year for primary GHG goal")
+    baseline_year: Optional[int] = Field(None, description="Baseline year for measuring reductions")
+    interim_targets: Optional[str] = Field(None, description="Intermediate milestones before the main target")
+    carbon_neutrality_goal: Optional[str] = Field(None, description="Net zero or carbon neutrality commitment if any")
+    renewable_energy_target: Optional[str] = Field(None, description="Renewable energy goals")
+    transportation_strategy: Optional[str] = Field(None, description="Key transportation/mobility strategies")
+    building_strategy: Optional[str] = Field(None, description="Building efficiency or electrification strategies")
+    equity_commitment: Optional[str] = Field(None, description="Environmental justice or equity goals")
+    total_current_emissions: Optional[str] = Field(None, description="Current or most recent total GHG emissions figure")
+
+
+class EnergyPlanReport(BaseModel):
+    """Structured data extracted from an energy planning or outlook report (IRPs, national studies)."""
+    report_title: str = Field(description="Title of the energy planning report")
+    publisher: Optional[str] = Field(None, description="Agency, laboratory or utility that published the report (e.g., 'NREL', 'EIA')")
+    publication_year: Optional[int] = Field(None, description="Year the report was published")
+    planning_horizon_year: Optional[int] = Field(None, description="Final year of the projections or planning period (e.g., 2050)")
+    scenarios: Optional[str] = Field(None, description="Names of the main scenarios or cases modeled")
+    renewable_share_projection: Optional[str] = Field(None, description="Projected renewable or clean share of electricity generation, with its year")
+    solar_capacity_projection: Optional[str] = Field(None, description="Projected solar generating capacity (e.g., '1,000 GW by 2050')")
+    electricity_demand_projection: Optional[str] = Field(None, description="Projected electricity demand or consumption, with units and year")
+    emissions_projection: Optional[str] = Field(None, description="Projected power sector or energy CO2 emissions reduction, with year")
+    key_findings: Optional[str] = Field(None, description="One or two sentence summary of the report's main conclusion")
+
+
 # Test the schema
 if __name__ == "__main__":
     print("=" * 70)
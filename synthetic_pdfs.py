@@ -0,0 +1,194 @@
+"""
+Synthetic sustainability reports with planted ground-truth values
+
+Generates report-like PDFs of any length with PyMuPDF: a repeated header and
+footer on every page, pages of sustainability prose, and emissions, energy and
+water tables holding the planted values next to prior-year distractors. The
+real reports need a download and their values are only known from earlier
+extractions; these are reproducible from a seed and every value is known.
+
+Usage: python synthetic_pdfs.py [output_dir] [pages ...]
+    e.g. python synthetic_pdfs.py .cache/bench_pdfs 10 100 500 2000
+"""
+import json
+import os
+import random
+import sys
+
+import fitz  # PyMuPDF
+
+PAGE_SIZE = (612, 792)  # US Letter
+MARGIN = 54
+COMPANIES = ["Northwind Energy", "Contoso Materials", "Fabrikam Foods", "Tailspin Logistics",
+             "Litware Semiconductors", "Adatum Retail", "Proseware Cloud", "Wingtip Airlines"]
+
+# Planted table rows: field -> (row label, unit, value range)
+TABLE_ROWS = {
+    "emissions": [
+        ("scope_1_emissions", "Scope 1 emissions", "tCO2e", (20_000, 900_000)),
+        ("scope_2_emissions_market_based", "Scope 2 emissions (market-based)", "tCO2e", (5_000, 3_000_000)),
+        ("scope_2_emissions_location_based", "Scope 2 emissions (location-based)", "tCO2e", (50_000, 6_000_000)),
+        ("scope_3_emissions", "Scope 3 emissions", "tCO2e", (1_000_000, 20_000_000)),
+    ],
+    "energy": [
+        ("total_energy_consumption", "Total energy consumption", "MWh", (100_000, 30_000_000)),
+        ("renewable_energy_percentage", "Renewable electricity share", "%", (10, 100)),
+    ],
+    "water": [
+        ("total_water_withdrawal", "Total water withdrawal", "megaliters", (500, 40_000)),
+        ("water_consumption", "Water consumption", "megaliters", (100, 20_000)),
+    ],
+}
+TABLE_TITLES = {
+    "emissions": "Greenhouse gas emissions",
+    "energy": "Energy use",
+    "water": "Water stewardship",
+}
+# Where each table goes, as a share of the report's length
+TABLE_POSITIONS = {"emissions": 0.35, "energy": 0.55, "water": 0.75}
+
+SUBJECTS = ["Our operations", "The supply chain program", "Each regional team", "Our data centers",
+            "The procurement group", "Facility managers", "The sustainability council", "Our logistics network"]
+VERBS = ["continued to improve", "reviewed", "expanded", "reported on", "invested in", "piloted",
+         "strengthened", "assessed"]
+OBJECTS = ["energy efficiency across sites", "supplier engagement on climate", "water reuse at key facilities",
+           "low-carbon materials", "employee commuting programs", "the circular economy strategy",
+           "biodiversity assessments", "climate risk disclosures", "community investment",
+           "waste diversion from landfill", "responsible sourcing audits", "governance of ESG data"]
+CLAUSES = ["in line with our long-term strategy", "with support from external partners",
+           "following stakeholder feedback", "as part of our annual planning cycle",
+           "where local regulation allows", "using guidance from recognized frameworks"]
+
+
+def format_value(value):
+    """How a planted value is printed in the report (e.g. 91,200 or 64.5)."""
+    return f"{value:,}" if isinstance(value, int) else f"{value:.1f}"
+
+
+def _prose(rng, sentences):
+    return " ".join(
+        f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(CLAUSES)}."
+        for _ in range(sentences)
+    )
+
+
+def plant_values(rng, year):
+    """Ground truth for one report: the values its tables and target paragraph state."""
+    truth = {"reporting_year": year}
+    for rows in TABLE_ROWS.values():
+        for field, _, unit, (low, high) in rows:
+            truth[field] = round(rng.uniform(low, high), 1) if unit == "%" else rng.randrange(low, high, 100)
+    truth["baseline_year"] = rng.choice([2015, 2017, 2019, 2020])
+    truth["target_year"] = rng.choice([2030, 2035, 2040])
+    return truth
+
+
+def _table_lines(kind, truth, year, rng):
+    years = [year - 2, year - 1, year]
+    lines = [f"{TABLE_TITLES[kind]} ({years[0]}-{year})", "",
+             f"{'Metric':<38}{'Unit':<12}" + "".join(f"{y:>12}" for y in years)]
+    for field, label, unit, _ in TABLE_ROWS[kind]:
+        value = truth[field]
+        # Earlier years are distractors near the planted value
+        history = [type(value)(value * rng.uniform(0.85, 1.25)) for _ in years[:-1]]
+        if isinstance(value, float):
+            history = [min(round(v, 1), 100.0) for v in history]
+        else:
+            history = [round(v, -2) for v in history]
+        cells = [format_value(v) for v in history + [value]]
+        lines.append(f"{label:<38}{unit:<12}" + "".join(f"{c:>12}" for c in cells))
+    return lines
+
+
+def make_report(pdf_path, pages, company=None, year=2023, seed=0):
+    """
+    Write a synthetic sustainability report.
+
+    Args:
+        pdf_path: Where to write the PDF
+        pages: Number of pages (at least 1)
+        company: Company name (default: picked from the seed)
+        year: Reporting year
+        seed: Seed for the prose and the planted values
+
+    Returns:
+        dict with "path", "pages", "company" and "truth" ({field: planted value})
+    """
+    rng = random.Random(seed)
+    company = company or rng.choice(COMPANIES)
+    truth = plant_values(rng, year)
+    # Very short reports put several tables on one page
+    table_pages = {}
+    for kind, share in TABLE_POSITIONS.items():
+        table_pages.setdefault(min(pages - 1, int(pages * share)), []).append(kind)
+    target_page = min(pages - 1, max(1, pages // 5))
+
+    doc = fitz.open()
+    width, height = PAGE_SIZE
+    body = fitz.Rect(MARGIN, MARGIN + 30, width - MARGIN, height - MARGIN - 30)
+    for number in range(pages):
+        page = doc.new_page(width=width, height=height)
+        # Repeated running header and footer, as in real reports
+        page.insert_text((MARGIN, MARGIN), f"{company} {year} Environmental Report", fontsize=9)
+        page.insert_text((MARGIN, height - MARGIN), f"{company} | Sustainability | Page {number + 1}",
+                         fontsize=9)
+
+        paragraphs = []
+        if number == 0:
+            paragraphs.append(f"{company}\n{year} Environmental Report\n\n{_prose(rng, 4)}")
+        if number == target_page:
+            paragraphs.append(
+                f"Our climate targets. We have committed to reduce absolute Scope 1 and Scope 2 emissions "
+                f"50% by {truth['target_year']} from a {truth['baseline_year']} baseline, and to reach net zero "
+                f"across our value chain by 2050. {_prose(rng, 3)}"
+            )
+        for kind in table_pages.get(number, []):
+            paragraphs.append("\n".join(_table_lines(kind, truth, year, rng)))
+        while len(paragraphs) < 4:
+            paragraphs.append(_prose(rng, rng.randint(4, 7)))
+
+        text = "\n\n".join(paragraphs)
+        fontname = "cour" if number in table_pages else "helv"
+        page.insert_textbox(body, text, fontsize=7 if number in table_pages else 10, fontname=fontname)
+
+    os.makedirs(os.path.dirname(os.path.abspath(pdf_path)), exist_ok=True)
+    doc.save(pdf_path, garbage=3, deflate=True)
+    doc.close()
+    return {"path": pdf_path, "pages": pages, "company": company, "truth": truth}
+
+
+def generate_corpus(directory, page_counts=(10, 100, 500, 2000), seed=0):
+    """
+    One synthetic report per page count, plus a ground_truth.json manifest.
+
+    Reports already listed in the directory's manifest (same pages and seed)
+    are reused rather than regenerated; a 2,000-page report takes a while.
+
+    Returns:
+        List of make_report results
+    """
+    manifest_path = os.path.join(directory, "ground_truth.json")
+    existing = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            existing = {report["path"]: report for report in json.load(f)}
+
+    reports = []
+    for i, pages in enumerate(page_counts):
+        path = os.path.join(directory, f"synthetic-{pages}p.pdf")
+        report = existing.get(path)
+        if report is None or report.get("seed") != seed + i or not os.path.exists(path):
+            report = dict(make_report(path, pages, seed=seed + i), seed=seed + i)
+        reports.append(report)
+    existing.update((report["path"], report) for report in reports)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(list(existing.values()), f, indent=2)
+    return reports
+
+
+if __name__ == "__main__":
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(".cache", "bench_pdfs")
+    page_counts = [int(n) for n in sys.argv[2:]] or [10, 100, 500, 2000]
+    for report in generate_corpus(output_dir, page_counts):
+        print(f"{report['path']}: {report['pages']} pages, {report['company']}, "
+              f"{len(report['truth'])} planted values")
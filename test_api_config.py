@@ -1,5 +1,5 @@
 """Test JSON mode and disable-thinking with live API call"""
-from openai import OpenAI
+from llm_client import make_client
 import os
 import json
 
@@ -8,7 +8,7 @@ print("Testing JSON Mode and Disable-Thinking Configuration")
 print("=" * 70)
 
 # Configure the client
-client = OpenAI(
+client = make_client(
     base_url=os.environ.get("OPENAI_BASE_URL", "https://ellm.nrp-nautilus.io/v1"),
     api_key=os.environ.get("OPENAI_API_KEY"),
 )
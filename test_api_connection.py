@@ -2,9 +2,9 @@
 Quick API connectivity test
 """
 import os
-from openai import OpenAI
+from llm_client import make_client
 
-client = OpenAI(
+client = make_client(
     base_url=os.environ.get("OPENAI_BASE_URL"),
     api_key=os.environ.get("OPENAI_API_KEY"),
 )
@@ -0,0 +1,207 @@
+"""
+Tracing spans for the extraction pipelines
+
+With EXTRACTION_TRACE=trace.json set, documents, pipeline stages, page
+parsing, chunk splitting and each chunk's queueing, request and parsing are
+recorded as spans and saved in the Chrome trace event format: open the file
+in chrome://tracing or https://ui.perfetto.dev. `trace_table` sums the spans
+by document and stage, with each span's self time (its time minus the spans
+nested in it), so PDF parsing, splitting, scoring, network wait and Pydantic
+validation can be told apart.
+
+Spans nest by time on their lane (a track in the viewer). Concurrent chunk
+extractions share one thread, so each chunk gets its own lane, and spans
+opened inside it stay on it. Timestamps are wall-clock, so spans recorded in
+worker processes line up with the parent's once merged with `extend`.
+
+Tracing is off unless EXTRACTION_TRACE is set; a disabled span costs one
+attribute check.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+TRACE_PATH = os.environ.get("EXTRACTION_TRACE")
+
+_lane = contextvars.ContextVar("trace_lane", default=None)
+_document = contextvars.ContextVar("trace_document", default=None)
+
+
+class Tracer:
+    """Collects spans as Chrome trace "complete" events, in memory until `save`."""
+
+    def __init__(self, path=TRACE_PATH, enabled=None):
+        self.path = Path(path) if path else None
+        self.enabled = self.path is not None if enabled is None else enabled
+        self.events = []
+        self._lanes = {}  # lane name -> tid
+        self._lock = threading.Lock()
+        # perf_counter for durations, shifted to wall-clock microseconds
+        self._offset = time.time() - time.perf_counter()
+
+    def _tid(self, lane):
+        if lane is None:
+            return threading.get_ident()
+        with self._lock:
+            if lane not in self._lanes:
+                self._lanes[lane] = tid = 1_000_000 + len(self._lanes)
+                self.events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                                    "args": {"name": lane}})
+            return self._lanes[lane]
+
+    def add(self, name, start, end, category="pipeline", **args):
+        """Record a span from perf_counter `start` to `end` on the current lane and document."""
+        if not self.enabled:
+            return
+        document = _document.get()
+        if document is not None:
+            args.setdefault("document", document)
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start + self._offset) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": self._tid(_lane.get()),
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, category="pipeline", lane=None, document=None, **args):
+        """
+        Time the block as a span.
+
+        Args:
+            name: Span name (the stage, e.g. "ingest", "request")
+            category: Chrome trace category
+            lane: Put this span, and the spans nested in it, on their own
+                named track (e.g. one per concurrent chunk)
+            document: Document the span and the spans nested in it belong to
+            **args: Extra fields shown with the span
+        """
+        if not self.enabled:
+            yield
+            return
+        lane_token = _lane.set(lane) if lane is not None else None
+        document_token = _document.set(document) if document is not None else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter(), category, **args)
+            if document_token is not None:
+                _document.reset(document_token)
+            if lane_token is not None:
+                _lane.reset(lane_token)
+
+    def traced(self, iterable, name, category="pipeline"):
+        """
+        Yield from `iterable`, timing each item's production as a span.
+
+        For streamed steps, e.g. page parsing pulled along by chunking.
+        """
+        if not self.enabled:
+            return iterable
+        return self._traced(iterable, name, category)
+
+    def _traced(self, iterable, name, category):
+        iterator = iter(iterable)
+        position = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(name, start, time.perf_counter(), category, item=position)
+            position += 1
+            yield item
+
+    def drain(self):
+        """Remove and return the recorded events (e.g. to send from a worker process)."""
+        with self._lock:
+            events, self.events = self.events, []
+            self._lanes = {}
+        return events
+
+    def extend(self, events):
+        """Add events recorded elsewhere (e.g. returned by a worker's `drain`)."""
+        if self.enabled and events:
+            with self._lock:
+                self.events.extend(events)
+
+    def save(self, path=None):
+        """Write the trace as Chrome trace JSON; returns the path, or None if tracing is off."""
+        path = Path(path) if path else self.path
+        if not self.enabled or path is None:
+            return None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with self._lock:
+            payload = {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
+        return path
+
+
+def self_times(events):
+    """Each complete event's duration minus the durations of the events nested directly in it (µs)."""
+    spans = sorted((e for e in events if e.get("ph") == "X"),
+                   key=lambda e: (e["pid"], e["tid"], e["ts"], -e["dur"]))
+    own = {id(e): e["dur"] for e in spans}
+    stack = []
+    for event in spans:
+        lane = (event["pid"], event["tid"])
+        while stack and (stack[-1][0] != lane or stack[-1][1]["ts"] + stack[-1][1]["dur"] <= event["ts"]):
+            stack.pop()
+        if stack:
+            own[id(stack[-1][1])] -= event["dur"]
+        stack.append((lane, event))
+    return own
+
+
+def trace_table(events):
+    """Printable time by document and span, largest self time first within each document."""
+    own = self_times(events)
+    groups = defaultdict(lambda: {"count": 0, "total": 0.0, "self": 0.0})
+    for event in events:
+        if event.get("ph") != "X":
+            continue
+        group = groups[(event["args"].get("document") or "(none)", event["name"])]
+        group["count"] += 1
+        group["total"] += event["dur"] / 1e6
+        group["self"] += own[id(event)] / 1e6
+
+    header = f"{'Document':<28} {'Span':<12} {'count':>6} {'total s':>9} {'self s':>9} {'share':>6}"
+    lines = [header, "-" * len(header)]
+    documents = sorted({document for document, _ in groups})
+    for document in documents:
+        rows = sorted(((name, t) for (doc, name), t in groups.items() if doc == document),
+                      key=lambda row: -row[1]["self"])
+        document_self = sum(t["self"] for _, t in rows) or 1.0
+        for name, t in rows:
+            lines.append(f"{document[:28]:<28} {name[:12]:<12} {t['count']:>6} {t['total']:>9.2f} "
+                         f"{t['self']:>9.2f} {t['self'] / document_self:>6.0%}")
+    lines.append("Self time excludes nested spans; job spans overlap when chunks are extracted concurrently.")
+    return "\n".join(lines)
+
+
+# Shared by every pipeline in this process
+default_tracer = Tracer()
+
+
+def trace_summary(tracer=default_tracer):
+    """Save the trace (when tracing is on) and return its time table, or a one-line note."""
+    if not tracer.enabled:
+        return "Tracing: off (set EXTRACTION_TRACE=trace.json to record spans)"
+    path = tracer.save()
+    return f"{trace_table(tracer.events)}\nTrace: {len(tracer.events)} events written to {path}"
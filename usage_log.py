@@ -0,0 +1,140 @@
+"""
+Token, latency and cost accounting for LLM calls
+
+Every chat completion made through llm_client is recorded with its model,
+prompt and completion tokens, wall latency, time to first byte (response
+headers received) and outcome. Records are appended to a local JSONL log
+and kept in memory for per-document, per-schema and per-model summaries.
+The document and schema a call belongs to are set with `usage_context`.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+LOG_PATH = Path(os.environ.get(
+    "LLM_USAGE_LOG", Path(__file__).resolve().parent / ".cache" / "llm_usage.jsonl"
+))
+# USD per million tokens; the NRP endpoint is free, so both default to 0
+PROMPT_PRICE = float(os.environ.get("LLM_PROMPT_PRICE", "0"))
+COMPLETION_PRICE = float(os.environ.get("LLM_COMPLETION_PRICE", "0"))
+
+_context = contextvars.ContextVar("usage_context", default={})
+
+
+@contextmanager
+def usage_context(**tags):
+    """
+    Tag every LLM call inside the block, e.g. usage_context(document="google-env-2024.pdf").
+
+    Nested blocks add to (and may override) the outer tags. Tags follow
+    asyncio tasks created inside the block.
+    """
+    token = _context.set({**_context.get(), **tags})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def call_cost(record):
+    """Estimated USD cost of one call (0 for cache hits)."""
+    if record.get("cached"):
+        return 0.0
+    return ((record.get("prompt_tokens") or 0) * PROMPT_PRICE
+            + (record.get("completion_tokens") or 0) * COMPLETION_PRICE) / 1e6
+
+
+class UsageLog:
+    """Append-only JSONL log of LLM calls, with in-memory records for this process."""
+
+    def __init__(self, path=LOG_PATH):
+        self.path = Path(path) if path else None
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, model, outcome, latency=None, ttfb=None, usage=None, cached=False):
+        """Record one call; `usage` is the response's usage object (or None)."""
+        entry = {
+            "time": time.time(),
+            "model": model,
+            "document": None,
+            "schema": None,
+            **_context.get(),
+            "outcome": outcome,
+            "cached": cached,
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+            "latency": latency,
+            "ttfb": ttfb,
+        }
+        with self._lock:
+            self.records.append(entry)
+            if self.path is not None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def load(self):
+        """Every record in the on-disk log, across past runs."""
+        if self.path is None or not self.path.exists():
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+def totals(records):
+    """Aggregate calls, tokens, latency and cost over `records`."""
+    t = {"calls": 0, "cached": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+         "latency": 0.0, "ttfb": 0.0, "cost": 0.0}
+    timed = 0
+    for r in records:
+        t["calls"] += 1
+        if r.get("cached"):
+            t["cached"] += 1
+            continue
+        if r.get("outcome") not in ("ok", "cancelled"):
+            t["errors"] += 1
+        t["prompt_tokens"] += r.get("prompt_tokens") or 0
+        t["completion_tokens"] += r.get("completion_tokens") or 0
+        if r.get("latency") is not None:
+            t["latency"] += r["latency"]
+            t["ttfb"] += r.get("ttfb") or 0.0
+            timed += 1
+        t["cost"] += call_cost(r)
+    t["mean_latency"] = t["latency"] / timed if timed else None
+    t["mean_ttfb"] = t["ttfb"] / timed if timed else None
+    return t
+
+
+def summarize(records, by="document"):
+    """{tag value: totals} grouped by "document", "schema" or "model"."""
+    groups = defaultdict(list)
+    for r in records:
+        groups[r.get(by) or "(none)"].append(r)
+    return {key: totals(group) for key, group in sorted(groups.items())}
+
+
+def usage_table(records, by="document"):
+    """Printable cost and latency table grouped by `by`."""
+    header = (f"{by.title():<28} {'calls':>5} {'cached':>6} {'errors':>6} {'prompt tok':>11} "
+              f"{'compl tok':>10} {'mean lat':>9} {'mean ttfb':>9} {'cost $':>8}")
+    lines = [header, "-" * len(header)]
+    groups = summarize(records, by)
+    groups["TOTAL"] = totals(records)
+    for key, t in groups.items():
+        mean_latency = f"{t['mean_latency']:.2f}s" if t["mean_latency"] is not None else "-"
+        mean_ttfb = f"{t['mean_ttfb']:.2f}s" if t["mean_ttfb"] is not None else "-"
+        lines.append(f"{str(key)[:28]:<28} {t['calls']:>5} {t['cached']:>6} {t['errors']:>6} "
+                     f"{t['prompt_tokens']:>11,} {t['completion_tokens']:>10,} "
+                     f"{mean_latency:>9} {mean_ttfb:>9} {t['cost']:>8.4f}")
+    return "\n".join(lines)
+
+
+# Shared by every client made in llm_client
+default_usage_log = UsageLog()
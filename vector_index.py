@@ -0,0 +1,338 @@
+"""
+Offline hashed TF-IDF vector index for chunk ranking, in NumPy only
+
+Each chunk becomes a sparse TF-IDF vector: words (and optionally character
+n-grams of words) are hashed into a fixed number of columns, so there is no
+vocabulary to store or grow, then weighted by sublinear term frequency and the
+corpus IDF and L2-normalized. Cosine similarity to a query is then a sparse
+dot product. The index is built once per corpus and saved as .npy files that
+are memory-mapped on load, so only the pages a query touches are read.
+
+Queries are plain text. Ranking with a field's description rather than a few
+keywords brings in its paraphrases ("Total GHG emissions", "Carbon
+footprint"), and character n-grams match inflections and compounds
+("emission" / "emissions", "GHG" / "GHGs"). `hybrid_scores` blends cosine
+scores with keyword or BM25 scores.
+
+Usage:
+    python vector_index.py build [data_dir] [--char-ngrams]
+    python vector_index.py search "total greenhouse gas emissions" [k]
+"""
+import json
+import os
+import sys
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from bm25_index import tokenize
+from chunk_features import top_k_indices
+from chunking import iter_chunk_records, read_spans
+from pdf_text import iter_page_texts
+
+INDEX_DIR = Path(os.environ.get(
+    "VECTOR_INDEX_DIR", Path(__file__).resolve().parent / ".cache" / "vector_index"
+))
+DATA_DIR = Path(__file__).resolve().parent / "data"
+# Hashed feature columns; a power of two. Collisions are rare at this size and
+# signed hashing makes the ones that happen cancel out on average
+N_FEATURES = 2 ** 18
+# Above this many columns a dense matrix would be too big, so dense=True needs fewer
+MAX_DENSE_FEATURES = 2 ** 14
+
+_ARRAYS = ("indptr", "indices", "data", "idf", "chunks")
+
+
+def _hash_features(text, char_ngrams=None):
+    """32-bit hashes of the text's words, plus character n-grams of each word if requested."""
+    features = tokenize(text)
+    if char_ngrams:
+        low, high = char_ngrams
+        grams = []
+        for word in features:
+            padded = f" {word} "
+            for n in range(low, high + 1):
+                grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        features = features + ["#" + gram for gram in grams]
+    return np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features),
+                       dtype=np.uint32, count=len(features))
+
+
+def _term_vector(hashes, n_features):
+    """(columns, weights) of one text: signed sublinear term frequencies per hashed column."""
+    unique, counts = np.unique(hashes, return_counts=True)
+    weights = 1.0 + np.log(counts)
+    weights[(unique & 0x80000000) != 0] *= -1.0  # the top bit picks the sign
+    columns = (unique & (n_features - 1)).astype(np.int32)
+    # Sum features that landed in the same column
+    columns, slots = np.unique(columns, return_inverse=True)
+    return columns, np.bincount(slots, weights=weights).astype(np.float32)
+
+
+def _csr(rows):
+    """Stack (columns, weights) rows into CSR arrays."""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(columns) for columns, _ in rows])
+    indices = np.concatenate([columns for columns, _ in rows]) if rows else np.empty(0, np.int32)
+    data = np.concatenate([weights for _, weights in rows]) if rows else np.empty(0, np.float32)
+    return indptr, indices.astype(np.int32), data.astype(np.float32)
+
+
+def _normalize(indptr, data):
+    """L2-normalize CSR rows in place."""
+    row_of = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    norms = np.sqrt(np.bincount(row_of, weights=data.astype(np.float64) ** 2,
+                                minlength=len(indptr) - 1))
+    norms[norms == 0] = 1.0
+    data /= norms[row_of].astype(np.float32)
+
+
+def field_query_texts(response_model, fields=None):
+    """{field: query text} made of each field's name and description, for cosine ranking."""
+    if fields is None:
+        fields = list(response_model.model_fields)
+    return {field: f"{field.replace('_', ' ')}: {response_model.model_fields[field].description or ''}"
+            for field in fields}
+
+
+def hybrid_scores(scores, vector_scores, vector_weight=0.5):
+    """
+    Blend two score arrays over the same chunks after min-max scaling each to [0, 1].
+
+    vector_weight=0 keeps `scores` (e.g. keyword counts or BM25) as they rank,
+    1 ranks by `vector_scores` (cosine) alone.
+    """
+    def scale(values):
+        values = np.asarray(values, dtype=np.float64)
+        span = values.max() - values.min() if len(values) else 0.0
+        return (values - values.min()) / span if span > 0 else np.zeros_like(values)
+
+    return (1 - vector_weight) * scale(scores) + vector_weight * scale(vector_scores)
+
+
+class VectorIndex:
+    """
+    Hashed TF-IDF vectors of every chunk in a corpus, memory-mapped from .npy files.
+
+    Build with `VectorIndex.build(pdf_paths)` (once per corpus), then load
+    with `VectorIndex(path)`. Rows are chunks in document order, numbered as
+    iter_chunk_records numbers them, so a document's rows line up with a
+    ChunkFeatures matrix or BM25 index of the same document.
+    """
+
+    def __init__(self, path=INDEX_DIR):
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text())
+        self.n_features = meta["n_features"]
+        self.char_ngrams = tuple(meta["char_ngrams"]) if meta["char_ngrams"] else None
+        self.dense = meta["dense"]
+        self.chunk_size = meta["chunk_size"]
+        self.chunk_overlap = meta["chunk_overlap"]
+        self.documents = meta["documents"]  # [{"path", "first_row", "rows"}]
+        arrays = {name: np.load(self.path / f"{name}.npy", mmap_mode="r")
+                  for name in _ARRAYS if (self.path / f"{name}.npy").exists()}
+        self.idf = np.asarray(arrays["idf"])
+        self.chunks = arrays["chunks"]  # (rows, 4): start, end, first page, last page
+        if self.dense:
+            self.matrix = np.load(self.path / "matrix.npy", mmap_mode="r")
+        else:
+            self.indptr, self.indices, self.data = arrays["indptr"], arrays["indices"], arrays["data"]
+        self._rows = {doc["path"]: (doc["first_row"], doc["first_row"] + doc["rows"])
+                      for doc in self.documents}
+
+    @classmethod
+    def build(cls, pdf_paths, path=INDEX_DIR, n_features=N_FEATURES, char_ngrams=None,
+              dense=False, chunk_size=4000, chunk_overlap=200):
+        """
+        Vectorize every chunk of `pdf_paths` and save the index under `path`.
+
+        Args:
+            pdf_paths: PDFs to index (the corpus the IDF is computed over)
+            n_features: Hashed columns (a power of two; at most
+                MAX_DENSE_FEATURES with dense=True)
+            char_ngrams: (min, max) character n-gram lengths to add to the
+                word features, e.g. (3, 5); None for words only
+            dense: Store a dense (rows, n_features) matrix instead of CSR
+            chunk_size, chunk_overlap: Chunking (the pipeline's defaults)
+        """
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        if dense and n_features > MAX_DENSE_FEATURES:
+            raise ValueError(f"dense=True needs n_features <= {MAX_DENSE_FEATURES}")
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        rows, chunks, documents = [], [], []
+        doc_freq = np.zeros(n_features, dtype=np.int64)
+        for pdf_path in pdf_paths:
+            pdf_path = Path(pdf_path).resolve()
+            start = time.perf_counter()
+            first_row = len(rows)
+            for chunk in iter_chunk_records(iter_page_texts(str(pdf_path)), chunk_size, chunk_overlap):
+                columns, weights = _term_vector(_hash_features(chunk["text"], char_ngrams), n_features)
+                rows.append((columns, weights))
+                doc_freq[columns] += 1
+                pages = chunk["pages"] or [0]
+                chunks.append((chunk["start"], chunk["end"], pages[0], pages[-1]))
+            documents.append({"path": str(pdf_path), "first_row": first_row,
+                              "rows": len(rows) - first_row})
+            print(f"  ✓ {pdf_path.name}: {len(rows) - first_row} chunks "
+                  f"({time.perf_counter() - start:.1f}s)")
+
+        idf = (np.log((1 + len(rows)) / (1 + doc_freq)) + 1).astype(np.float32)
+        indptr, indices, data = _csr(rows)
+        data *= idf[indices]
+        _normalize(indptr, data)
+
+        if dense:
+            matrix = np.zeros((len(rows), n_features), dtype=np.float32)
+            row_of = np.repeat(np.arange(len(rows)), np.diff(indptr))
+            matrix[row_of, indices] = data
+            np.save(path / "matrix.npy", matrix)
+        else:
+            np.save(path / "indptr.npy", indptr)
+            np.save(path / "indices.npy", indices)
+            np.save(path / "data.npy", data)
+        np.save(path / "idf.npy", idf)
+        np.save(path / "chunks.npy", np.asarray(chunks, dtype=np.int64).reshape(-1, 4))
+        (path / "meta.json").write_text(json.dumps({
+            "n_features": n_features,
+            "char_ngrams": list(char_ngrams) if char_ngrams else None,
+            "dense": dense,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "documents": documents,
+        }, indent=2))
+        return cls(path)
+
+    def embed(self, texts):
+        """L2-normalized TF-IDF vectors of any texts, with this corpus's IDF, as CSR arrays."""
+        rows = [_term_vector(_hash_features(text, self.char_ngrams), self.n_features)
+                for text in texts]
+        indptr, indices, data = _csr(rows)
+        data *= self.idf[indices]
+        _normalize(indptr, data)
+        return indptr, indices, data
+
+    def document_rows(self, pdf_path):
+        """(first, end) index rows of a document; KeyError if it is not in the index."""
+        key = str(Path(pdf_path).resolve())
+        if key not in self._rows:
+            raise KeyError(f"{pdf_path} is not in the vector index at {self.path}; "
+                           f"rebuild it with: python vector_index.py build")
+        return self._rows[key]
+
+    def cosine(self, queries, vectors=None, document=None):
+        """
+        Cosine similarity of each query to each chunk, as a (queries, chunks) array.
+
+        All queries are scored in one pass over the chunk vectors.
+
+        Args:
+            queries: Query texts
+            vectors: CSR arrays from `embed` to score against, instead of
+                the stored chunks
+            document: Score only this document's chunks (columns follow its
+                chunk numbers); default every chunk in the index
+        """
+        q_indptr, q_indices, q_data = self.embed(queries)
+        if vectors is None and self.dense:
+            first, end = self.document_rows(document) if document else (0, len(self.chunks))
+            dense_queries = np.zeros((len(queries), self.n_features), dtype=np.float32)
+            q_rows = np.repeat(np.arange(len(queries)), np.diff(q_indptr))
+            dense_queries[q_rows, q_indices] = q_data
+            return dense_queries @ np.asarray(self.matrix[first:end]).T
+
+        if vectors is not None:
+            indptr, indices, data = vectors
+        else:
+            first, end = self.document_rows(document) if document else (0, len(self.chunks))
+            lo, hi = int(self.indptr[first]), int(self.indptr[end])
+            indptr = np.asarray(self.indptr[first:end + 1]) - lo
+            indices, data = np.asarray(self.indices[lo:hi]), np.asarray(self.data[lo:hi])
+        num_chunks = len(indptr) - 1
+
+        # Only chunk entries in a column some query uses can contribute
+        columns = np.unique(q_indices)
+        lookup = np.full(self.n_features, -1, dtype=np.int64)
+        lookup[columns] = np.arange(len(columns))
+        query_matrix = np.zeros((len(queries), len(columns)), dtype=np.float32)
+        q_rows = np.repeat(np.arange(len(queries)), np.diff(q_indptr))
+        query_matrix[q_rows, lookup[q_indices]] = q_data
+
+        positions = lookup[indices]
+        hit = positions >= 0
+        chunk_of = np.repeat(np.arange(num_chunks), np.diff(indptr))[hit]
+        # (entries, queries) products, summed per chunk for each query
+        products = data[hit, None] * query_matrix[:, positions[hit]].T
+        scores = np.zeros((len(queries), num_chunks))
+        for q in range(len(queries)):
+            scores[q] = np.bincount(chunk_of, weights=products[:, q], minlength=num_chunks)
+        return scores
+
+    def search(self, query, k=10, document=None):
+        """
+        Top-k chunks by cosine similarity to `query`.
+
+        Returns:
+            List of hit dicts, best first: "document" (path), "chunk" (chunk
+            number in the document), "score", "start", "end" and "pages"
+        """
+        first = self.document_rows(document)[0] if document else 0
+        scores = self.cosine([query], document=document)[0]
+        hits = []
+        for offset in top_k_indices(scores, k, min_score=1e-9).tolist():
+            row = first + offset
+            doc = next(d for d in reversed(self.documents) if d["first_row"] <= row)
+            start, end, first_page, last_page = (int(v) for v in self.chunks[row])
+            hits.append({"document": doc["path"], "chunk": row - doc["first_row"],
+                         "score": float(scores[offset]), "start": start, "end": end,
+                         "pages": (first_page, last_page)})
+        return hits
+
+    def texts(self, hits):
+        """Chunk text of each hit, re-read from the page cache (in hit order)."""
+        texts = [None] * len(hits)
+        for document in {hit["document"] for hit in hits}:
+            positions = [i for i, hit in enumerate(hits) if hit["document"] == document]
+            spans = [(hits[i]["start"], hits[i]["end"]) for i in positions]
+            for i, text in zip(positions, read_spans(iter_page_texts(document), spans)):
+                texts[i] = text
+        return texts
+
+
+def load_index(path=INDEX_DIR):
+    """The saved vector index at `path`, or None if it has not been built."""
+    if not (Path(path) / "meta.json").exists():
+        return None
+    return VectorIndex(path)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    args = [arg for arg in sys.argv[2:] if not arg.startswith("--")]
+    if command == "build":
+        root = Path(args[0]) if args else DATA_DIR
+        pdf_paths = sorted(root.rglob("*.pdf"))
+        print(f"Vectorizing {len(pdf_paths)} PDFs under {root}...")
+        index = VectorIndex.build(pdf_paths, char_ngrams=(3, 5) if "--char-ngrams" in sys.argv else None)
+        size = sum(f.stat().st_size for f in index.path.glob("*.npy"))
+        print(f"Vector index: {len(index.chunks):,} chunks, {size / 1024 / 1024:.1f} MB in {index.path}")
+    elif command == "search":
+        index = load_index()
+        if index is None:
+            print("No vector index yet; build it with: python vector_index.py build")
+            sys.exit(1)
+        k = int(args[1]) if len(args) > 1 else 5
+        start = time.perf_counter()
+        hits = index.search(args[0], k)
+        print(f"{len(hits)} chunks for {args[0]!r} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        print()
+        for hit, text in zip(hits, index.texts(hits)):
+            print(f"{hit['score']:.3f}  {Path(hit['document']).name}  pages {hit['pages'][0]}-{hit['pages'][1]}")
+            print(f"       {' '.join(text.split())[:150]}...")
+    else:
+        print(f"Unknown command {command!r}; use 'build' or 'search'")
+        sys.exit(1)